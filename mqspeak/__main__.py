@@ -14,21 +14,66 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import atexit
 from mqreceive.receiving import BrokerThreadManager
+from mqspeak.exporting import MetricsExporter
+from mqspeak.logs import LogFlusher
+from mqspeak.metrics import MetricsRegistry
+from mqspeak.scheduling import Scheduler
 from mqspeak.sending import ChannelUpdateDispatcher
+from mqspeak.spooling import MeasurementSpool
 from mqspeak.system import System
 from mqspeak.updating import ChannnelUpdateSupervisor
 
 def main():
     System.initialize()
 
+    # Single thread firing all scheduled deadlines
+    scheduler = Scheduler()
+    scheduler.start()
+
+    # Summaries of coalesced log messages, pending ones are logged at exit
+    logFlusher = LogFlusher(scheduler)
+    logFlusher.start()
+    atexit.register(logFlusher.stop)
+
     # Channel update dispatcher object
     channelConvertMapping = System.getChannelConvertMapping()
-    updateDispatcher = ChannelUpdateDispatcher(channelConvertMapping)
+    updateDispatcher = ChannelUpdateDispatcher(channelConvertMapping, System.getSendingOptions())
+    updateDispatcher.setScheduler(scheduler)
 
-    channelUpdateSupervisor = ChannnelUpdateSupervisor(System.getChannelUpdateMapping())
+    workerCount, inboxCapacity, overflowPolicy = System.getUpdateWorkerDescriptor()
+    channelUpdateSupervisor = ChannnelUpdateSupervisor(
+        System.getChannelUpdateMapping(),
+        scheduler,
+        workerCount,
+        inboxCapacity,
+        overflowPolicy)
     channelUpdateSupervisor.setDispatcher(updateDispatcher)
 
+    # Per-channel latency histograms and counters
+    metricsRegistry = MetricsRegistry()
+    updateDispatcher.setMetrics(metricsRegistry)
+    channelUpdateSupervisor.setMetrics(metricsRegistry)
+
+    # Durable spool of measurements which weren't sent yet
+    spool = None
+    spoolDescriptor = System.getSpoolDescriptor()
+    if spoolDescriptor is not None:
+        spool = MeasurementSpool(*spoolDescriptor)
+        spool.open()
+        updateDispatcher.setSpool(spool)
+        channelUpdateSupervisor.setSpool(spool)
+        channelUpdateSupervisor.restoreSpooledMeasurements(spool)
+        spool.start(scheduler)
+
+    # HTTP endpoint for metrics scraping
+    exporter = None
+    metricsDescriptor = System.getMetricsDescriptor()
+    if metricsDescriptor is not None:
+        exporter = MetricsExporter(*metricsDescriptor, metricsRegistry, channelUpdateSupervisor, updateDispatcher)
+        exporter.start()
+
     # MQTT cliens
     brokerManager = BrokerThreadManager(System.getBrokerListenDescriptors(), channelUpdateSupervisor)
 
@@ -44,6 +89,11 @@ def main():
         channelUpdateSupervisor.stop()
         brokerManager.stop()
         updateDispatcher.stop()
+        scheduler.stop()
+        if spool is not None:
+            spool.close()
+        if exporter is not None:
+            exporter.stop()
 
 if __name__ == '__main__':
     try:
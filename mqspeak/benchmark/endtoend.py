@@ -0,0 +1,474 @@
+# Copyright (C) Ivo Slanina <ivo.slanina@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import argparse
+import datetime
+import json
+import logging
+import random
+import sys
+import threading
+import time
+import mqspeak
+from mqreceive.broker import Broker
+from mqreceive.data import DataIdentifier
+from mqspeak.benchmark.servers import FakeServer
+from mqspeak.channel import ChannelType, ThingSpeakChannel, PhantChannel
+from mqspeak.data import MeasurementParamConverter
+from mqspeak.metrics import ChannelMetrics, LatencyHistogram, MetricsRegistry
+from mqspeak.scheduling import Scheduler
+from mqspeak.sending import ChannelUpdateDispatcher, SendingOptions
+from mqspeak.updating import ChannnelUpdateSupervisor, AverageUpdater, BufferedUpdater, OnChangeUpdater
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+def createParser():
+    """!
+    Create parser of command line arguments.
+
+    @return ArgumentParser object.
+    """
+    parser = argparse.ArgumentParser(
+        description = "mqspeak end-to-end benchmark v{}".format(mqspeak.__version__),
+        formatter_class = argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("-n", "--channels", type = int, default = 10,
+                        help = "number of channels")
+    parser.add_argument("-m", "--topics", type = int, default = 4,
+                        help = "number of topics of each channel")
+    parser.add_argument("-r", "--rate", type = float, default = 1000,
+                        help = "target number of published messages per second")
+    parser.add_argument("-d", "--duration", type = float, default = 10,
+                        help = "publishing time in seconds")
+    parser.add_argument("--drain", type = float, default = 10,
+                        help = "maximum time in seconds to wait for pending updates after publishing")
+    parser.add_argument("--updater", choices = ("onchange", "average", "buffered"), default = "onchange",
+                        help = "updater of all channels")
+    parser.add_argument("--interval", type = float, default = 0,
+                        help = "update interval of channels in seconds")
+    parser.add_argument("--channel-type", choices = ("thingspeak", "phant", "mixed"), default = "thingspeak",
+                        help = "type of channels, mixed alternates both types")
+    parser.add_argument("--latency", type = float, default = 0.05,
+                        help = "mean response delay of fake servers in seconds")
+    parser.add_argument("--jitter", type = float, default = 0.0,
+                        help = "maximum random deviation of response delay in seconds")
+    parser.add_argument("--error-rate", type = float, default = 0.0,
+                        help = "probability of failed response of fake servers")
+    parser.add_argument("--update-workers", type = int, default = 4,
+                        help = "number of threads processing received data")
+    parser.add_argument("--sender-workers", type = int, default = 4,
+                        help = "number of sender threads of each channel type")
+    parser.add_argument("--seed", type = int, default = 0,
+                        help = "seed of random payloads, delays and failures")
+    parser.add_argument("-o", "--output",
+                        help = "write JSON result to file instead of stdout")
+    parser.add_argument("-v", "--verbose", action = "store_true",
+                        help = "log mqspeak messages to stderr")
+    return parser
+
+class FakePublisher:
+    """!
+    Publish random numeric payloads to data collector at constant rate,
+    the same way MQTT client threads deliver received messages.
+    """
+
+    ## @var collector
+    # DataCollector object receiving messages.
+
+    ## @var dataIdentifiers
+    # List of published DataIdentifier objects, used in round-robin order.
+
+    ## @var rate
+    # Target number of messages per second.
+
+    ## @var duration
+    # Publishing time in seconds.
+
+    ## @var random
+    # Random generator of payloads.
+
+    ## @var publishedCount
+    # Number of published messages.
+
+    ## @var elapsed
+    # Real publishing time in seconds.
+
+    ## @var thread
+    # Publishing thread.
+
+    def __init__(self, collector, dataIdentifiers, rate, duration, seed = None):
+        """!
+        Initiate FakePublisher object.
+
+        @param collector DataCollector object receiving messages.
+        @param dataIdentifiers List of published DataIdentifier objects.
+        @param rate Target number of messages per second.
+        @param duration Publishing time in seconds.
+        @param seed Seed of random generator or None.
+        """
+        self.collector = collector
+        self.dataIdentifiers = dataIdentifiers
+        self.rate = rate
+        self.duration = duration
+        self.random = random.Random(seed)
+        self.publishedCount = 0
+        self.elapsed = 0.0
+        self.thread = threading.Thread(target = self.run, daemon = True)
+
+    def start(self):
+        """!
+        Start publishing in separate thread.
+        """
+        self.thread.start()
+
+    def join(self):
+        """!
+        Wait until publishing ends.
+        """
+        self.thread.join()
+
+    def run(self):
+        """!
+        Publish messages. When collector blocks, publisher falls behind
+        schedule and achieved rate is lower than target rate.
+        """
+        period = 1.0 / self.rate
+        start = time.monotonic()
+        while True:
+            due = start + self.publishedCount * period
+            if due - start >= self.duration:
+                break
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            dataIdentifier = self.dataIdentifiers[self.publishedCount % len(self.dataIdentifiers)]
+            payload = "{:.2f}".format(self.random.uniform(0, 100)).encode("utf-8")
+            self.collector.onNewData(dataIdentifier, payload)
+            self.publishedCount += 1
+        self.elapsed = time.monotonic() - start
+
+class ResourceSampler:
+    """!
+    Periodically sample number of running threads and keep maximum.
+    """
+
+    ## @var period
+    # Sampling period in seconds.
+
+    ## @var peakThreads
+    # Maximum observed number of threads.
+
+    ## @var stopEvent
+    # Event stopping sampling thread.
+
+    ## @var thread
+    # Sampling thread.
+
+    def __init__(self, period = 0.05):
+        """!
+        Initiate ResourceSampler object.
+
+        @param period Sampling period in seconds.
+        """
+        self.period = period
+        self.peakThreads = threading.active_count()
+        self.stopEvent = threading.Event()
+        self.thread = threading.Thread(target = self.run, daemon = True)
+
+    def start(self):
+        """!
+        Start sampling in separate thread.
+        """
+        self.thread.start()
+
+    def stop(self):
+        """!
+        Stop sampling.
+        """
+        self.stopEvent.set()
+        self.thread.join()
+
+    def run(self):
+        """!
+        Sample until stopped.
+        """
+        while not self.stopEvent.wait(self.period):
+            self.peakThreads = max(self.peakThreads, threading.active_count())
+
+    def getPeakRss(self):
+        """!
+        Get peak resident set size of process.
+
+        @return Size in bytes or None if it is not available on this platform.
+        """
+        if resource is None:
+            return None
+        maxRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes.
+        return maxRss if sys.platform == "darwin" else maxRss * 1024
+
+class EndToEndBenchmark:
+    """!
+    Drive complete mqspeak pipeline from supervisor to HTTP servers and
+    measure throughput, latency and resource usage.
+    """
+
+    ## @var options
+    # Parsed command line arguments.
+
+    ## @var servers
+    # Mapping {channelType: FakeServer}.
+
+    ## @var dataIdentifiers
+    # List of all published DataIdentifier objects.
+
+    ## @var channelUpdaterMapping
+    # Mapping {channel: updater}.
+
+    ## @var channelConvertMapping
+    # Mapping {channel: MeasurementParamConverter}.
+
+    def __init__(self, options):
+        """!
+        Initiate EndToEndBenchmark object.
+
+        @param options Parsed command line arguments.
+        """
+        self.options = options
+        self.servers = {}
+        self.dataIdentifiers = []
+        self.channelUpdaterMapping = {}
+        self.channelConvertMapping = {}
+
+    def createChannels(self):
+        """!
+        Create channels, their updaters and converters. Each channel has its
+        own topics mapped to fields field1, field2, etc.
+        """
+        broker = Broker("bench")
+        updateInterval = datetime.timedelta(seconds = self.options.interval)
+        updaterClasses = {
+            "onchange": OnChangeUpdater,
+            "average": AverageUpdater,
+            "buffered": BufferedUpdater}
+        updaterClass = updaterClasses[self.options.updater]
+        for channelIndex in range(self.options.channels):
+            channelType = self.getChannelType(channelIndex)
+            name = "bench{}".format(channelIndex)
+            if channelType == ChannelType.thingspeak:
+                channel = ThingSpeakChannel(name, str(channelIndex), "key{}".format(channelIndex), None)
+            else:
+                channel = PhantChannel(name, str(channelIndex), "key{}".format(channelIndex), None)
+            updateMapping = {}
+            for topicIndex in range(self.options.topics):
+                dataIdentifier = DataIdentifier(broker, "bench/{}/{}".format(channelIndex, topicIndex))
+                updateMapping[dataIdentifier] = "field{}".format(topicIndex + 1)
+                self.dataIdentifiers.append(dataIdentifier)
+            self.channelUpdaterMapping[channel] = updaterClass(channel, updateMapping, updateInterval)
+            self.channelConvertMapping[channel] = MeasurementParamConverter(updateMapping)
+
+    def getChannelType(self, channelIndex):
+        """!
+        Get type of channel.
+
+        @param channelIndex Index of channel.
+        @return ChannelType enumeration object.
+        """
+        if self.options.channel_type == "phant":
+            return ChannelType.phant
+        if self.options.channel_type == "mixed" and channelIndex % 2 == 1:
+            return ChannelType.phant
+        return ChannelType.thingspeak
+
+    def createSendingOptions(self):
+        """!
+        Create options of sending layer pointing senders to fake servers.
+        Server rate limits are not applied, so throughput isn't capped.
+
+        @return SendingOptions object.
+        """
+        sendingOptions = SendingOptions()
+        sendingOptions.workers = self.options.sender_workers
+        sendingOptions.rateLimits = {}
+        for channelType, server in self.servers.items():
+            sendingOptions.servers[channelType] = (server.getAddress(), False)
+        return sendingOptions
+
+    def run(self):
+        """!
+        Run benchmark.
+
+        @return Mapping of results, serializable to JSON.
+        """
+        for channelType in ChannelType:
+            server = FakeServer(
+                self.options.latency,
+                self.options.jitter,
+                self.options.error_rate,
+                self.options.seed)
+            server.start()
+            self.servers[channelType] = server
+        self.createChannels()
+
+        sampler = ResourceSampler()
+        sampler.start()
+        scheduler = Scheduler()
+        scheduler.start()
+        dispatcher = ChannelUpdateDispatcher(self.channelConvertMapping, self.createSendingOptions())
+        dispatcher.setScheduler(scheduler)
+        supervisor = ChannnelUpdateSupervisor(
+            self.channelUpdaterMapping,
+            scheduler,
+            self.options.update_workers)
+        supervisor.setDispatcher(dispatcher)
+        metricsRegistry = MetricsRegistry()
+        dispatcher.setMetrics(metricsRegistry)
+        supervisor.setMetrics(metricsRegistry)
+        dispatcherThread = threading.Thread(target = dispatcher.run, daemon = True)
+        dispatcherThread.start()
+
+        start = time.monotonic()
+        publisher = FakePublisher(
+            supervisor,
+            self.dataIdentifiers,
+            self.options.rate,
+            self.options.duration,
+            self.options.seed)
+        publisher.start()
+        publisher.join()
+        drained = self.waitForDrain(supervisor, dispatcher)
+        elapsed = time.monotonic() - start
+
+        supervisor.stop()
+        dispatcher.stop()
+        scheduler.stop()
+        sampler.stop()
+        for server in self.servers.values():
+            server.stop()
+        return self.createReport(metricsRegistry, publisher, sampler, elapsed, drained)
+
+    def waitForDrain(self, supervisor, dispatcher):
+        """!
+        Wait until all received data are sent or drain timeout expires.
+
+        @param supervisor ChannnelUpdateSupervisor object.
+        @param dispatcher ChannelUpdateDispatcher object.
+        @return True if all data were sent, False if timeout expired.
+        """
+        deadline = time.monotonic() + self.options.drain
+        while time.monotonic() < deadline:
+            pending = sum(supervisor.getInboxDepths().values())
+            pending += sum(supervisor.getBufferedCounts().values())
+            pending += dispatcher.getQueueDepth()
+            for senderPool in dispatcher.getSenderPools().values():
+                pending += senderPool.getActiveCount() + senderPool.getQueueDepth()
+            if pending == 0:
+                return True
+            time.sleep(0.05)
+        return False
+
+    def createReport(self, metricsRegistry, publisher, sampler, elapsed, drained):
+        """!
+        Summarize collected metrics.
+
+        @param metricsRegistry MetricsRegistry object.
+        @param publisher Finished FakePublisher object.
+        @param sampler Stopped ResourceSampler object.
+        @param elapsed Time in seconds from start of publishing to end of draining.
+        @param drained True if all data were sent before drain timeout expired.
+        @return Mapping of results.
+        """
+        counters = {"messages": 0, "sends": 0, "failures": 0, "drops": 0, "retries": 0}
+        histograms = {}
+        for name in ChannelMetrics.latencyStages:
+            histograms[name] = LatencyHistogram()
+        for channel in metricsRegistry.getChannels():
+            channelCounters, channelHistograms = metricsRegistry.getChannelMetrics(channel).getSnapshot()
+            for name, value in channelCounters.items():
+                counters[name] += value
+            for name, histogram in channelHistograms.items():
+                histograms[name].merge(histogram)
+        latency = {}
+        for name, histogram in histograms.items():
+            latency[name] = {
+                "count": histogram.count,
+                "mean": histogram.sum / histogram.count if histogram.count > 0 else None,
+                "p50": self.getFiniteQuantile(histogram, 0.5),
+                "p90": self.getFiniteQuantile(histogram, 0.9),
+                "p99": self.getFiniteQuantile(histogram, 0.99)}
+        serverRequests = 0
+        serverErrors = 0
+        for server in self.servers.values():
+            requestCount, errorCount = server.getCounts()
+            serverRequests += requestCount
+            serverErrors += errorCount
+        return {
+            "version": mqspeak.__version__,
+            "parameters": vars(self.options),
+            "published": publisher.publishedCount,
+            "publishTime": publisher.elapsed,
+            "elapsed": elapsed,
+            "drained": drained,
+            "messagesPerSecond": publisher.publishedCount / publisher.elapsed if publisher.elapsed > 0 else None,
+            "sendsPerSecond": counters["sends"] / elapsed if elapsed > 0 else None,
+            "counters": counters,
+            "serverRequests": serverRequests,
+            "serverErrors": serverErrors,
+            "latency": latency,
+            "peakThreads": sampler.peakThreads,
+            "peakRssBytes": sampler.getPeakRss()}
+
+    def getFiniteQuantile(self, histogram, q):
+        """!
+        Get histogram quantile which can be stored in JSON.
+
+        @param histogram LatencyHistogram object.
+        @param q Quantile in range from 0 to 1.
+        @return Duration in seconds or None if histogram is empty or quantile
+            is above largest bound.
+        """
+        quantile = histogram.getQuantile(q)
+        if quantile is None or quantile == float("inf"):
+            return None
+        return quantile
+
+def main():
+    parser = createParser()
+    options = parser.parse_args()
+    if options.channels <= 0 or options.topics <= 0:
+        parser.error("number of channels and topics must be positive")
+    if options.channel_type != "phant" and options.topics > 8:
+        parser.error("ThingSpeak channel has at most 8 fields")
+    if options.rate <= 0 or options.duration <= 0:
+        parser.error("rate and duration must be positive")
+    if not 0 <= options.error_rate <= 1:
+        parser.error("error rate must be in range from 0 to 1")
+
+    logging.basicConfig(
+        stream = sys.stderr,
+        level = logging.INFO if options.verbose else logging.CRITICAL)
+
+    report = EndToEndBenchmark(options).run()
+    output = json.dumps(report, indent = 2, sort_keys = True)
+    if options.output is not None:
+        with open(options.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main()
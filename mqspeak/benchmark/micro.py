@@ -0,0 +1,393 @@
+# Copyright (C) Ivo Slanina <ivo.slanina@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import timeit
+import mqspeak
+from mqreceive.broker import Broker
+from mqreceive.data import DataIdentifier
+from mqspeak.collecting import LastValueUpdateBuffer, AverageUpdateBuffer, ChangeValueBuffer
+from mqspeak.data import Measurement, MeasurementParamConverter
+
+## @var fieldCounts
+# Numbers of channel fields used by all cases. ThingSpeak channel has at most 8 fields.
+fieldCounts = (1, 4, 8)
+
+## @var messagesPerUpdate
+# Numbers of messages received between two updates of channel in update cycle cases.
+messagesPerUpdate = (10, 100)
+
+def createParser():
+    """!
+    Create parser of command line arguments.
+
+    @return ArgumentParser object.
+    """
+    parser = argparse.ArgumentParser(
+        description = "mqspeak micro-benchmarks v{}".format(mqspeak.__version__),
+        formatter_class = argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("-k", "--filter", default = "",
+                        help = "run only cases which name contains this string")
+    parser.add_argument("-r", "--repeat", type = int, default = 7,
+                        help = "number of timed repetitions of each case")
+    parser.add_argument("-t", "--min-time", type = float, default = 0.2,
+                        help = "minimal duration of single repetition in seconds")
+    parser.add_argument("-s", "--save",
+                        help = "save results as baseline JSON file")
+    parser.add_argument("-c", "--compare",
+                        help = "compare results with baseline JSON file")
+    parser.add_argument("--threshold", type = float, default = 0.1,
+                        help = "relative slowdown against baseline reported as regression")
+    parser.add_argument("--json", action = "store_true",
+                        help = "print results as JSON instead of table")
+    parser.add_argument("-l", "--list", action = "store_true",
+                        help = "list case names and exit")
+    return parser
+
+def createDataIdentifiers(fieldCount):
+    """!
+    Create data identifiers of single channel.
+
+    @param fieldCount Number of fields.
+    @return List of DataIdentifier objects.
+    """
+    broker = Broker("bench")
+    return [DataIdentifier(broker, "bench/{}".format(i)) for i in range(fieldCount)]
+
+def createPayloads(count, seed = 0):
+    """!
+    Create received numeric payloads.
+
+    @param count Number of payloads.
+    @param seed Seed of random generator.
+    @return List of strings.
+    """
+    generator = random.Random(seed)
+    return ["{:.2f}".format(generator.uniform(0, 100)) for i in range(count)]
+
+class BenchmarkCase:
+    """!
+    Single timed operation. Factory creates fresh state and returns callable
+    which performs measured operation once. Operation must leave state ready
+    for next call.
+    """
+
+    ## @var name
+    # Unique name of case.
+
+    ## @var factory
+    # Callable without arguments returning measured callable.
+
+    def __init__(self, name, factory):
+        """!
+        Initiate BenchmarkCase object.
+
+        @param name Unique name of case.
+        @param factory Callable without arguments returning measured callable.
+        """
+        self.name = name
+        self.factory = factory
+
+    def run(self, repeat, minTime):
+        """!
+        Time the case. Number of calls in each repetition is calibrated, so
+        repetition takes at least minTime seconds.
+
+        @param repeat Number of timed repetitions.
+        @param minTime Minimal duration of single repetition in seconds.
+        @return Mapping {"best": seconds, "median": seconds, "number": calls}
+            with time of single call.
+        """
+        timer = timeit.Timer(self.factory())
+        number = 1
+        while True:
+            elapsed = timer.timeit(number)
+            if elapsed >= minTime:
+                break
+            number *= 2 if elapsed <= 0 else max(2, min(10, int(minTime / elapsed) + 1))
+        times = [timer.timeit(number) / number for i in range(repeat)]
+        return {"best": min(times), "median": statistics.median(times), "number": number}
+
+def lastValueUpdate(fieldCount):
+    """!
+    Receive one message of each field by LastValueUpdateBuffer.
+
+    @param fieldCount Number of fields.
+    @return Callable performing operation.
+    """
+    dataIdentifiers = createDataIdentifiers(fieldCount)
+    payloads = createPayloads(fieldCount)
+    buffer = LastValueUpdateBuffer(dataIdentifiers)
+    items = list(zip(dataIdentifiers, payloads))
+    def operation():
+        for dataIdentifier, payload in items:
+            buffer.updateReceivedData(dataIdentifier, payload)
+    return operation
+
+def lastValueGetData(fieldCount):
+    """!
+    Copy data of full LastValueUpdateBuffer.
+
+    @param fieldCount Number of fields.
+    @return Callable performing operation.
+    """
+    dataIdentifiers = createDataIdentifiers(fieldCount)
+    buffer = LastValueUpdateBuffer(dataIdentifiers)
+    for dataIdentifier, payload in zip(dataIdentifiers, createPayloads(fieldCount)):
+        buffer.updateReceivedData(dataIdentifier, payload)
+    return buffer.getData
+
+def averageUpdate(fieldCount):
+    """!
+    Receive one message of each field by AverageUpdateBuffer.
+
+    @param fieldCount Number of fields.
+    @return Callable performing operation.
+    """
+    dataIdentifiers = createDataIdentifiers(fieldCount)
+    payloads = createPayloads(fieldCount)
+    buffer = AverageUpdateBuffer(dataIdentifiers)
+    items = list(zip(dataIdentifiers, payloads))
+    def operation():
+        for dataIdentifier, payload in items:
+            buffer.updateReceivedData(dataIdentifier, payload)
+    return operation
+
+def averageGetData(fieldCount):
+    """!
+    Aggregate data of full AverageUpdateBuffer.
+
+    @param fieldCount Number of fields.
+    @return Callable performing operation.
+    """
+    dataIdentifiers = createDataIdentifiers(fieldCount)
+    buffer = AverageUpdateBuffer(dataIdentifiers)
+    for dataIdentifier, payload in zip(dataIdentifiers, createPayloads(fieldCount)):
+        buffer.updateReceivedData(dataIdentifier, payload)
+    return buffer.getData
+
+def createCycle(bufferClass, fieldCount, messageCount):
+    """!
+    Create update cycle of single value buffer: messages are received round
+    robin by all fields, then measurement is taken and buffer is reset.
+
+    @param bufferClass Class of update buffer.
+    @param fieldCount Number of fields.
+    @param messageCount Number of received messages in cycle.
+    @return Callable performing single cycle.
+    """
+    dataIdentifiers = createDataIdentifiers(fieldCount)
+    payloads = createPayloads(messageCount)
+    items = [(dataIdentifiers[i % fieldCount], payload) for i, payload in enumerate(payloads)]
+    buffer = bufferClass(dataIdentifiers)
+    def operation():
+        for dataIdentifier, payload in items:
+            buffer.updateReceivedData(dataIdentifier, payload)
+        buffer.getMeasurement()
+        buffer.reset()
+    return operation
+
+def changeCycle(fieldCount, messageCount):
+    """!
+    Receive changed messages by ChangeValueBuffer and take queued measurements.
+
+    @param fieldCount Number of fields.
+    @param messageCount Number of received messages in cycle.
+    @return Callable performing operation.
+    """
+    dataIdentifiers = createDataIdentifiers(fieldCount)
+    # Neighbouring values of the same field always differ.
+    payloads = [str(i) for i in range(messageCount)]
+    items = [(dataIdentifiers[i % fieldCount], payload) for i, payload in enumerate(payloads)]
+    buffer = ChangeValueBuffer(dataIdentifiers)
+    def operation():
+        for dataIdentifier, payload in items:
+            buffer.updateReceivedData(dataIdentifier, payload)
+        buffer.takeNewMeasurements()
+        buffer.popMeasurements(messageCount)
+        # Next cycle starts with fresh values.
+        for dataIdentifier in dataIdentifiers:
+            buffer.lastValueMapping[dataIdentifier] = None
+    return operation
+
+def changeDuplicate(fieldCount):
+    """!
+    Receive one duplicate message of each field by ChangeValueBuffer.
+
+    @param fieldCount Number of fields.
+    @return Callable performing operation.
+    """
+    dataIdentifiers = createDataIdentifiers(fieldCount)
+    buffer = ChangeValueBuffer(dataIdentifiers)
+    for dataIdentifier in dataIdentifiers:
+        buffer.updateReceivedData(dataIdentifier, "1.00")
+    def operation():
+        for dataIdentifier in dataIdentifiers:
+            buffer.updateReceivedData(dataIdentifier, "1.00")
+    return operation
+
+def converterConvert(fieldCount):
+    """!
+    Convert measurement into channel fields.
+
+    @param fieldCount Number of fields.
+    @return Callable performing operation.
+    """
+    dataIdentifiers = createDataIdentifiers(fieldCount)
+    converter = MeasurementParamConverter(
+        {dataIdentifier: "field{}".format(i + 1) for i, dataIdentifier in enumerate(dataIdentifiers)})
+    measurement = Measurement.currentMeasurement(dict(zip(dataIdentifiers, createPayloads(fieldCount))))
+    return lambda: converter.convert(measurement)
+
+def createCases():
+    """!
+    Create all benchmark cases.
+
+    @return List of BenchmarkCase objects.
+    """
+    cases = []
+    for fieldCount in fieldCounts:
+        cases.append(BenchmarkCase(
+            "lastvalue.update[fields={}]".format(fieldCount),
+            lambda fieldCount = fieldCount: lastValueUpdate(fieldCount)))
+        cases.append(BenchmarkCase(
+            "lastvalue.getData[fields={}]".format(fieldCount),
+            lambda fieldCount = fieldCount: lastValueGetData(fieldCount)))
+        cases.append(BenchmarkCase(
+            "average.update[fields={}]".format(fieldCount),
+            lambda fieldCount = fieldCount: averageUpdate(fieldCount)))
+        cases.append(BenchmarkCase(
+            "average.getData[fields={}]".format(fieldCount),
+            lambda fieldCount = fieldCount: averageGetData(fieldCount)))
+        cases.append(BenchmarkCase(
+            "change.duplicate[fields={}]".format(fieldCount),
+            lambda fieldCount = fieldCount: changeDuplicate(fieldCount)))
+        cases.append(BenchmarkCase(
+            "converter.convert[fields={}]".format(fieldCount),
+            lambda fieldCount = fieldCount: converterConvert(fieldCount)))
+        for messageCount in messagesPerUpdate:
+            cases.append(BenchmarkCase(
+                "lastvalue.cycle[fields={},messages={}]".format(fieldCount, messageCount),
+                lambda fieldCount = fieldCount, messageCount = messageCount:
+                    createCycle(LastValueUpdateBuffer, fieldCount, messageCount)))
+            cases.append(BenchmarkCase(
+                "average.cycle[fields={},messages={}]".format(fieldCount, messageCount),
+                lambda fieldCount = fieldCount, messageCount = messageCount:
+                    createCycle(AverageUpdateBuffer, fieldCount, messageCount)))
+            cases.append(BenchmarkCase(
+                "change.cycle[fields={},messages={}]".format(fieldCount, messageCount),
+                lambda fieldCount = fieldCount, messageCount = messageCount:
+                    changeCycle(fieldCount, messageCount)))
+    return cases
+
+def compareResults(results, baseline, threshold):
+    """!
+    Compare best times with baseline.
+
+    @param results Mapping {caseName: result}.
+    @param baseline Mapping {caseName: result} loaded from baseline file.
+    @param threshold Relative slowdown reported as regression.
+    @return Mapping {caseName: ratio} of current best time to baseline best
+        time and list of regressed case names.
+    """
+    ratios = {}
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result["best"] / baseline[name]["best"]
+        ratios[name] = ratio
+        if ratio > 1 + threshold:
+            regressions.append(name)
+    return ratios, regressions
+
+def formatTime(seconds):
+    """!
+    Format duration with suitable unit.
+
+    @param seconds Duration in seconds.
+    @return String.
+    """
+    for unit, scale in (("ns", 1e-9), ("us", 1e-6), ("ms", 1e-3)):
+        if seconds < scale * 1000:
+            return "{:.1f} {}".format(seconds / scale, unit)
+    return "{:.2f} s".format(seconds)
+
+def main():
+    parser = createParser()
+    options = parser.parse_args()
+    if options.repeat <= 0 or options.min_time <= 0:
+        parser.error("repeat and min time must be positive")
+
+    # Keep logging out of measured code, as in non-verbose mqspeak.
+    logging.basicConfig(stream = sys.stderr, level = logging.CRITICAL)
+
+    cases = [case for case in createCases() if options.filter in case.name]
+    if options.list:
+        for case in cases:
+            print(case.name)
+        return
+
+    results = {}
+    for case in cases:
+        results[case.name] = case.run(options.repeat, options.min_time)
+        if not options.json:
+            print("{:<45} {:>12} {:>12}".format(
+                case.name,
+                formatTime(results[case.name]["best"]),
+                formatTime(results[case.name]["median"])), flush = True)
+
+    report = {
+        "version": mqspeak.__version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "cases": results}
+
+    exitCode = 0
+    if options.compare is not None:
+        with open(options.compare) as f:
+            baseline = json.load(f)
+        for key in ("python", "platform", "machine", "cpus"):
+            if baseline.get(key) != report[key]:
+                # Logging is disabled while cases run.
+                print("Warning: baseline {} differs: {} (current {})".format(
+                    key, baseline.get(key), report[key]), file = sys.stderr)
+        ratios, regressions = compareResults(results, baseline["cases"], options.threshold)
+        report["comparison"] = {"baseline": options.compare, "ratios": ratios, "regressions": regressions}
+        if not options.json:
+            print()
+            for name, ratio in ratios.items():
+                print("{:<45} {:>8.2f}x{}".format(name, ratio, "  REGRESSION" if name in regressions else ""))
+        if len(regressions) > 0:
+            exitCode = 1
+
+    if options.save is not None:
+        with open(options.save, "w") as f:
+            f.write(json.dumps(report, indent = 2, sort_keys = True) + "\n")
+    if options.json:
+        print(json.dumps(report, indent = 2, sort_keys = True))
+    sys.exit(exitCode)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+# Copyright (C) Ivo Slanina <ivo.slanina@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import http.server
+import json
+import random
+import threading
+import time
+
+class FakeServer:
+    """!
+    Local HTTP server answering ThingSpeak and Phant update requests. Each
+    request is delayed by configured latency and fails with configured
+    probability.
+    """
+
+    ## @var latency
+    # Mean response delay in seconds.
+
+    ## @var jitter
+    # Maximum random deviation of response delay in seconds.
+
+    ## @var errorRate
+    # Probability of failed response from 0 to 1.
+
+    ## @var random
+    # Random generator of delays and failures.
+
+    ## @var requestCount
+    # Number of received requests.
+
+    ## @var errorCount
+    # Number of failed responses.
+
+    ## @var statisticsLock
+    # Mutual exclusion for random generator and counters.
+
+    ## @var server
+    # HTTP server object or None if server isn't running.
+
+    def __init__(self, latency = 0.0, jitter = 0.0, errorRate = 0.0, seed = None):
+        """!
+        Initiate FakeServer object.
+
+        @param latency Mean response delay in seconds.
+        @param jitter Maximum random deviation of response delay in seconds.
+        @param errorRate Probability of failed response from 0 to 1.
+        @param seed Seed of random generator or None.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.errorRate = errorRate
+        self.random = random.Random(seed)
+        self.requestCount = 0
+        self.errorCount = 0
+        self.statisticsLock = threading.Semaphore(1)
+        self.server = None
+
+    def start(self):
+        """!
+        Start listening on random local port in separate thread.
+        """
+        fakeServer = self
+
+        class FakeRequestHandler(http.server.BaseHTTPRequestHandler):
+            # Keep-alive connections are reused by sender connection pools.
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                self.rfile.read(length)
+                status, body = fakeServer.respond(self.path)
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), FakeRequestHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target = self.server.serve_forever, daemon = True).start()
+
+    def stop(self):
+        """!
+        Stop listening.
+        """
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def getAddress(self):
+        """!
+        Get address of running server.
+
+        @return String host:port.
+        """
+        host, port = self.server.server_address[:2]
+        return "{}:{}".format(host, port)
+
+    def respond(self, path):
+        """!
+        Wait for response delay and create response.
+
+        @param path Request path.
+        @return Tuple (status, body).
+        """
+        self.statisticsLock.acquire()
+        try:
+            self.requestCount += 1
+            entryID = self.requestCount
+            delay = self.latency + self.random.uniform(-self.jitter, self.jitter)
+            failed = self.random.random() < self.errorRate
+            if failed:
+                self.errorCount += 1
+        finally:
+            self.statisticsLock.release()
+        if delay > 0:
+            time.sleep(delay)
+        if failed:
+            return (503, b"Service Unavailable")
+        if path.endswith("/bulk_update.json"):
+            return (202, json.dumps({"success": True}).encode("utf-8"))
+        if path.startswith("/input/"):
+            return (200, b"1 success\n")
+        return (200, str(entryID).encode("utf-8"))
+
+    def getCounts(self):
+        """!
+        Get request counters.
+
+        @return Tuple (requestCount, errorCount).
+        """
+        self.statisticsLock.acquire()
+        try:
+            return (self.requestCount, self.errorCount)
+        finally:
+            self.statisticsLock.release()
@@ -14,6 +14,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import enum
+import zlib
 
 class ChannelType(enum.Enum):
     """!
@@ -43,6 +44,29 @@ class Channel:
     ## @var waiting
     # Channel waiting timedelta object or None if waiting is disabled.
 
+    ## @var bulkSize
+    # Maximum number of queued measurements sent in single update.
+
+    ## @var retryLimit
+    # Maximum number of repeated attempts to send failed update.
+
+    ## @var retryDelay
+    # Timedelta object of delay before first repeated attempt.
+
+    ## @var retryMaxDelay
+    # Timedelta object of maximum delay between repeated attempts.
+
+    ## @var maxUpdateInterval
+    # Timedelta object of maximum adaptive update interval or None if update
+    # interval is fixed.
+
+    ## @var priority
+    # Dispatch priority weight. Deadline of queued update is shortened by this factor.
+
+    ## @var stagger
+    # Fraction of update interval over which phase offsets of periodic updates
+    # are spread. Zero disables staggering.
+
     def __init__(self, channelType, name, channelID, apiKey, waiting):
         """!
         Initiate channel object.
@@ -58,6 +82,13 @@ class Channel:
         self.channelID = channelID
         self.apiKey = apiKey
         self.waiting = waiting
+        self.bulkSize = 1
+        self.retryLimit = 0
+        self.retryDelay = None
+        self.retryMaxDelay = None
+        self.maxUpdateInterval = None
+        self.priority = 1.0
+        self.stagger = 0.0
 
     def __hash__(self):
         """!
@@ -91,6 +122,93 @@ class Channel:
         """
         return self.waiting is not None
 
+    def setBulkSize(self, bulkSize):
+        """!
+        Set maximum number of queued measurements sent in single update.
+
+        @param bulkSize Number of measurements.
+        """
+        self.bulkSize = bulkSize
+
+    def hasBulkUpdate(self):
+        """!
+        Check if channel sends several measurements in single update.
+
+        @return True if bulk update is enabled, False otherwise.
+        """
+        return self.bulkSize > 1
+
+    def setRetryPolicy(self, retryLimit, retryDelay, retryMaxDelay):
+        """!
+        Set retry policy of failed updates.
+
+        @param retryLimit Maximum number of repeated attempts. Zero disables retries.
+        @param retryDelay Timedelta object of delay before first repeated attempt.
+        @param retryMaxDelay Timedelta object of maximum delay between repeated attempts.
+        """
+        self.retryLimit = retryLimit
+        self.retryDelay = retryDelay
+        self.retryMaxDelay = retryMaxDelay
+
+    def hasRetry(self):
+        """!
+        Check if failed updates are repeated.
+
+        @return True if retry is enabled, False otherwise.
+        """
+        return self.retryLimit > 0
+
+    def setAdaptiveRate(self, maxUpdateInterval):
+        """!
+        Enable adaptive update interval.
+
+        @param maxUpdateInterval Timedelta object of maximum update interval.
+        """
+        self.maxUpdateInterval = maxUpdateInterval
+
+    def hasAdaptiveRate(self):
+        """!
+        Check if update interval adapts to server responses.
+
+        @return True if adaptive update interval is enabled, False otherwise.
+        """
+        return self.maxUpdateInterval is not None
+
+    def setPriority(self, priority):
+        """!
+        Set dispatch priority weight.
+
+        @param priority Positive number. Updates of channel with priority 2 are due
+            in half of update interval.
+        """
+        self.priority = priority
+
+    def setStagger(self, stagger):
+        """!
+        Set fraction of update interval over which update phase offsets are spread.
+
+        @param stagger Number from 0 to 1.
+        """
+        self.stagger = stagger
+
+    def hasStagger(self):
+        """!
+        Check if periodic updates are shifted by channel phase offset.
+
+        @return True if staggering is enabled, False otherwise.
+        """
+        return self.stagger > 0
+
+    def getPhaseFraction(self):
+        """!
+        Get phase offset of channel updates as fraction of update interval. Offset
+        is derived from channel name, so it is the same after restart and different
+        channels are spread evenly.
+
+        @return Number from 0 to stagger fraction.
+        """
+        return zlib.crc32(self.name.encode()) / 2**32 * self.stagger
+
 class ThingSpeakChannel(Channel):
     """!
     ThingSpeak channel identification object.
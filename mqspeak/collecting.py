@@ -13,20 +13,46 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import array
+import datetime
 import logging
 import collections
 import copy
+import math
+import re
+import threading
+import time
 from mqreceive.data import DataIdentifier
 from mqspeak.data import Measurement
+from mqspeak.logs import LogCoalescer
+from mqspeak.statistics import RunningStatistics, TDigest
 
 class BaseUpdateBuffer:
     """!
     Class for buffering required data set before sending them out.
     """
 
+    ## @var queuesMeasurements
+    # Buffer creates measurements when data are received and queues them.
+    # Other buffers merge received data and create measurement before send.
+    queuesMeasurements = False
+
     ## @var dataIdentifiers
     # Iterable of DataIdentifier objects.
 
+    ## @var supersededIds
+    # List of spool identifiers of records which are no longer needed. Their
+    # data were merged into buffer or discarded.
+
+    ## @var topicStore
+    # TopicStore object shared with other buffers or None.
+
+    ## @var discardedCount
+    # Number of measurements discarded since last takeDiscardedCount() call.
+
+    ## @var overwrittenCount
+    # Number of stored values overwritten since last takeOverwrittenCount() call.
+
     def __init__(self, dataIdentifiers):
         """!
         Initiate UpdateBuffer object.
@@ -34,6 +60,42 @@ class BaseUpdateBuffer:
         @param dataIdentifiers Iterable of DataIdentifier objects.
         """
         self.dataIdentifiers = dataIdentifiers
+        self.supersededIds = []
+        self.topicStore = None
+        self.discardedCount = 0
+        self.overwrittenCount = 0
+
+    def setTopicStore(self, topicStore):
+        """!
+        Assign store of received values shared with other buffers. Extend this
+        method if buffer keeps some state which can be shared.
+
+        @param topicStore TopicStore object.
+        """
+        self.topicStore = topicStore
+
+    def parseNumber(self, dataIdentifier, value):
+        """!
+        Convert received value to number. Value is converted only once for all
+        buffers sharing the same topic store.
+
+        @param dataIdentifier Data identification.
+        @param value Received value.
+        @return Float value.
+        @throws ValueError If value is not number.
+        """
+        if self.topicStore is not None:
+            return self.topicStore.getNumber(dataIdentifier, value)
+        return TopicState.convertNumber(value)
+
+    def takeNewMeasurements(self):
+        """!
+        Get measurements created since last call, which are waiting in buffer.
+        Buffers which merge received data don't create measurements before send.
+
+        @return List of Measurement objects.
+        """
+        return []
 
     def isComplete(self):
         """!
@@ -78,6 +140,81 @@ class BaseUpdateBuffer:
         """
         raise NotImplementedError("Override this mehod in sub-class")
 
+    def popMeasurements(self, limit):
+        """!
+        Get up to limit measurements and remove them from buffer.
+
+        @param limit Maximum number of measurements.
+        @return List of Measurement objects.
+        """
+        measurement = self.getMeasurement()
+        self.reset()
+        return [measurement]
+
+    def restoreMeasurements(self, measurements):
+        """!
+        Return measurements which weren't sent back to buffer, so they can be
+        sent again. Newer data already stored in buffer take precedence.
+
+        @param measurements List of measurements returned by popMeasurements()
+            or getMeasurement().
+        @return True if some data were restored, False if buffer can't restore them.
+        """
+        return False
+
+    def supersedeMeasurements(self, measurements):
+        """!
+        Mark spooled records of measurements as no longer needed. They are removed
+        from spool together with next sent update.
+
+        @param measurements Iterable of Measurement objects.
+        """
+        for measurement in measurements:
+            if measurement.spoolId is not None:
+                self.supersededIds.append(measurement.spoolId)
+            self.supersededIds.extend(measurement.supersededIds)
+            measurement.supersededIds = []
+
+    def getPendingCount(self):
+        """!
+        Get number of measurements waiting in buffer. Method doesn't require
+        exclusive access to buffer, result may be outdated.
+
+        @return Number of measurements.
+        """
+        return 1 if self.hasAnyData() else 0
+
+    def takeDiscardedCount(self):
+        """!
+        Get number of measurements discarded because buffer was full and reset counter.
+
+        @return Number of measurements.
+        """
+        discardedCount = self.discardedCount
+        self.discardedCount = 0
+        return discardedCount
+
+    def takeOverwrittenCount(self):
+        """!
+        Get number of stored values overwritten before they were aggregated and
+        reset counter.
+
+        @return Number of values.
+        """
+        overwrittenCount = self.overwrittenCount
+        self.overwrittenCount = 0
+        return overwrittenCount
+
+    def takeSupersededIds(self):
+        """!
+        Get spool identifiers of superseded records and forget them.
+
+        @return List of spool identifiers.
+        """
+        supersededIds = self.supersededIds
+        self.supersededIds = []
+        return supersededIds
+
     def getMissingDataIdentifiers(self):
         """!
         Get iterable of data identifiers which doesn't have stored data.
@@ -180,62 +317,871 @@ class LastValueUpdateBuffer(SingleValueUpdateBuffer):
     def getData(self):
         return copy.deepcopy(self.dataMapping)
 
-class AverageUpdateBuffer(SingleValueUpdateBuffer):
+    def restoreMeasurements(self, measurements):
+        # Newest restored value wins.
+        for measurement in reversed(measurements):
+            for dataIdentifier, value in measurement.fields.items():
+                if value is not None and self.dataMapping.get(dataIdentifier, value) is None:
+                    self.dataMapping[dataIdentifier] = value
+                    self.hasData = True
+        self.supersedeMeasurements(measurements)
+        return True
+
+class AggregatingUpdateBuffer(SingleValueUpdateBuffer):
     """!
-    Calculate arithmetic average value. Each new value is stored in internal buffer.
-    getData() method returns data mapping with calculated average value.
+    Base class for update buffers which aggregate numeric values. Values are not
+    stored, each data identifier keeps only statistics object with constant size,
+    so memory doesn't grow with number of received values. getData() method returns
+    data mapping with aggregated values.
     """
 
+    ## @var defaultAggregation
+    # Aggregation name used for data identifiers without explicit aggregation.
+    defaultAggregation = None
+
+    ## @var aggregationMapping
+    # The {DataIdentifier: aggregationName} mapping.
+
+    ## @var releasedMapping
+    # The {DataIdentifier: statistics} mapping of last reset data or None.
+
+    def __init__(self, dataIdentifiers, aggregationMapping = None):
+        """!
+        Initiate AggregatingUpdateBuffer object.
+
+        @param dataIdentifiers Iterable of DataIdentifier objects.
+        @param aggregationMapping Mapping {DataIdentifier: aggregationName}. Data
+            identifiers which are not present use default aggregation.
+        """
+        SingleValueUpdateBuffer.__init__(self, dataIdentifiers)
+        self.aggregationMapping = {}
+        for dataIdentifier in dataIdentifiers:
+            self.aggregationMapping[dataIdentifier] = self.defaultAggregation
+        if aggregationMapping is not None:
+            for dataIdentifier, aggregation in aggregationMapping.items():
+                if not self.isAggregationSupported(aggregation):
+                    raise ValueError("Unknown aggregation: {}".format(aggregation))
+                self.aggregationMapping[dataIdentifier] = aggregation
+        self.releasedMapping = None
+
+    @classmethod
+    def isAggregationSupported(cls, aggregation):
+        """!
+        Check if aggregation name is supported by this buffer.
+
+        @param aggregation Aggregation name.
+        @return True if aggregation is supported, False otherwise.
+        """
+        raise NotImplementedError("Override this mehod in sub-class")
+
+    def createStatistics(self):
+        """!
+        Create empty statistics object for single data identifier.
+
+        @return Statistics object with push(value) method.
+        """
+        raise NotImplementedError("Override this mehod in sub-class")
+
+    def aggregate(self, statistics, aggregation):
+        """!
+        Calculate aggregated value.
+
+        @param statistics Statistics object.
+        @param aggregation Aggregation name.
+        @return Aggregated value.
+        """
+        raise NotImplementedError("Override this mehod in sub-class")
+
     def handleUpdateReceivedData(self, dataIdentifier, value):
-        try:
-            value = float(value)
-            if self.dataMapping[dataIdentifier] is None:
-                self.dataMapping[dataIdentifier] = []
-            self.dataMapping[dataIdentifier].append(value)
-        except ValueError as ex:
-            raise ValueError("Can't convert data to number: {}".format(value))
+        value = self.parseNumber(dataIdentifier, value)
+        if self.dataMapping[dataIdentifier] is None:
+            self.dataMapping[dataIdentifier] = self.createStatistics()
+        self.dataMapping[dataIdentifier].push(value)
 
     def getData(self):
         mapping = {}
-        for dataIdentifier, valueList in self.dataMapping.items():
-            if valueList is not None:
-                mapping[dataIdentifier] = float(sum(valueList)) / len(valueList)
+        for dataIdentifier, statistics in self.dataMapping.items():
+            if statistics is not None:
+                mapping[dataIdentifier] = self.aggregate(statistics, self.aggregationMapping[dataIdentifier])
             else:
                 mapping[dataIdentifier] = None
         return mapping
 
-class ChangeValueBuffer(BaseUpdateBuffer):
+    def reset(self):
+        # Keep statistics of sent data. Aggregated values can't be merged with
+        # newer data, statistics can.
+        self.releasedMapping = self.dataMapping
+        self.dataMapping = {}
+        for dataIdentifier in self.dataIdentifiers:
+            self.dataMapping[dataIdentifier] = None
+        self.hasData = False
+
+    def restoreMeasurements(self, measurements):
+        if self.releasedMapping is None:
+            # Statistics are lost (measurements were loaded from spool). Restore
+            # each aggregated value as single sample.
+            for measurement in measurements:
+                for dataIdentifier, value in measurement.fields.items():
+                    if value is not None and self.isUpdateRelevant(dataIdentifier):
+                        self.updateReceivedData(dataIdentifier, value)
+            self.supersedeMeasurements(measurements)
+            return True
+        for dataIdentifier, statistics in self.releasedMapping.items():
+            if statistics is None:
+                continue
+            if self.dataMapping[dataIdentifier] is None:
+                self.dataMapping[dataIdentifier] = statistics
+            else:
+                self.dataMapping[dataIdentifier].merge(statistics)
+            self.hasData = True
+        self.releasedMapping = None
+        self.supersedeMeasurements(measurements)
+        return True
+
+class AverageUpdateBuffer(AggregatingUpdateBuffer):
     """!
-    Store all change updates.
+    Aggregate values with RunningStatistics object. By default, arithmetic average
+    value is calculated.
     """
 
-    def __init__(self, dataIdentifiers):
+    ## @var aggregations
+    # Mapping {aggregationName: method of RunningStatistics}.
+    aggregations = {
+        "average": RunningStatistics.getMean,
+        "min": RunningStatistics.getMin,
+        "max": RunningStatistics.getMax,
+        "stddev": RunningStatistics.getStandardDeviation,
+        "count": RunningStatistics.getCount,
+    }
+
+    defaultAggregation = "average"
+
+    @classmethod
+    def isAggregationSupported(cls, aggregation):
+        return aggregation in cls.aggregations
+
+    def createStatistics(self):
+        return RunningStatistics()
+
+    def aggregate(self, statistics, aggregation):
+        return self.aggregations[aggregation](statistics)
+
+class QuantileUpdateBuffer(AggregatingUpdateBuffer):
+    """!
+    Estimate quantiles of values with TDigest sketch. Aggregation is either
+    `median` or `pNN` for NN-th percentile (for example `p95` or `p99.9`).
+    By default, median is calculated.
+    """
+
+    ## @var percentilePattern
+    # Regular expression matching percentile aggregation names.
+    percentilePattern = re.compile(r"^p(\d{1,2}(\.\d+)?)$")
+
+    defaultAggregation = "median"
+
+    @classmethod
+    def isAggregationSupported(cls, aggregation):
+        return cls.getQuantileLevel(aggregation) is not None
+
+    @classmethod
+    def getQuantileLevel(cls, aggregation):
+        """!
+        Translate aggregation name into quantile level.
+
+        @param aggregation Aggregation name.
+        @return Quantile level in range from 0 to 1 or None for unknown aggregation.
+        """
+        if aggregation == "median":
+            return 0.5
+        match = cls.percentilePattern.match(aggregation)
+        if match is None:
+            return None
+        return float(match.group(1)) / 100
+
+    def createStatistics(self):
+        return TDigest()
+
+    def aggregate(self, statistics, aggregation):
+        return statistics.getQuantile(self.getQuantileLevel(aggregation))
+
+class MeasurementQueueBuffer(BaseUpdateBuffer):
+    """!
+    Base class for update buffers which produce queue of measurements. Each
+    measurement is sent separately, oldest first.
+    """
+
+    queuesMeasurements = True
+
+    ## @var measurementBuffer
+    # Queue of Measurement objects waiting for send.
+
+    ## @var newMeasurements
+    # List of measurements appended since last takeNewMeasurements() call.
+
+    def __init__(self, dataIdentifiers, maxLength = None):
+        """!
+        Initiate MeasurementQueueBuffer object.
+
+        @param dataIdentifiers Iterable of DataIdentifier objects.
+        @param maxLength Maximum number of queued measurements or None for unbounded
+            queue. Oldest measurements are discarded.
+        """
         BaseUpdateBuffer.__init__(self, dataIdentifiers)
+        self.measurementBuffer = collections.deque(maxlen = maxLength)
+        self.newMeasurements = []
+
+    def reset(self):
+        self.measurementBuffer.popleft()
+
+    def getMeasurement(self):
+        return self.measurementBuffer[0]
+
+    def popMeasurements(self, limit):
+        measurements = []
+        while len(measurements) < limit and len(self.measurementBuffer) > 0:
+            measurements.append(self.measurementBuffer.popleft())
+        return measurements
+
+    def appendMeasurement(self, measurement):
+        """!
+        Append new measurement to the end of queue. When queue is full, oldest
+        measurement is discarded.
+
+        @param measurement Measurement object.
+        """
+        if len(self.measurementBuffer) == self.measurementBuffer.maxlen:
+            self.supersedeMeasurements([self.measurementBuffer[0]])
+            self.discardedCount += 1
+        self.measurementBuffer.append(measurement)
+        self.newMeasurements.append(measurement)
+
+    def takeNewMeasurements(self):
+        newMeasurements = self.newMeasurements
+        self.newMeasurements = []
+        return newMeasurements
+
+    def restoreMeasurements(self, measurements):
+        restored = measurements
+        maxLength = self.measurementBuffer.maxlen
+        if maxLength is not None:
+            # Restored measurements are the oldest ones, discard them first.
+            room = max(maxLength - len(self.measurementBuffer), 0)
+            discarded = max(len(measurements) - room, 0)
+            restored = measurements[discarded:]
+            if discarded > 0:
+                logging.getLogger().warning("Measurement queue is full, discarding %s measurements.", discarded)
+                self.supersedeMeasurements(measurements[:discarded])
+                self.discardedCount += discarded
+        self.measurementBuffer.extendleft(reversed(restored))
+        return len(restored) > 0
+
+    def getPendingCount(self):
+        return len(self.measurementBuffer)
+
+    def getMissingDataIdentifiers(self):
+        return iter(())
+
+    def hasAnyData(self):
+        return len(self.measurementBuffer) > 0
+
+    def isComplete(self):
+        return self.hasAnyData()
+
+class ChangeValueBuffer(MeasurementQueueBuffer):
+    """!
+    Store all change updates.
+    """
+
+    ## @var duplicateLog
+    # LogCoalescer object shared by all buffers reporting skipped duplicate values.
+    duplicateLog = LogCoalescer(logging.ERROR, "%d duplicate values skipped on %s in %.1f s")
+
+    def __init__(self, dataIdentifiers, maxLength = 1024):
+        """!
+        Initiate ChangeValueBuffer object.
+
+        @param dataIdentifiers Iterable of DataIdentifier objects.
+        @param maxLength Maximum number of queued changes. Oldest changes are discarded.
+        """
+        MeasurementQueueBuffer.__init__(self, dataIdentifiers, maxLength)
         self.lastValueMapping = {}
         for dataIdentifier in dataIdentifiers:
             self.lastValueMapping[dataIdentifier] = None
-        self.measurementBuffer = collections.deque()
 
     def updateReceivedData(self, dataIdentifier, value):
         if self.lastValueMapping[dataIdentifier] is None or self.lastValueMapping[dataIdentifier] != value:
             self.lastValueMapping[dataIdentifier] = value
             measurement = Measurement.currentMeasurement({dataIdentifier: value})
-            self.measurementBuffer.append(measurement)
+            self.appendMeasurement(measurement)
         else:
-            logging.getLogger().error(
-                "New data are equals to previous one ({}: {}). Skipping...".format(dataIdentifier, repr(value)))
+            self.duplicateLog.log(
+                dataIdentifier, "New data are equals to previous one (%s: %r). Skipping...", dataIdentifier, value)
 
-    def reset(self):
-        self.measurementBuffer.popleft()
+class WindowUpdateBuffer(MeasurementQueueBuffer):
+    """!
+    Aggregate numeric values in time windows aligned to wall clock. Window of
+    windowSize seconds is closed each windowStep seconds. When step is equal to
+    size, windows are tumbling, otherwise they are sliding and overlap.
 
-    def getMeasurement(self):
-        return self.measurementBuffer[0]
+    Received values are stored with timestamps in fixed size RingBuffer objects.
+    Each closed window produces one queued Measurement stamped with window end time.
+    Values overwritten in full ring are missing in their windows, they are counted
+    and reported.
+    """
 
-    def hasAnyData(self):
-        return len(self.measurementBuffer) > 0
+    ## @var overwriteLog
+    # LogCoalescer object shared by all buffers reporting overwritten values.
+    overwriteLog = LogCoalescer(logging.WARNING, "%d window capacity warnings skipped on %s in %.1f s")
 
-    def isComplete(self):
-        return self.hasAnyData()
+    ## @var windowSize
+    # Window length in seconds.
+
+    ## @var windowStep
+    # Interval between two closed windows in seconds.
+
+    ## @var capacity
+    # Maximum number of stored values of single data identifier.
+
+    ## @var ringMapping
+    # The {DataIdentifier: RingBuffer} mapping. Rings are shared with other
+    # buffers when topic store is assigned.
+
+    ## @var aggregationMapping
+    # The {DataIdentifier: aggregationName} mapping.
+
+    ## @var windowEnd
+    # Timestamp of end of next closed window.
+
+    ## @var ringOverwrites
+    # The {DataIdentifier: count} mapping of ring overwrites already reported.
+
+    def __init__(self, dataIdentifiers, windowSize, windowStep, capacity = 1024,
+            aggregationMapping = None, maxPendingWindows = 1024):
+        """!
+        Initiate WindowUpdateBuffer object.
+
+        @param dataIdentifiers Iterable of DataIdentifier objects.
+        @param windowSize Window length timedelta object.
+        @param windowStep Window step timedelta object.
+        @param capacity Maximum number of stored values of single data identifier.
+        @param aggregationMapping Mapping {DataIdentifier: aggregationName}. Data
+            identifiers which are not present are averaged.
+        @param maxPendingWindows Maximum number of closed windows waiting for send.
+            Oldest windows are discarded.
+        """
+        MeasurementQueueBuffer.__init__(self, dataIdentifiers, maxPendingWindows)
+        self.windowSize = windowSize.total_seconds()
+        self.windowStep = windowStep.total_seconds()
+        self.capacity = capacity
+        self.ringMapping = {}
+        self.aggregationMapping = {}
+        self.ringOverwrites = {}
+        for dataIdentifier in dataIdentifiers:
+            self.ringMapping[dataIdentifier] = RingBuffer(capacity)
+            self.ringOverwrites[dataIdentifier] = 0
+            self.aggregationMapping[dataIdentifier] = AverageUpdateBuffer.defaultAggregation
+        if aggregationMapping is not None:
+            for dataIdentifier, aggregation in aggregationMapping.items():
+                if not self.isAggregationSupported(aggregation):
+                    raise ValueError("Unknown aggregation: {}".format(aggregation))
+                self.aggregationMapping[dataIdentifier] = aggregation
+        self.windowEnd = self.getAlignedWindowEnd(time.time())
+
+    @classmethod
+    def isAggregationSupported(cls, aggregation):
+        """!
+        Check if aggregation name is supported by this buffer.
+
+        @param aggregation Aggregation name.
+        @return True if aggregation is supported, False otherwise.
+        """
+        return AverageUpdateBuffer.isAggregationSupported(aggregation)
+
+    def setTopicStore(self, topicStore):
+        """!
+        Read values from rings shared by all window buffers of the same topic
+        instead of storing them again. Topic store appends values when they are
+        received. Call before any data are received.
+
+        @param topicStore TopicStore object.
+        """
+        MeasurementQueueBuffer.setTopicStore(self, topicStore)
+        for dataIdentifier in self.ringMapping:
+            self.ringMapping[dataIdentifier] = topicStore.getSharedRing(
+                dataIdentifier, self.capacity, self.windowSize)
+
+    def getAlignedWindowEnd(self, timestamp):
+        """!
+        Get end of first window which ends after timestamp.
+
+        @param timestamp Unix timestamp.
+        @return Unix timestamp of window end.
+        """
+        return (math.floor(timestamp / self.windowStep) + 1) * self.windowStep
+
+    def updateReceivedData(self, dataIdentifier, value):
+        if not self.isUpdateRelevant(dataIdentifier):
+            raise TopicException("Illegal topic update: {}".format(dataIdentifier))
+        if self.topicStore is not None:
+            # Value is already stored in shared ring. Conversion is cached, it
+            # only reports invalid values.
+            self.parseNumber(dataIdentifier, value)
+            self.closeWindows(time.time())
+        else:
+            value = self.parseNumber(dataIdentifier, value)
+            now = time.time()
+            self.closeWindows(now)
+            self.ringMapping[dataIdentifier].append(now, value)
+        self.collectOverwrites(dataIdentifier)
+
+    def collectOverwrites(self, dataIdentifier):
+        """!
+        Count values of data identifier overwritten since last check and warn
+        that window capacity is too small.
+
+        @param dataIdentifier Data identification.
+        """
+        ringBuffer = self.ringMapping[dataIdentifier]
+        ringOverwrites = ringBuffer.getOverwrittenCount()
+        overwritten = ringOverwrites - self.ringOverwrites[dataIdentifier]
+        if overwritten <= 0:
+            return
+        self.ringOverwrites[dataIdentifier] = ringOverwrites
+        self.overwrittenCount += overwritten
+        self.overwriteLog.log(
+            dataIdentifier, "Window capacity %d of %s exceeded, %d values overwritten before their window closed.",
+            ringBuffer.capacity, dataIdentifier, overwritten)
+
+    def closeWindows(self, now):
+        """!
+        Close all windows which ended before given time.
+
+        @param now Unix timestamp.
+        """
+        while self.windowEnd <= now:
+            windowStart = self.windowEnd - self.windowSize
+            measurement = self.createWindowMeasurement(windowStart, self.windowEnd)
+            if measurement is not None:
+                self.appendMeasurement(measurement)
+            self.windowEnd += self.windowStep
+            # Samples older than start of next window are not needed anymore.
+            if self.topicStore is None:
+                for ringBuffer in self.ringMapping.values():
+                    ringBuffer.discardBefore(self.windowEnd - self.windowSize)
+            if not self.hasPendingSamples():
+                # Skip empty windows at once.
+                self.windowEnd = max(self.windowEnd, self.getAlignedWindowEnd(now))
+
+    def createWindowMeasurement(self, windowStart, windowEnd):
+        """!
+        Aggregate values of single window.
+
+        @param windowStart Unix timestamp of window start.
+        @param windowEnd Unix timestamp of window end.
+        @return Measurement object or None if window doesn't contain any data.
+        """
+        fields = {}
+        hasData = False
+        for dataIdentifier, ringBuffer in self.ringMapping.items():
+            statistics = RunningStatistics()
+            for value in ringBuffer.getValues(windowStart, windowEnd):
+                statistics.push(value)
+            if statistics.getCount() > 0:
+                aggregation = AverageUpdateBuffer.aggregations[self.aggregationMapping[dataIdentifier]]
+                fields[dataIdentifier] = aggregation(statistics)
+                hasData = True
+            else:
+                fields[dataIdentifier] = None
+        if not hasData:
+            return None
+        return Measurement(fields, datetime.datetime.utcfromtimestamp(windowEnd))
+
+    def hasPendingSamples(self):
+        """!
+        Check if some stored values belong to windows which are not closed yet.
+
+        @return True if there are some stored values, False otherwise.
+        """
+        windowStart = self.windowEnd - self.windowSize
+        for ringBuffer in self.ringMapping.values():
+            lastTimestamp = ringBuffer.getLastTimestamp()
+            if lastTimestamp is not None and lastTimestamp >= windowStart:
+                return True
+        return False
+
+    def getNextWindowEnd(self):
+        """!
+        Get end of next closed window.
+
+        @return Unix timestamp.
+        """
+        return self.windowEnd
+
+class RingBuffer:
+    """!
+    Fixed size buffer of timestamped values stored in preallocated arrays. When
+    buffer is full, oldest value is overwritten. Values have to be appended in
+    order of their timestamps.
+    """
+
+    ## @var capacity
+    # Maximum number of stored values.
+
+    ## @var timestamps
+    # Array of value timestamps.
+
+    ## @var values
+    # Array of values.
+
+    ## @var start
+    # Index of oldest value.
+
+    ## @var length
+    # Number of stored values.
+
+    ## @var retention
+    # Number of seconds values are needed after newer value is appended, or None
+    # if they are needed until they are discarded.
+
+    ## @var overwrittenCount
+    # Number of values overwritten while they were still needed.
+
+    def __init__(self, capacity, retention = None):
+        """!
+        Initiate RingBuffer object.
+
+        @param capacity Maximum number of stored values.
+        @param retention Number of seconds values are needed or None if they are
+            needed until they are discarded.
+        """
+        self.capacity = capacity
+        self.retention = retention
+        self.timestamps = array.array('d', bytes(8 * capacity))
+        self.values = array.array('d', bytes(8 * capacity))
+        self.start = 0
+        self.length = 0
+        self.overwrittenCount = 0
+
+    def append(self, timestamp, value):
+        """!
+        Store new value.
+
+        @param timestamp Unix timestamp.
+        @param value Number.
+        """
+        index = (self.start + self.length) % self.capacity
+        if self.length < self.capacity:
+            self.length += 1
+        else:
+            # Oldest value is overwritten.
+            if self.retention is None or self.timestamps[index] >= timestamp - self.retention:
+                self.overwrittenCount += 1
+            self.start = (self.start + 1) % self.capacity
+        self.timestamps[index] = timestamp
+        self.values[index] = value
+
+    def getOverwrittenCount(self):
+        """!
+        Get number of values overwritten while they were still needed.
+
+        @return Number of values.
+        """
+        return self.overwrittenCount
+
+    def discardBefore(self, timestamp):
+        """!
+        Discard values older than timestamp.
+
+        @param timestamp Unix timestamp.
+        """
+        while self.length > 0 and self.timestamps[self.start] < timestamp:
+            self.start = (self.start + 1) % self.capacity
+            self.length -= 1
+
+    def getLastTimestamp(self):
+        """!
+        Get timestamp of newest value.
+
+        @return Unix timestamp or None if buffer is empty.
+        """
+        if self.length == 0:
+            return None
+        return self.timestamps[(self.start + self.length - 1) % self.capacity]
+
+    def findPosition(self, timestamp):
+        """!
+        Find position of oldest value which is not older than timestamp.
+
+        @param timestamp Unix timestamp.
+        @return Position counted from oldest value.
+        """
+        low = 0
+        high = self.length
+        while low < high:
+            middle = (low + high) // 2
+            if self.timestamps[(self.start + middle) % self.capacity] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def getValues(self, begin, end):
+        """!
+        Get values with timestamp in interval [begin, end).
+
+        @param begin Unix timestamp.
+        @param end Unix timestamp.
+        @return Iterable of values.
+        """
+        for i in range(self.findPosition(begin), self.length):
+            index = (self.start + i) % self.capacity
+            timestamp = self.timestamps[index]
+            if timestamp >= end:
+                return
+            if timestamp >= begin:
+                yield self.values[index]
+
+    def __len__(self):
+        """!
+        Get number of stored values.
+
+        @return Number of values.
+        """
+        return self.length
+
+class SharedRingBuffer(RingBuffer):
+    """!
+    Ring buffer of single topic shared by several window buffers. Values are
+    appended by receiving thread and read by updater threads, so all access is
+    synchronized. Readers select values by time, they never discard them, so
+    only values within retention of the longest window are counted as
+    overwritten.
+    """
+
+    ## @var ringLock
+    # Mutual exclusion for ring content.
+
+    def __init__(self, capacity, retention):
+        """!
+        Initiate SharedRingBuffer object.
+
+        @param capacity Maximum number of stored values.
+        @param retention Number of seconds values are needed.
+        """
+        RingBuffer.__init__(self, capacity, retention)
+        self.ringLock = threading.Semaphore(1)
+
+    def append(self, timestamp, value):
+        self.ringLock.acquire()
+        try:
+            RingBuffer.append(self, timestamp, value)
+        finally:
+            self.ringLock.release()
+
+    def discardBefore(self, timestamp):
+        # Values may be still needed by other readers. Ring capacity limits memory.
+        pass
+
+    def getLastTimestamp(self):
+        self.ringLock.acquire()
+        try:
+            return RingBuffer.getLastTimestamp(self)
+        finally:
+            self.ringLock.release()
+
+    def getValues(self, begin, end):
+        self.ringLock.acquire()
+        try:
+            return list(RingBuffer.getValues(self, begin, end))
+        finally:
+            self.ringLock.release()
+
+    def getOverwrittenCount(self):
+        self.ringLock.acquire()
+        try:
+            return RingBuffer.getOverwrittenCount(self)
+        finally:
+            self.ringLock.release()
+
+    def ensureCapacity(self, capacity, retention):
+        """!
+        Enlarge buffer and extend retention. Call before any value is appended.
+
+        @param capacity Required capacity.
+        @param retention Required retention in seconds.
+        """
+        retention = max(self.retention, retention)
+        if capacity > self.capacity:
+            RingBuffer.__init__(self, capacity, retention)
+        else:
+            self.retention = retention
+
+class TopicStore:
+    """!
+    Store of received values shared by all update buffers. Same topic is often
+    used by many channels. Received value is recorded in store once and buffers
+    reuse its numeric conversion and stored samples instead of keeping their own
+    copies.
+    """
+
+    ## @var topicMapping
+    # The {DataIdentifier: TopicState} mapping.
+
+    def __init__(self):
+        """!
+        Initiate empty TopicStore object.
+        """
+        self.topicMapping = {}
+
+    def getTopicState(self, dataIdentifier):
+        """!
+        Get state of topic. State is created when topic is used first time.
+        Create all states before values are received.
+
+        @param dataIdentifier Data identification.
+        @return TopicState object.
+        """
+        if dataIdentifier not in self.topicMapping:
+            self.topicMapping[dataIdentifier] = TopicState()
+        return self.topicMapping[dataIdentifier]
+
+    def getSharedRing(self, dataIdentifier, capacity, retention):
+        """!
+        Get ring of timestamped values of topic. Ring is large enough for
+        capacity and retention required by each of its readers.
+
+        @param dataIdentifier Data identification.
+        @param capacity Required capacity.
+        @param retention Number of seconds values are needed by reader.
+        @return SharedRingBuffer object.
+        """
+        return self.getTopicState(dataIdentifier).getSharedRing(capacity, retention)
+
+    def update(self, dataIdentifier, value):
+        """!
+        Record received value. Call before value is passed to update buffers.
+
+        @param dataIdentifier Data identification.
+        @param value Received value.
+        """
+        topicState = self.topicMapping.get(dataIdentifier)
+        if topicState is not None:
+            topicState.update(value)
+
+    def getNumber(self, dataIdentifier, value):
+        """!
+        Convert received value to number.
+
+        @param dataIdentifier Data identification.
+        @param value Received value.
+        @return Float value.
+        @throws ValueError If value is not number.
+        """
+        topicState = self.topicMapping.get(dataIdentifier)
+        if topicState is None:
+            return TopicState.convertNumber(value)
+        return topicState.getNumber(value)
+
+    def __len__(self):
+        """!
+        Get number of stored topics.
+
+        @return Number of topics.
+        """
+        return len(self.topicMapping)
+
+class TopicState:
+    """!
+    Last received value of single topic and its numeric conversion. Conversion
+    runs at most once per received value. Values of topics read by window
+    buffers are stored into shared ring when they are received.
+    """
+
+    ## @var lastValue
+    # Tuple (value, number) of last received value. Number is None when value
+    # wasn't converted yet or when it is not number. Tuple is replaced as whole,
+    # so readers see consistent pair without locking.
+
+    ## @var sharedRing
+    # SharedRingBuffer object or None if no window buffer reads this topic.
+
+    ## @var notConverted
+    # Marker of value which wasn't converted to number yet.
+    notConverted = object()
+
+    def __init__(self):
+        """!
+        Initiate empty TopicState object.
+        """
+        self.lastValue = (None, self.notConverted)
+        self.sharedRing = None
+
+    @staticmethod
+    def convertNumber(value):
+        """!
+        Convert value to number.
+
+        @param value Received value.
+        @return Float value.
+        @throws ValueError If value is not number.
+        """
+        try:
+            return float(value)
+        except (ValueError, TypeError) as ex:
+            raise ValueError("Can't convert data to number: {}".format(value))
+
+    def getSharedRing(self, capacity, retention):
+        """!
+        Get ring of timestamped values.
+
+        @param capacity Required capacity.
+        @param retention Number of seconds values are needed by reader.
+        @return SharedRingBuffer object.
+        """
+        if self.sharedRing is None:
+            self.sharedRing = SharedRingBuffer(capacity, retention)
+        else:
+            self.sharedRing.ensureCapacity(capacity, retention)
+        return self.sharedRing
+
+    def update(self, value):
+        """!
+        Record received value. Numeric value is appended to shared ring before
+        it is passed to updater inboxes, so windows include values of messages
+        which were dropped by full inbox.
+
+        @param value Received value.
+        """
+        number = self.notConverted
+        if self.sharedRing is not None:
+            try:
+                number = self.convertNumber(value)
+                self.sharedRing.append(time.time(), number)
+            except ValueError as ex:
+                number = None
+        self.lastValue = (value, number)
+
+    def getNumber(self, value):
+        """!
+        Convert value to number. Conversion of last received value is cached.
+
+        @param value Received value.
+        @return Float value.
+        @throws ValueError If value is not number.
+        """
+        lastValue, number = self.lastValue
+        if lastValue is not value:
+            # Value is older than last received one.
+            return self.convertNumber(value)
+        if number is self.notConverted:
+            try:
+                number = self.convertNumber(value)
+            except ValueError as ex:
+                number = None
+            self.lastValue = (value, number)
+        if number is None:
+            raise ValueError("Can't convert data to number: {}".format(value))
+        return number
 
 class TopicException(Exception):
     """!
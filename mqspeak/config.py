@@ -16,9 +16,12 @@
 import configparser
 import datetime
 from mqreceive.broker import Broker
-from mqspeak.channel import ThingSpeakChannel, PhantChannel
+from mqspeak.channel import ChannelType, ThingSpeakChannel, PhantChannel
 from mqreceive.data import DataIdentifier
-from mqspeak.updating import BlackoutUpdater, BufferedUpdater, AverageUpdater, OnChangeUpdater
+from mqspeak.decoding import DecodedDataIdentifier, DecoderException, createDecoder
+from mqspeak.updating import BlackoutUpdater, BufferedUpdater, AverageUpdater, QuantileUpdater, OnChangeUpdater, WindowUpdater, OverflowPolicy
+from mqspeak.collecting import AverageUpdateBuffer, QuantileUpdateBuffer, WindowUpdateBuffer
+from mqspeak.sending import SendingOptions
 
 class ProgramConfig:
     """!
@@ -55,6 +58,10 @@ class ProgramConfig:
             updateMapping = updateMappingFactory.build(configCache)
             updater = updaterFactory.build(channel, updateMapping)
             configCache.addChannel(channel, updater, updateMapping)
+        configCache.setUpdateWorkerDescriptor(*self.getUpdateWorkerOptions())
+        configCache.setSendingOptions(self.getSendingOptions())
+        configCache.setSpoolDescriptor(self.getSpoolOptions())
+        configCache.setMetricsDescriptor(self.getMetricsOptions())
         return configCache
 
     def checkForMandatorySections(self):
@@ -157,8 +164,8 @@ class ProgramConfig:
         for channelSection in channelSections:
             self.checkForChannelMandatoryOptions(channelSection)
             channel = self.createChannel(channelSection)
-            updaterFactory = self.getChannelUpdater(channelSection)
             updateMappingFactory = self.getDataFieldMapping(channelSection)
+            updaterFactory = self.getChannelUpdater(channelSection, updateMappingFactory.getFieldAggregations())
             yield channel, updaterFactory, updateMappingFactory
 
     def checkForChannelMandatoryOptions(self, channelSection):
@@ -177,7 +184,7 @@ class ProgramConfig:
 
         @param channelSection Channel section name.
         @return Channel object.
-        @throws ConfigException If configuration specifies unknown channel type.
+        @throws ConfigException If configuration specifies unknown channel type or invalid bulk size.
         """
         channelID = self.parser.get(channelSection, "Id", fallback = None)
         writeKey = self.parser.get(channelSection, "Key")
@@ -190,52 +197,174 @@ class ProgramConfig:
         if waitInterval is not None:
             waitInterval = datetime.timedelta(seconds = waitInterval)
 
+        channel = None
         if channelType == "thingspeak":
-            return ThingSpeakChannel(channelSection, channelID, writeKey, waitInterval)
+            channel = ThingSpeakChannel(channelSection, channelID, writeKey, waitInterval)
         elif channelType == "phant":
-            return PhantChannel(channelSection, channelID, writeKey, waitInterval)
+            channel = PhantChannel(channelSection, channelID, writeKey, waitInterval)
         else:
             raise ConfigException("Unsupported channel type: {}".format(channelType))
 
-    def getChannelUpdater(self, channelSection):
+        bulkSize = self.getPositiveInt(channelSection, "BulkSize", 1)
+        if bulkSize > 1:
+            if channelType != "thingspeak":
+                raise ConfigException("Channel {}: BulkSize is supported only by thingspeak channels".format(channelSection))
+            if channelID is None:
+                raise ConfigException("Channel {}: BulkSize requires channel Id".format(channelSection))
+            channel.setBulkSize(bulkSize)
+        channel.setRetryPolicy(*self.getRetryPolicy(channelSection))
+        maxUpdateInterval = self.getMaxUpdateInterval(channelSection)
+        if maxUpdateInterval is not None:
+            channel.setAdaptiveRate(maxUpdateInterval)
+        channel.setPriority(self.getPositiveFloat(channelSection, "Priority", 1.0))
+        stagger = self.getFraction(channelSection, "Stagger", 0.0)
+        if stagger > 0:
+            try:
+                updateRate = self.parser.getint(channelSection, "UpdateRate", fallback = 0)
+            except ValueError as ex:
+                raise ConfigException("Invalid update rate interval: {}".format(self.parser.get(channelSection, "UpdateRate")))
+            if updateRate <= 0:
+                raise ConfigException("Channel {}: Stagger requires positive UpdateRate".format(channelSection))
+        channel.setStagger(stagger)
+        return channel
+
+    def getMaxUpdateInterval(self, channelSection):
+        """!
+        Get maximum update interval of channel with adaptive update rate.
+
+        @param channelSection Channel section name.
+        @return Timedelta object or None if adaptive update rate is disabled.
+        @throws ConfigException If adaptive rate options are invalid.
+        """
+        try:
+            adaptiveRate = self.parser.getboolean(channelSection, "AdaptiveRate", fallback = False)
+        except ValueError as ex:
+            raise ConfigException("Channel {}: AdaptiveRate must be boolean".format(channelSection))
+        if not adaptiveRate:
+            return None
+        updateRate = self.parser.getint(channelSection, "UpdateRate")
+        maxUpdateRate = self.getPositiveInt(channelSection, "MaxUpdateRate", max(10 * updateRate, 1))
+        if maxUpdateRate < updateRate:
+            raise ConfigException("Channel {}: MaxUpdateRate can't be less than UpdateRate".format(channelSection))
+        return datetime.timedelta(seconds = maxUpdateRate)
+
+    def getRetryPolicy(self, channelSection):
+        """!
+        Get retry policy of failed channel updates.
+
+        @param channelSection Channel section name.
+        @return Tuple (retryLimit, retryDelay, retryMaxDelay).
+        @throws ConfigException If retry options are invalid.
+        """
+        retryLimit = self.getNonNegativeInt(channelSection, "RetryLimit", 3)
+        try:
+            updateRate = self.parser.getint(channelSection, "UpdateRate")
+        except ValueError as ex:
+            raise ConfigException("Invalid update rate interval: {}".format(self.parser.get(channelSection, "UpdateRate")))
+        retryDelay = self.getPositiveInt(channelSection, "RetryDelay", max(updateRate, 1))
+        retryMaxDelay = self.getPositiveInt(channelSection, "RetryMaxDelay", max(300, retryDelay))
+        if retryMaxDelay < retryDelay:
+            raise ConfigException("Channel {}: RetryMaxDelay can't be less than RetryDelay".format(channelSection))
+        return (retryLimit,
+            datetime.timedelta(seconds = retryDelay),
+            datetime.timedelta(seconds = retryMaxDelay))
+
+    def getChannelUpdater(self, channelSection, fieldAggregations):
         """!
         Create channel updaterFactory.
 
         @param channelSection Channel section name.
+        @param fieldAggregations Mapping {field: aggregationName}.
         @return ChannelUpdaterFactory object for that channel.
         @throws ConfigException If channel specifies invalid update interval.
         """
         try:
             updateRate = datetime.timedelta(seconds = self.parser.getint(channelSection, "UpdateRate"))
-            updaterName = self.parser.get(channelSection, "UpdateType")
-            updaterCls, updaterArgs = self.createUpdaterFactory(updaterName, updateRate)
-            return ChannelUpdaterFactory(updaterCls, updaterArgs)
         except ValueError as ex:
             raise ConfigException("Invalid update rate interval: {}".format(self.parser.get(channelSection, "UpdateRate")))
+        updaterName = self.parser.get(channelSection, "UpdateType")
+        updaterCls, updaterArgs = self.createUpdaterFactory(updaterName, updateRate, fieldAggregations)
+        if updaterCls is WindowUpdater:
+            updaterArgs += self.getWindowOptions(channelSection, updaterName, updateRate)
+        elif updaterCls is OnChangeUpdater:
+            updaterArgs += (self.getPositiveInt(channelSection, "QueueCapacity", 1024), )
+        return ChannelUpdaterFactory(updaterCls, updaterArgs)
+
+    def getWindowOptions(self, channelSection, updaterName, updateRate):
+        """!
+        Get options of window updater.
 
-    def createUpdaterFactory(self, updaterName, updateRate):
+        @param channelSection Channel section name.
+        @param updaterName Updater name, `tumbling` or `sliding`.
+        @param updateRate Update interval.
+        @return Tuple of (windowSize, windowStep, windowCapacity).
+        @throws ConfigException If some option has invalid value.
+        """
+        defaultSize = int(updateRate.total_seconds())
+        windowSize = self.getPositiveInt(channelSection, "WindowSize", defaultSize)
+        if updaterName == "sliding":
+            windowStep = self.getPositiveInt(channelSection, "WindowStep", defaultSize)
+            if windowStep > windowSize:
+                raise ConfigException("Section {}: WindowStep can't be greater than WindowSize".format(channelSection))
+        else:
+            windowStep = windowSize
+        windowCapacity = self.getPositiveInt(channelSection, "WindowCapacity", 1024)
+        return (datetime.timedelta(seconds = windowSize),
+            datetime.timedelta(seconds = windowStep),
+            windowCapacity)
+
+    def createUpdaterFactory(self, updaterName, updateRate, fieldAggregations):
         """!
         Create updater factory based on updater name.
 
         @param updaterName Updater name.
         @param updateRate Update interval.
+        @param fieldAggregations Mapping {field: aggregationName}.
         @return ChannelUpdaterFactory object.
-        @throws ConfigException If unknown updater name is specified in config file.
+        @throws ConfigException If unknown updater name is specified in config file
+            or if updater doesn't support specified field aggregations.
         """
         updaterCls = None
+        aggregationBufferCls = None
         if updaterName == "blackout":
             updaterCls = BlackoutUpdater
         elif updaterName == "buffered":
             updaterCls = BufferedUpdater
         elif updaterName == "average":
             updaterCls = AverageUpdater
+            aggregationBufferCls = AverageUpdateBuffer
+        elif updaterName == "quantile":
+            updaterCls = QuantileUpdater
+            aggregationBufferCls = QuantileUpdateBuffer
         elif updaterName == "onchange":
             updaterCls = OnChangeUpdater
+        elif updaterName in ("tumbling", "sliding"):
+            updaterCls = WindowUpdater
+            aggregationBufferCls = WindowUpdateBuffer
         else:
             raise ConfigException("Unknown UpdateType: {}".format(updaterName))
-        updaterArgs = (updateRate,)
+        if aggregationBufferCls is None:
+            if len(fieldAggregations) > 0:
+                raise ConfigException("UpdateType {} doesn't support field aggregations".format(updaterName))
+            updaterArgs = (updateRate,)
+        else:
+            self.checkFieldAggregations(updaterName, fieldAggregations, aggregationBufferCls)
+            updaterArgs = (updateRate, fieldAggregations)
         return updaterCls, updaterArgs
 
+    def checkFieldAggregations(self, updaterName, fieldAggregations, updateBufferCls):
+        """!
+        Check if all field aggregations are supported by update buffer.
+
+        @param updaterName Updater name.
+        @param fieldAggregations Mapping {field: aggregationName}.
+        @param updateBufferCls Update buffer class.
+        @throws ConfigException If some aggregation is not supported.
+        """
+        for field, aggregation in fieldAggregations.items():
+            if not updateBufferCls.isAggregationSupported(aggregation):
+                raise ConfigException("{}: unknown {} aggregation: {}".format(field, updaterName, aggregation))
+
     def getDataFieldMapping(self, channelSection):
         """!
         Create field mapping for channel.
@@ -256,12 +385,197 @@ class ProgramConfig:
         updateMappingFactory = UpdateMappingFactory()
         for mappingOption in self.parser.options(updateSection):
             optionValue = self.parser.get(updateSection, mappingOption).split()
-            if len(optionValue) < 2:
-                    raise ConfigException("{}: {} - option must contain two space separated values".format(updateSection, mappingOption))
-            brokerName, topic = optionValue
-            updateMappingFactory.addMapping(brokerName, topic, mappingOption)
+            if len(optionValue) not in (2, 3, 4):
+                    raise ConfigException("{}: {} - option must contain broker, topic, optional decoder and optional aggregation".format(updateSection, mappingOption))
+            brokerName, topic = optionValue[:2]
+            decoder = None
+            aggregation = None
+            for item in optionValue[2:]:
+                # Decoder specification always contains decoder name and colon.
+                if ":" in item and decoder is None:
+                    decoder = self.createDecoder(updateSection, mappingOption, item)
+                elif ":" not in item and aggregation is None:
+                    aggregation = item
+                else:
+                    raise ConfigException("{}: {} - unexpected value: {}".format(updateSection, mappingOption, item))
+            updateMappingFactory.addMapping(brokerName, topic, mappingOption, decoder)
+            if aggregation is not None:
+                updateMappingFactory.addFieldAggregation(mappingOption, aggregation)
         return updateMappingFactory
 
+    def createDecoder(self, updateSection, mappingOption, specification):
+        """!
+        Compile payload decoder of update mapping.
+
+        @param updateSection Update section name.
+        @param mappingOption Field name.
+        @param specification Decoder specification.
+        @return Decoder object.
+        @throws ConfigException If decoder specification is invalid.
+        """
+        try:
+            return createDecoder(specification)
+        except DecoderException as ex:
+            raise ConfigException("{}: {} - {}".format(updateSection, mappingOption, ex))
+
+    def getUpdateWorkerOptions(self):
+        """!
+        Get options of threads processing received data from optional Updating section.
+
+        @return Tuple of (workerCount, inboxCapacity, overflowPolicy).
+        @throws ConfigException If some option has invalid value.
+        """
+        section = "Updating"
+        workerCount = self.getPositiveInt(section, "Workers", 4)
+        inboxCapacity = self.getPositiveInt(section, "InboxSize", 100)
+        overflowName = self.parser.get(section, "InboxOverflow", fallback = "block")
+        if overflowName == "block":
+            overflowPolicy = OverflowPolicy.block
+        elif overflowName == "drop-oldest":
+            overflowPolicy = OverflowPolicy.dropOldest
+        elif overflowName == "drop-newest":
+            overflowPolicy = OverflowPolicy.dropNewest
+        else:
+            raise ConfigException("Unknown InboxOverflow: {}".format(overflowName))
+        return workerCount, inboxCapacity, overflowPolicy
+
+    def getSendingOptions(self):
+        """!
+        Get options of sending layer from optional Sending section.
+
+        @return SendingOptions object.
+        @throws ConfigException If some option has invalid value.
+        """
+        section = "Sending"
+        sendingOptions = SendingOptions()
+        sendingOptions.maxConnections = self.getPositiveInt(section, "MaxConnections", sendingOptions.maxConnections)
+        sendingOptions.idleTimeout = self.getPositiveInt(section, "IdleTimeout", sendingOptions.idleTimeout)
+        sendingOptions.workers = self.getPositiveInt(section, "Workers", sendingOptions.workers)
+        workerOptions = {
+            ChannelType.thingspeak: "ThingSpeakWorkers",
+            ChannelType.phant: "PhantWorkers"}
+        for channelType, option in workerOptions.items():
+            if self.parser.has_option(section, option):
+                sendingOptions.channelTypeWorkers[channelType] = self.getPositiveInt(section, option, None)
+        sendingOptions.shutdownTimeout = self.getPositiveInt(section, "ShutdownTimeout", sendingOptions.shutdownTimeout)
+        rateOptions = {
+            ChannelType.thingspeak: ("ThingSpeakRateInterval", "ThingSpeakRateBurst"),
+            ChannelType.phant: ("PhantRateInterval", "PhantRateBurst")}
+        for channelType, (intervalOption, burstOption) in rateOptions.items():
+            interval, burst = sendingOptions.getRateLimit(channelType) or (0, 1)
+            interval = self.getNonNegativeInt(section, intervalOption, interval)
+            burst = self.getPositiveInt(section, burstOption, burst)
+            if interval > 0:
+                sendingOptions.rateLimits[channelType] = (interval, burst)
+            else:
+                sendingOptions.rateLimits.pop(channelType, None)
+        sendingOptions.breakerThreshold = self.getNonNegativeInt(section, "BreakerThreshold", sendingOptions.breakerThreshold)
+        sendingOptions.breakerTimeout = self.getPositiveInt(section, "BreakerTimeout", sendingOptions.breakerTimeout)
+        return sendingOptions
+
+    def getSpoolOptions(self):
+        """!
+        Get options of measurement spool from optional Spool section.
+
+        @return Tuple (path, syncInterval) or None if spool is not enabled.
+        @throws ConfigException If some option has invalid value.
+        """
+        section = "Spool"
+        if not self.parser.has_section(section):
+            return None
+        self.checkForOption(section, "Path")
+        path = self.parser.get(section, "Path")
+        syncInterval = self.getNonNegativeInt(section, "SyncInterval", 1)
+        return (path, datetime.timedelta(seconds = syncInterval))
+
+    def getMetricsOptions(self):
+        """!
+        Get options of metrics exporter from optional Metrics section.
+
+        @return Tuple (address, port) or None if exporter is not enabled.
+        @throws ConfigException If some option has invalid value.
+        """
+        section = "Metrics"
+        if not self.parser.has_section(section):
+            return None
+        address = self.parser.get(section, "Address", fallback = "127.0.0.1")
+        port = self.getPositiveInt(section, "Port", 9180)
+        if port > 65535:
+            raise ConfigException("Section {}: Port must be lower than 65536".format(section))
+        return (address, port)
+
+    def getPositiveInt(self, section, option, fallback):
+        """!
+        Get positive integer option. Section doesn't have to exist.
+
+        @param section Section name.
+        @param option Option name.
+        @param fallback Value used when option is missing.
+        @return Integer value.
+        @throws ConfigException If option is not positive integer.
+        """
+        try:
+            value = self.parser.getint(section, option, fallback = fallback)
+        except ValueError as ex:
+            raise ConfigException("Section {}: {} must be integer".format(section, option))
+        if value <= 0:
+            raise ConfigException("Section {}: {} must be positive".format(section, option))
+        return value
+
+    def getPositiveFloat(self, section, option, fallback):
+        """!
+        Get positive number option. Section doesn't have to exist.
+
+        @param section Section name.
+        @param option Option name.
+        @param fallback Value used when option is missing.
+        @return Float value.
+        @throws ConfigException If option is not positive number.
+        """
+        try:
+            value = self.parser.getfloat(section, option, fallback = fallback)
+        except ValueError as ex:
+            raise ConfigException("Section {}: {} must be number".format(section, option))
+        if not value > 0 or value == float("inf"):
+            raise ConfigException("Section {}: {} must be positive".format(section, option))
+        return value
+
+    def getFraction(self, section, option, fallback):
+        """!
+        Get number option in range from 0 to 1. Section doesn't have to exist.
+
+        @param section Section name.
+        @param option Option name.
+        @param fallback Value used when option is missing.
+        @return Float value.
+        @throws ConfigException If option is not number from 0 to 1.
+        """
+        try:
+            value = self.parser.getfloat(section, option, fallback = fallback)
+        except ValueError as ex:
+            raise ConfigException("Section {}: {} must be number".format(section, option))
+        if not 0 <= value <= 1:
+            raise ConfigException("Section {}: {} must be in range from 0 to 1".format(section, option))
+        return value
+
+    def getNonNegativeInt(self, section, option, fallback):
+        """!
+        Get non-negative integer option. Section doesn't have to exist.
+
+        @param section Section name.
+        @param option Option name.
+        @param fallback Value used when option is missing.
+        @return Integer value.
+        @throws ConfigException If option is not non-negative integer.
+        """
+        try:
+            value = self.parser.getint(section, option, fallback = fallback)
+        except ValueError as ex:
+            raise ConfigException("Section {}: {} must be integer".format(section, option))
+        if value < 0:
+            raise ConfigException("Section {}: {} can't be negative".format(section, option))
+        return value
+
     def checkForEnabledOption(self, section):
         """!
         Check for "Enabled" option in given section.
@@ -324,12 +638,28 @@ class ConfigCache:
     ## @var channelUpdateDescribtors
     # Update descriptors.
 
+    ## @var updateWorkerDescriptor
+    # Tuple of (workerCount, inboxCapacity, overflowPolicy).
+
+    ## @var sendingOptions
+    # SendingOptions object.
+
+    ## @var spoolDescriptor
+    # Tuple (path, syncInterval) or None if spool is disabled.
+
+    ## @var metricsDescriptor
+    # Tuple (address, port) or None if metrics exporter is disabled.
+
     def __init__(self):
         """!
         Initiate configuration cache object.
         """
         self.listenDescriptors = []
         self.channelUpdateDescribtors = []
+        self.updateWorkerDescriptor = None
+        self.sendingOptions = None
+        self.spoolDescriptor = None
+        self.metricsDescriptor = None
 
     def addBroker(self, broker, subscriptions):
         """!
@@ -353,6 +683,40 @@ class ConfigCache:
         channelUpdateDescribtor = (channel, updater, updateMapping)
         self.channelUpdateDescribtors.append(channelUpdateDescribtor)
 
+    def setUpdateWorkerDescriptor(self, workerCount, inboxCapacity, overflowPolicy):
+        """!
+        Set options of threads processing received data.
+
+        @param workerCount Number of worker threads.
+        @param inboxCapacity Maximum number of items waiting for single updater.
+        @param overflowPolicy OverflowPolicy enumeration object.
+        """
+        self.updateWorkerDescriptor = (workerCount, inboxCapacity, overflowPolicy)
+
+    def setSendingOptions(self, sendingOptions):
+        """!
+        Set options of sending layer.
+
+        @param sendingOptions SendingOptions object.
+        """
+        self.sendingOptions = sendingOptions
+
+    def setSpoolDescriptor(self, spoolDescriptor):
+        """!
+        Set options of measurement spool.
+
+        @param spoolDescriptor Tuple (path, syncInterval) or None if spool is disabled.
+        """
+        self.spoolDescriptor = spoolDescriptor
+
+    def setMetricsDescriptor(self, metricsDescriptor):
+        """!
+        Set options of metrics exporter.
+
+        @param metricsDescriptor Tuple (address, port) or None if exporter is disabled.
+        """
+        self.metricsDescriptor = metricsDescriptor
+
     def check(self):
         """!
         @todo implement this method
@@ -411,22 +775,44 @@ class UpdateMappingFactory:
     ## @var mapping
     # Mapping.
 
+    ## @var fieldAggregations
+    # Mapping {field: aggregationName}.
+
     def __init__(self):
         """!
         Initiate UpdateMappingFactory object.
         """
         self.mapping = {}
+        self.fieldAggregations = {}
 
-    def addMapping(self, brokerName, topic, field):
+    def addMapping(self, brokerName, topic, field, decoder = None):
         """!
         Add build mapping.
 
         @param brokerName
         @param topic
         @param field
+        @param decoder Decoder object extracting field value from payload or None.
         """
         self.checkNewBrokerName(brokerName)
-        self.mapping[brokerName].append((topic, field))
+        self.mapping[brokerName].append((topic, field, decoder))
+
+    def addFieldAggregation(self, field, aggregation):
+        """!
+        Set aggregation of field.
+
+        @param field
+        @param aggregation Aggregation name.
+        """
+        self.fieldAggregations[field] = aggregation
+
+    def getFieldAggregations(self):
+        """!
+        Get aggregations of fields.
+
+        @return Mapping {field: aggregationName}.
+        """
+        return self.fieldAggregations
 
     def checkNewBrokerName(self, brokerName):
         """!
@@ -455,8 +841,11 @@ class UpdateMappingFactory:
         mapping = {}
         for brokerName in self.mapping.keys():
             broker = brokerNameResolver.getBrokerByName(brokerName)
-            for topic, field in self.mapping[brokerName]:
-                dataIdentifier = DataIdentifier(broker, topic)
+            for topic, field, decoder in self.mapping[brokerName]:
+                if decoder is None:
+                    dataIdentifier = DataIdentifier(broker, topic)
+                else:
+                    dataIdentifier = DecodedDataIdentifier(broker, topic, decoder)
                 mapping[dataIdentifier] = field
         return mapping
 
@@ -26,15 +26,28 @@ class Measurement:
     ## @var time
     # Measurement timestamp.
 
-    def __init__(self, fields, time):
+    ## @var spoolId
+    # Identifier of measurement record in spool or None if measurement isn't spooled.
+
+    ## @var supersededIds
+    # List of spool identifiers of records which data are included in this measurement.
+
+    ## @var stageTimes
+    # Mapping {Stage: monotonic time} of processing stages measurement passed.
+
+    def __init__(self, fields, time, spoolId = None):
         """!
         Initiate measurement object.
 
         @param fields Maping {dataIdentifier: vaue}.
         @param time  Measurement timestamp.
+        @param spoolId Identifier of spooled record or None.
         """
         self.fields = fields
         self.time = time
+        self.spoolId = spoolId
+        self.supersededIds = []
+        self.stageTimes = {}
 
     @classmethod
     def currentMeasurement(cls, fields):
@@ -45,6 +58,15 @@ class Measurement:
         """
         return cls(fields, datetime.datetime.utcnow())
 
+    def markStage(self, stage, timestamp):
+        """!
+        Record time of processing stage.
+
+        @param stage Stage enumeration object.
+        @param timestamp Monotonic time in seconds.
+        """
+        self.stageTimes[stage] = timestamp
+
     def __str__(self):
         """!
         Convert object to string.
@@ -69,6 +91,61 @@ class Measurement:
         """
         return len(self.fields)
 
+class MeasurementBatch:
+    """!
+    Several measurements sent in single update.
+    """
+
+    ## @var measurements
+    # List of Measurement objects, oldest first.
+
+    ## @var time
+    # Timestamp of most recent measurement.
+
+    def __init__(self, measurements):
+        """!
+        Initiate measurement batch object.
+
+        @param measurements Non-empty list of Measurement objects, oldest first.
+        """
+        self.measurements = measurements
+        self.time = measurements[-1].time
+
+    def __str__(self):
+        """!
+        Convert object to string.
+
+        @return String.
+        """
+        return "[{}]".format(", ".join(str(x) for x in self.measurements))
+
+    def __repr__(self):
+        """!
+        Convert object to representation string.
+
+        @return representation string.
+        """
+        return "<{}>".format(self.__str__())
+
+    def __len__(self):
+        """!
+        Get number of measurements.
+
+        @return Number of measurements.
+        """
+        return len(self.measurements)
+
+def getMeasurements(measurement):
+    """!
+    Get list of measurements sent in single update.
+
+    @param measurement Measurement or MeasurementBatch object.
+    @return List of Measurement objects.
+    """
+    if isinstance(measurement, MeasurementBatch):
+        return measurement.measurements
+    return [measurement]
+
 class MeasurementParamConverter:
     """!
     Convert data measurement into ThingSpeak fields for single channel.
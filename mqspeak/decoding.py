@@ -0,0 +1,411 @@
+# Copyright (C) Ivo Slanina <ivo.slanina@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import logging
+import re
+import struct
+from mqreceive.data import DataIdentifier
+from mqspeak.logs import LogCoalescer
+
+def createDecoder(specification):
+    """!
+    Compile decoder specification from update mapping.
+
+    @param specification String `json:PATH`, `msgpack:PATH` or `struct:FORMAT[:INDEX]`.
+    @return Decoder object.
+    @throws DecoderException If specification is invalid.
+    """
+    decoderName, separator, expression = specification.partition(":")
+    if decoderName == "json":
+        return JsonDecoder(expression)
+    elif decoderName == "msgpack":
+        return MsgpackDecoder(expression)
+    elif decoderName == "struct":
+        return StructDecoder(expression)
+    else:
+        raise DecoderException("Unknown decoder: {}".format(specification))
+
+def getFieldKey(dataIdentifier):
+    """!
+    Get key which identifies data identifier without broker object.
+
+    @param dataIdentifier DataIdentifier or DecodedDataIdentifier object.
+    @return Tuple (brokerName, topic) or (brokerName, topic, decoderSpecification).
+    """
+    if isinstance(dataIdentifier, DecodedDataIdentifier):
+        return (dataIdentifier.broker.name, dataIdentifier.topic, dataIdentifier.decoder.specification)
+    return (dataIdentifier.broker.name, dataIdentifier.topic)
+
+class DecodedDataIdentifier(DataIdentifier):
+    """!
+    Identification of single value decoded from message payload. Several values
+    can be decoded from messages of the same topic.
+    """
+
+    ## @var decoder
+    # Decoder object.
+
+    def __init__(self, broker, topic, decoder):
+        """!
+        Initiate DecodedDataIdentifier object.
+
+        @param broker Broker object.
+        @param topic Topic.
+        @param decoder Decoder object.
+        """
+        DataIdentifier.__init__(self, broker, topic)
+        self.decoder = decoder
+
+    def getSourceIdentifier(self):
+        """!
+        Get identification of topic which messages contain decoded value.
+
+        @return DataIdentifier object.
+        """
+        return DataIdentifier(self.broker, self.topic)
+
+    def __hash__(self):
+        """!
+        Calculate hash of DecodedDataIdentifier object.
+
+        @return Hash.
+        """
+        return hash((self.broker, self.topic, self.decoder.specification))
+
+    def __str__(self):
+        """!
+        Convert object to string.
+
+        @return String.
+        """
+        return "{}: {} [{}]".format(self.broker, self.topic, self.decoder.specification)
+
+    def __eq__(self, other):
+        """!
+        Check if DecodedDataIdentifier object is equal to another.
+
+        @param other Other object.
+        @return True if other object is DecodedDataIdentifier with same values, False otherwise.
+        """
+        if not isinstance(other, DecodedDataIdentifier):
+            return False
+        return (self.broker == other.broker
+            and self.topic == other.topic
+            and self.decoder.specification == other.decoder.specification)
+
+class BaseDecoder:
+    """!
+    Extract single value from message payload. Decoding is divided into parsing
+    of payload, which is shared by all decoders with the same format key, and
+    extraction of value from parsed document.
+    """
+
+    ## @var specification
+    # Decoder specification string.
+
+    def __init__(self, specification):
+        """!
+        Initiate BaseDecoder object.
+
+        @param specification Decoder specification string.
+        """
+        self.specification = specification
+
+    def getFormatKey(self):
+        """!
+        Get key of payload format. Decoders with the same key parse payload
+        into the same document.
+
+        @return Hashable object.
+        """
+        raise NotImplementedError("Override this mehod in sub-class")
+
+    def parse(self, payload):
+        """!
+        Parse message payload.
+
+        @param payload Bytes.
+        @return Parsed document.
+        @throws DecoderException If payload can't be parsed.
+        """
+        raise NotImplementedError("Override this mehod in sub-class")
+
+    def extract(self, document):
+        """!
+        Extract value from parsed document.
+
+        @param document Document returned by parse().
+        @return Value.
+        @throws DecoderException If document doesn't contain value.
+        """
+        raise NotImplementedError("Override this mehod in sub-class")
+
+    def decode(self, payload):
+        """!
+        Parse payload and extract value.
+
+        @param payload Bytes.
+        @return Value.
+        @throws DecoderException If value can't be decoded.
+        """
+        return self.extract(self.parse(payload))
+
+    def normalizeValue(self, value):
+        """!
+        Convert extracted value into value which can be sent to channel.
+
+        @param value Extracted value.
+        @return Number or string.
+        @throws DecoderException If value is missing.
+        """
+        if value is None:
+            raise DecoderException("{}: value is null".format(self.specification))
+        if isinstance(value, bool):
+            return int(value)
+        if isinstance(value, (int, float, str)):
+            return value
+        if isinstance(value, bytes):
+            return value.decode("utf-8", "replace").rstrip("\x00")
+        return json.dumps(value)
+
+    def __str__(self):
+        """!
+        Convert object to string.
+
+        @return String.
+        """
+        return self.specification
+
+    def __repr__(self):
+        """!
+        Convert object to representation string.
+
+        @return representation string.
+        """
+        return "<{}>".format(self.__str__())
+
+class JsonDecoder(BaseDecoder):
+    """!
+    Extract value from JSON document. Path consists of object keys and array
+    indices, for example `$.sensors[0].temperature` or `sensors.0.temperature`.
+    """
+
+    ## @var pathPattern
+    # Regular expression matching single path item.
+    pathPattern = re.compile(r"\.?([^.\[\]]+)|\[(\d+)\]")
+
+    ## @var path
+    # List of compiled path items. Object keys are strings, array indices are integers.
+
+    def __init__(self, expression):
+        """!
+        Initiate JsonDecoder object.
+
+        @param expression Path expression.
+        @throws DecoderException If path expression is invalid.
+        """
+        BaseDecoder.__init__(self, "{}:{}".format(self.getFormatName(), expression))
+        self.path = self.compilePath(expression)
+
+    def getFormatName(self):
+        """!
+        Get name of payload format.
+
+        @return Format name.
+        """
+        return "json"
+
+    def compilePath(self, expression):
+        """!
+        Compile path expression.
+
+        @param expression Path expression.
+        @return List of path items.
+        @throws DecoderException If path expression is invalid.
+        """
+        if expression.startswith("$"):
+            expression = expression[1:]
+        path = []
+        position = 0
+        while position < len(expression):
+            match = self.pathPattern.match(expression, position)
+            if match is None:
+                raise DecoderException("Invalid path: {}".format(self.specification))
+            key, index = match.groups()
+            if index is not None:
+                path.append(int(index))
+            elif key.isdigit():
+                path.append(int(key))
+            else:
+                path.append(key)
+            position = match.end()
+        return path
+
+    def getFormatKey(self):
+        return self.getFormatName()
+
+    def parse(self, payload):
+        try:
+            return json.loads(payload)
+        except ValueError as ex:
+            raise DecoderException("Invalid JSON payload: {}".format(ex))
+
+    def extract(self, document):
+        value = document
+        for item in self.path:
+            try:
+                if isinstance(item, int) and isinstance(value, dict):
+                    # Numeric object keys are strings.
+                    value = value[str(item)]
+                else:
+                    value = value[item]
+            except (KeyError, IndexError, TypeError) as ex:
+                raise DecoderException("{}: missing {}".format(self.specification, repr(item)))
+        return self.normalizeValue(value)
+
+class MsgpackDecoder(JsonDecoder):
+    """!
+    Extract value from MessagePack document. Path has the same syntax as path of
+    JSON decoder. Requires msgpack package.
+    """
+
+    ## @var msgpack
+    # Imported msgpack module.
+
+    def __init__(self, expression):
+        try:
+            import msgpack
+        except ImportError as ex:
+            raise DecoderException("msgpack decoder requires msgpack package")
+        self.msgpack = msgpack
+        JsonDecoder.__init__(self, expression)
+
+    def getFormatName(self):
+        return "msgpack"
+
+    def parse(self, payload):
+        try:
+            return self.msgpack.unpackb(payload, raw = False)
+        except Exception as ex:
+            raise DecoderException("Invalid msgpack payload: {}".format(ex))
+
+class StructDecoder(BaseDecoder):
+    """!
+    Extract value from packed binary structure. Expression consists of format
+    of Python struct module and index of extracted item, for example `<hhf:2`.
+    Index can be omitted when format contains single item.
+    """
+
+    ## @var unpacker
+    # Compiled struct.Struct object.
+
+    ## @var index
+    # Index of extracted item.
+
+    def __init__(self, expression):
+        """!
+        Initiate StructDecoder object.
+
+        @param expression Format and optional item index.
+        @throws DecoderException If expression is invalid.
+        """
+        BaseDecoder.__init__(self, "struct:{}".format(expression))
+        structFormat, separator, index = expression.rpartition(":")
+        if separator == "":
+            structFormat = index
+            index = "0"
+        try:
+            self.unpacker = struct.Struct(structFormat)
+        except struct.error as ex:
+            raise DecoderException("Invalid struct format {}: {}".format(structFormat, ex))
+        try:
+            self.index = int(index)
+        except ValueError as ex:
+            raise DecoderException("Invalid struct item index: {}".format(index))
+        itemCount = len(self.unpacker.unpack(bytes(self.unpacker.size)))
+        if separator == "" and itemCount != 1:
+            raise DecoderException("{}: item index is required".format(self.specification))
+        if not 0 <= self.index < itemCount:
+            raise DecoderException("{}: item index out of range".format(self.specification))
+
+    def getFormatKey(self):
+        return ("struct", self.unpacker.format)
+
+    def parse(self, payload):
+        try:
+            return self.unpacker.unpack(payload)
+        except struct.error as ex:
+            raise DecoderException("Invalid struct payload: {}".format(ex))
+
+    def extract(self, document):
+        return self.normalizeValue(document[self.index])
+
+class TopicDecoder:
+    """!
+    Decode all values of single topic. Payload is parsed once for each distinct
+    payload format, then all values are extracted from parsed document.
+    """
+
+    ## @var failureLog
+    # LogCoalescer object shared by all topic decoders reporting decoding failures.
+    failureLog = LogCoalescer(logging.INFO, "%d decoding failures skipped on %s in %.1f s")
+
+    ## @var formatMapping
+    # Mapping {formatKey: (parsingDecoder, [DecodedDataIdentifier])}.
+
+    def __init__(self):
+        """!
+        Initiate empty TopicDecoder object.
+        """
+        self.formatMapping = {}
+
+    def addDataIdentifier(self, dataIdentifier):
+        """!
+        Add decoded value.
+
+        @param dataIdentifier DecodedDataIdentifier object.
+        """
+        formatKey = dataIdentifier.decoder.getFormatKey()
+        if formatKey not in self.formatMapping:
+            self.formatMapping[formatKey] = (dataIdentifier.decoder, [])
+        dataIdentifiers = self.formatMapping[formatKey][1]
+        if dataIdentifier not in dataIdentifiers:
+            dataIdentifiers.append(dataIdentifier)
+
+    def decode(self, payload):
+        """!
+        Decode all values. Values which can't be decoded are skipped.
+
+        @param payload Bytes.
+        @return Iterable of (DecodedDataIdentifier, value) tuples.
+        """
+        for parsingDecoder, dataIdentifiers in self.formatMapping.values():
+            try:
+                document = parsingDecoder.parse(payload)
+            except DecoderException as ex:
+                sourceIdentifier = dataIdentifiers[0].getSourceIdentifier()
+                self.failureLog.log(sourceIdentifier, "%s: %s", sourceIdentifier, ex)
+                continue
+            for dataIdentifier in dataIdentifiers:
+                try:
+                    yield dataIdentifier, dataIdentifier.decoder.extract(document)
+                except DecoderException as ex:
+                    self.failureLog.log(dataIdentifier, "%s: %s", dataIdentifier, ex)
+
+class DecoderException(Exception):
+    """!
+    Payload decoding error.
+    """
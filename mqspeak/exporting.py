@@ -0,0 +1,261 @@
+# Copyright (C) Ivo Slanina <ivo.slanina@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import http.server
+import itertools
+import logging
+import threading
+from mqspeak.sending import CircuitState
+
+class MetricsExporter:
+    """!
+    HTTP server providing metrics in Prometheus text format on `/metrics` path.
+    Metrics are rendered from counters which are updated by running components,
+    so scraping never waits for updaters or dispatcher.
+    """
+
+    ## @var contentType
+    # Content type of Prometheus text format.
+    contentType = "text/plain; version=0.0.4; charset=utf-8"
+
+    ## @var address
+    # Listening address.
+
+    ## @var port
+    # Listening port.
+
+    ## @var metricsRegistry
+    # MetricsRegistry object.
+
+    ## @var supervisor
+    # ChannnelUpdateSupervisor object.
+
+    ## @var dispatcher
+    # ChannelUpdateDispatcher object.
+
+    ## @var server
+    # HTTP server object or None if exporter isn't running.
+
+    ## @var serverThread
+    # Thread serving requests or None.
+
+    def __init__(self, address, port, metricsRegistry, supervisor, dispatcher):
+        """!
+        Initiate MetricsExporter object.
+
+        @param address Listening address.
+        @param port Listening port.
+        @param metricsRegistry MetricsRegistry object.
+        @param supervisor ChannnelUpdateSupervisor object.
+        @param dispatcher ChannelUpdateDispatcher object.
+        """
+        self.address = address
+        self.port = port
+        self.metricsRegistry = metricsRegistry
+        self.supervisor = supervisor
+        self.dispatcher = dispatcher
+        self.server = None
+        self.serverThread = None
+
+    def start(self):
+        """!
+        Start listening in separate thread.
+
+        @throws OSError If address can't be bound.
+        """
+        exporter = self
+
+        class MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                try:
+                    body = exporter.render().encode("utf-8")
+                except Exception as ex:
+                    logging.getLogger().error("Metrics rendering failed: %s", ex)
+                    self.send_error(500)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", exporter.contentType)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logging.getLogger().debug("Metrics request: " + format % args)
+
+        self.server = http.server.ThreadingHTTPServer((self.address, self.port), MetricsRequestHandler)
+        self.server.daemon_threads = True
+        self.serverThread = threading.Thread(target = self.server.serve_forever, daemon = True)
+        self.serverThread.start()
+        logging.getLogger().info("Metrics exporter listening on %s:%s", self.address, self.port)
+
+    def stop(self):
+        """!
+        Stop listening.
+        """
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+            self.serverThread = None
+
+    def render(self):
+        """!
+        Render all metrics.
+
+        @return String in Prometheus text format.
+        """
+        lines = []
+        self.renderChannelMetrics(lines)
+        self.renderDispatcherMetrics(lines)
+        self.renderSupervisorMetrics(lines)
+        lines.append("")
+        return "\n".join(lines)
+
+    def renderChannelMetrics(self, lines):
+        """!
+        Render counters and latency histograms of channels.
+
+        @param lines List of output lines.
+        """
+        counterHelp = {
+            "messages": "Messages received by channel.",
+            "sends": "Channel update attempts.",
+            "failures": "Failed channel update attempts.",
+            "drops": "Discarded messages and measurements.",
+            "retries": "Scheduled repeated attempts of failed updates.",
+            "overwrites": "Window values overwritten before their window closed.",
+        }
+        snapshots = []
+        for channel in self.metricsRegistry.getChannels():
+            snapshots.append((channel, self.metricsRegistry.getChannelMetrics(channel).getSnapshot()))
+        for counterName, helpText in counterHelp.items():
+            metricName = "mqspeak_channel_{}_total".format(counterName)
+            self.appendHeader(lines, metricName, "counter", helpText)
+            for channel, (counters, histograms) in snapshots:
+                self.appendSample(lines, metricName, {"channel": channel.name}, counters[counterName])
+        metricName = "mqspeak_channel_latency_seconds"
+        self.appendHeader(lines, metricName, "histogram", "Latency of measurement processing stages.")
+        for channel, (counters, histograms) in snapshots:
+            for stage, histogram in histograms.items():
+                labels = {"channel": channel.name, "stage": stage}
+                for bound, count in histogram.getCumulativeCounts():
+                    bucketLabels = dict(labels)
+                    bucketLabels["le"] = self.formatValue(bound)
+                    self.appendSample(lines, metricName + "_bucket", bucketLabels, count)
+                self.appendSample(lines, metricName + "_sum", labels, histogram.sum)
+                self.appendSample(lines, metricName + "_count", labels, histogram.count)
+
+    def renderDispatcherMetrics(self, lines):
+        """!
+        Render state of dispatcher queue and sender threads.
+
+        @param lines List of output lines.
+        """
+        self.appendHeader(lines, "mqspeak_dispatcher_queue_depth", "gauge", "Updates waiting for dispatch.")
+        self.appendSample(lines, "mqspeak_dispatcher_queue_depth", {}, self.dispatcher.getQueueDepth())
+        senderPools = self.dispatcher.getSenderPools()
+        gauges = (
+            ("mqspeak_sender_workers", "Sender threads.", lambda pool: pool.workerCount),
+            ("mqspeak_sender_active_jobs", "Updates being sent.", lambda pool: pool.getActiveCount()),
+            ("mqspeak_sender_queued_jobs", "Updates waiting for sender thread.", lambda pool: pool.getQueueDepth()))
+        for metricName, helpText, getter in gauges:
+            self.appendHeader(lines, metricName, "gauge", helpText)
+            for channelType, senderPool in senderPools.items():
+                self.appendSample(lines, metricName, {"type": channelType.name}, getter(senderPool))
+        metricName = "mqspeak_circuit_state"
+        self.appendHeader(lines, metricName, "gauge", "Circuit breaker state (0 closed, 1 open, 2 half-open).")
+        for channelType, circuitBreaker in self.dispatcher.getCircuitBreakers().items():
+            self.appendSample(lines, metricName, {"type": channelType.name}, circuitBreaker.getState().value)
+        metricName = "mqspeak_circuit_transitions_total"
+        self.appendHeader(lines, metricName, "counter", "Circuit breaker state transitions.")
+        for channelType, circuitBreaker in self.dispatcher.getCircuitBreakers().items():
+            transitionCounts = circuitBreaker.getTransitionCounts()
+            for fromState, toState in itertools.product(CircuitState, CircuitState):
+                if (fromState, toState) in transitionCounts:
+                    labels = {"type": channelType.name, "from": fromState.name, "to": toState.name}
+                    self.appendSample(lines, metricName, labels, transitionCounts[(fromState, toState)])
+
+    def renderSupervisorMetrics(self, lines):
+        """!
+        Render broker message counters and sizes of channel buffers.
+
+        @param lines List of output lines.
+        """
+        metricName = "mqspeak_broker_messages_total"
+        self.appendHeader(lines, metricName, "counter", "Messages received from broker.")
+        for brokerName, count in sorted(self.supervisor.getBrokerMessageCounts().items()):
+            self.appendSample(lines, metricName, {"broker": brokerName}, count)
+        metricName = "mqspeak_channel_inbox_depth"
+        self.appendHeader(lines, metricName, "gauge", "Messages waiting in channel inbox.")
+        for channel, depth in self.supervisor.getInboxDepths().items():
+            self.appendSample(lines, metricName, {"channel": channel.name}, depth)
+        metricName = "mqspeak_channel_buffered_measurements"
+        self.appendHeader(lines, metricName, "gauge", "Measurements waiting in channel update buffer.")
+        for channel, count in self.supervisor.getBufferedCounts().items():
+            self.appendSample(lines, metricName, {"channel": channel.name}, count)
+        self.appendHeader(lines, "mqspeak_threads", "gauge", "Running threads.")
+        self.appendSample(lines, "mqspeak_threads", {}, threading.active_count())
+
+    def appendHeader(self, lines, metricName, metricType, helpText):
+        """!
+        Append metric description.
+
+        @param lines List of output lines.
+        @param metricName Metric name.
+        @param metricType Prometheus metric type.
+        @param helpText Metric description.
+        """
+        lines.append("# HELP {} {}".format(metricName, helpText))
+        lines.append("# TYPE {} {}".format(metricName, metricType))
+
+    def appendSample(self, lines, metricName, labels, value):
+        """!
+        Append single sample.
+
+        @param lines List of output lines.
+        @param metricName Metric name.
+        @param labels Mapping {labelName: labelValue}.
+        @param value Number.
+        """
+        if len(labels) > 0:
+            labelText = ",".join(
+                '{}="{}"'.format(name, self.escapeLabel(value)) for name, value in labels.items())
+            lines.append("{}{{{}}} {}".format(metricName, labelText, self.formatValue(value)))
+        else:
+            lines.append("{} {}".format(metricName, self.formatValue(value)))
+
+    def escapeLabel(self, value):
+        """!
+        Escape label value.
+
+        @param value Label value.
+        @return Escaped string.
+        """
+        return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+    def formatValue(self, value):
+        """!
+        Format sample value.
+
+        @param value Number.
+        @return String.
+        """
+        if value == float("inf"):
+            return "+Inf"
+        return repr(value)
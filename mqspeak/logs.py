@@ -0,0 +1,209 @@
+# Copyright (C) Ivo Slanina <ivo.slanina@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+import logging
+import threading
+import time
+import weakref
+
+class LogCoalescer:
+    """!
+    Log repeated message at most once per interval for each key. First message
+    of interval is logged immediately, following ones are only counted. Number
+    of skipped messages and time span in which they were skipped is logged when
+    interval expires, see flush().
+    """
+
+    ## @var coalescers
+    # Set of all LogCoalescer objects. References are weak, so registry doesn't
+    # keep owners of coalescers alive.
+    coalescers = weakref.WeakSet()
+
+    ## @var level
+    # Logging level.
+
+    ## @var summaryFormat
+    # Format of summary message with arguments count, key and time span in seconds.
+
+    ## @var interval
+    # Length of interval in seconds.
+
+    ## @var keyStates
+    # Mapping {key: [intervalStart, skippedCount, lastSkippedTime]}.
+
+    ## @var coalesceLock
+    # Mutual exclusion for key states.
+
+    def __init__(self, level, summaryFormat, interval = 60):
+        """!
+        Initiate LogCoalescer object.
+
+        @param level Logging level.
+        @param summaryFormat Format string of summary message, for example
+            "%d duplicate values skipped on %s in %.1f s".
+        @param interval Length of interval in seconds.
+        """
+        self.level = level
+        self.summaryFormat = summaryFormat
+        self.interval = interval
+        self.keyStates = {}
+        self.coalesceLock = threading.Semaphore(1)
+        LogCoalescer.coalescers.add(self)
+
+    def log(self, key, message, *args):
+        """!
+        Log message unless message with the same key was already logged in
+        current interval.
+
+        @param key Hashable object identifying repeated message.
+        @param message Format string of message.
+        @param args Arguments of message, formatted only if message is logged.
+        """
+        logger = logging.getLogger()
+        if not logger.isEnabledFor(self.level):
+            return
+        now = time.monotonic()
+        self.coalesceLock.acquire()
+        try:
+            keyState = self.keyStates.get(key)
+            if keyState is not None and now - keyState[0] < self.interval:
+                keyState[1] += 1
+                keyState[2] = now
+                return
+            self.keyStates[key] = [now, 0, now]
+        finally:
+            self.coalesceLock.release()
+        if keyState is not None:
+            # Interval expired before it was flushed.
+            self.logSummary(logger, key, keyState)
+        logger.log(self.level, message, *args)
+
+    def flush(self, force = False):
+        """!
+        Log summaries of keys which interval expired and forget them, so next
+        message of key is logged immediately.
+
+        @param force Log summaries of all keys, even if their interval didn't expire.
+        """
+        now = time.monotonic()
+        expiredStates = []
+        self.coalesceLock.acquire()
+        try:
+            for key, keyState in list(self.keyStates.items()):
+                if force or now - keyState[0] >= self.interval:
+                    del self.keyStates[key]
+                    expiredStates.append((key, keyState))
+        finally:
+            self.coalesceLock.release()
+        logger = logging.getLogger()
+        for key, keyState in expiredStates:
+            self.logSummary(logger, key, keyState)
+
+    def logSummary(self, logger, key, keyState):
+        """!
+        Log number of skipped messages.
+
+        @param logger Logger object.
+        @param key Key of skipped messages.
+        @param keyState List [intervalStart, skippedCount, lastSkippedTime].
+        """
+        intervalStart, skippedCount, lastSkippedTime = keyState
+        if skippedCount > 0:
+            logger.log(self.level, self.summaryFormat, skippedCount, key, lastSkippedTime - intervalStart)
+
+    def close(self):
+        """!
+        Log all summaries and stop flushing this coalescer periodically.
+        """
+        LogCoalescer.coalescers.discard(self)
+        self.flush(True)
+
+    @classmethod
+    def flushAll(cls, force = False):
+        """!
+        Flush all LogCoalescer objects.
+
+        @param force Log all summaries, even if their interval didn't expire.
+        """
+        for coalescer in list(cls.coalescers):
+            coalescer.flush(force)
+
+class LogFlusher:
+    """!
+    Periodically flush summaries of all LogCoalescer objects, so summary is
+    logged even if no other message with the same key follows.
+    """
+
+    ## @var scheduler
+    # Scheduler object.
+
+    ## @var period
+    # Timedelta object. Interval between two flushes.
+
+    ## @var flushJob
+    # Scheduled flush job or None.
+
+    ## @var flushLock
+    # Mutual exclusion for flush job.
+
+    def __init__(self, scheduler, period = 10):
+        """!
+        Initiate LogFlusher object.
+
+        @param scheduler Scheduler object.
+        @param period Interval between two flushes in seconds.
+        """
+        self.scheduler = scheduler
+        self.period = datetime.timedelta(seconds = period)
+        self.flushJob = None
+        self.flushLock = threading.Semaphore(1)
+
+    def start(self):
+        """!
+        Start periodic flushing.
+        """
+        self.flushLock.acquire()
+        try:
+            self.flushJob = self.scheduler.schedule(self.period, self.onFlush)
+        finally:
+            self.flushLock.release()
+
+    def stop(self):
+        """!
+        Stop periodic flushing and log all pending summaries.
+        """
+        self.flushLock.acquire()
+        try:
+            if self.flushJob is not None:
+                self.flushJob.cancel()
+                self.flushJob = None
+        finally:
+            self.flushLock.release()
+        LogCoalescer.flushAll(True)
+
+    def onFlush(self, job):
+        """!
+        Scheduler callback. Log summaries of expired intervals.
+
+        @param job Expired job.
+        """
+        LogCoalescer.flushAll()
+        self.flushLock.acquire()
+        try:
+            if job is self.flushJob:
+                self.flushJob = self.scheduler.schedule(self.period, self.onFlush)
+        finally:
+            self.flushLock.release()
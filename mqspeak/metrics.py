@@ -0,0 +1,350 @@
+# Copyright (C) Ivo Slanina <ivo.slanina@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import bisect
+import enum
+import threading
+from mqspeak.data import getMeasurements
+
+class Stage(enum.Enum):
+    """!
+    Enumeration of measurement processing stages. Each measurement keeps
+    monotonic time of each stage it passed.
+    """
+
+    ## Message was received from broker.
+    received = 0
+    ## Message was stored into update buffer.
+    buffered = 1
+    ## Measurement was passed to dispatcher.
+    enqueued = 2
+    ## Sender started sending measurement.
+    sendStarted = 3
+    ## Server responded.
+    responded = 4
+
+class LatencyHistogram:
+    """!
+    Histogram of durations with fixed bucket bounds. Memory doesn't depend on
+    number of observed values. Histogram is not thread safe.
+    """
+
+    ## @var defaultBounds
+    # Upper bucket bounds in seconds. Last bucket is unbounded.
+    defaultBounds = (
+        0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+        1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+    ## @var bounds
+    # Sorted tuple of upper bucket bounds.
+
+    ## @var counts
+    # List of number of values in each bucket. Last item counts values above
+    # largest bound.
+
+    ## @var count
+    # Number of observed values.
+
+    ## @var sum
+    # Sum of observed values.
+
+    def __init__(self, bounds = None):
+        """!
+        Initiate empty histogram.
+
+        @param bounds Sorted iterable of upper bucket bounds in seconds or None
+            for default bounds.
+        """
+        self.bounds = tuple(bounds) if bounds is not None else self.defaultBounds
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """!
+        Add new duration.
+
+        @param value Duration in seconds.
+        """
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def getQuantile(self, q):
+        """!
+        Estimate quantile as upper bound of bucket which contains it.
+
+        @param q Quantile in range from 0 to 1.
+        @return Duration in seconds, infinity if quantile is above largest bound
+            or None if histogram is empty.
+        """
+        if self.count == 0:
+            return None
+        target = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return float("inf")
+
+    def getCumulativeCounts(self):
+        """!
+        Get number of values which are not greater than each bound.
+
+        @return List of (bound, count) tuples. Last bound is infinity.
+        """
+        cumulativeCounts = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float("inf"), ), self.counts):
+            cumulative += count
+            cumulativeCounts.append((bound, cumulative))
+        return cumulativeCounts
+
+    def copy(self):
+        """!
+        Create copy of histogram.
+
+        @return LatencyHistogram object.
+        """
+        histogram = LatencyHistogram(self.bounds)
+        histogram.counts = list(self.counts)
+        histogram.count = self.count
+        histogram.sum = self.sum
+        return histogram
+
+    def merge(self, other):
+        """!
+        Add values of another histogram with the same bounds.
+
+        @param other LatencyHistogram object.
+        @throws ValueError If histograms have different bounds.
+        """
+        if other.bounds != self.bounds:
+            raise ValueError("Histograms have different bounds")
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.count += other.count
+        self.sum += other.sum
+
+    def __str__(self):
+        """!
+        Convert object to string.
+
+        @return String.
+        """
+        return "count: {}, p50: {}, p99: {}".format(self.count, self.getQuantile(0.5), self.getQuantile(0.99))
+
+    def __repr__(self):
+        """!
+        Convert object to representation string.
+
+        @return representation string.
+        """
+        return "<{}>".format(self.__str__())
+
+class ChannelMetrics:
+    """!
+    Latency histograms and counters of single channel. Latency of each stage is
+    measured from previous stage. Total latency is measured from receipt of
+    oldest message included in measurement to server response. Measurements of
+    window channels are received when their window is closed.
+    """
+
+    ## @var latencyStages
+    # Mapping {histogramName: (startStage, endStage)}.
+    latencyStages = {
+        "inbox": (Stage.received, Stage.buffered),
+        "buffer": (Stage.buffered, Stage.enqueued),
+        "queue": (Stage.enqueued, Stage.sendStarted),
+        "send": (Stage.sendStarted, Stage.responded),
+        "total": (Stage.received, Stage.responded),
+    }
+
+    ## @var histograms
+    # Mapping {histogramName: LatencyHistogram}.
+
+    ## @var messageCount
+    # Number of received messages.
+
+    ## @var sendCount
+    # Number of send attempts.
+
+    ## @var failureCount
+    # Number of failed send attempts.
+
+    ## @var dropCount
+    # Number of discarded messages and measurements.
+
+    ## @var retryCount
+    # Number of scheduled repeated attempts of failed updates.
+
+    ## @var overwriteCount
+    # Number of window values overwritten before their window closed.
+
+    ## @var metricsLock
+    # Mutual exclusion for histograms and counters.
+
+    def __init__(self):
+        """!
+        Initiate empty ChannelMetrics object.
+        """
+        self.histograms = {}
+        for name in self.latencyStages:
+            self.histograms[name] = LatencyHistogram()
+        self.messageCount = 0
+        self.sendCount = 0
+        self.failureCount = 0
+        self.dropCount = 0
+        self.retryCount = 0
+        self.overwriteCount = 0
+        self.metricsLock = threading.Semaphore(1)
+
+    def recordMessage(self):
+        """!
+        Count received message.
+        """
+        self.metricsLock.acquire()
+        try:
+            self.messageCount += 1
+        finally:
+            self.metricsLock.release()
+
+    def recordDrop(self, count = 1):
+        """!
+        Count discarded messages or measurements.
+
+        @param count Number of discarded items.
+        """
+        self.metricsLock.acquire()
+        try:
+            self.dropCount += count
+        finally:
+            self.metricsLock.release()
+
+    def recordOverwrite(self, count = 1):
+        """!
+        Count window values overwritten before their window closed.
+
+        @param count Number of overwritten values.
+        """
+        self.metricsLock.acquire()
+        try:
+            self.overwriteCount += count
+        finally:
+            self.metricsLock.release()
+
+    def recordRetry(self):
+        """!
+        Count scheduled repeated attempt.
+        """
+        self.metricsLock.acquire()
+        try:
+            self.retryCount += 1
+        finally:
+            self.metricsLock.release()
+
+    def recordSend(self, result, measurement):
+        """!
+        Count send attempt. Latencies of successfully sent measurement are added
+        into histograms.
+
+        @param result UpdateResult object.
+        @param measurement Measurement or MeasurementBatch object.
+        """
+        measurements = getMeasurements(measurement)
+        self.metricsLock.acquire()
+        try:
+            self.sendCount += 1
+            if not result.wasSuccessful():
+                self.failureCount += 1
+                return
+            for item in measurements:
+                for name, (startStage, endStage) in self.latencyStages.items():
+                    start = item.stageTimes.get(startStage)
+                    end = item.stageTimes.get(endStage)
+                    if start is not None and end is not None:
+                        self.histograms[name].observe(max(end - start, 0))
+        finally:
+            self.metricsLock.release()
+
+    def getSnapshot(self):
+        """!
+        Get consistent copy of current metrics.
+
+        @return Tuple (counters, histograms). Counters is mapping {counterName: value}
+            and histograms is mapping {histogramName: LatencyHistogram}.
+        """
+        self.metricsLock.acquire()
+        try:
+            counters = {
+                "messages": self.messageCount,
+                "sends": self.sendCount,
+                "failures": self.failureCount,
+                "drops": self.dropCount,
+                "retries": self.retryCount,
+                "overwrites": self.overwriteCount,
+            }
+            histograms = {}
+            for name, histogram in self.histograms.items():
+                histograms[name] = histogram.copy()
+            return (counters, histograms)
+        finally:
+            self.metricsLock.release()
+
+class MetricsRegistry:
+    """!
+    Metrics of all channels.
+    """
+
+    ## @var channelMetrics
+    # Mapping {channel: ChannelMetrics}.
+
+    ## @var registryLock
+    # Mutual exclusion for channel mapping.
+
+    def __init__(self):
+        """!
+        Initiate empty MetricsRegistry object.
+        """
+        self.channelMetrics = {}
+        self.registryLock = threading.Semaphore(1)
+
+    def getChannelMetrics(self, channel):
+        """!
+        Get metrics of channel. Metrics are created when channel is used first time.
+
+        @param channel Channel object.
+        @return ChannelMetrics object.
+        """
+        self.registryLock.acquire()
+        try:
+            if channel not in self.channelMetrics:
+                self.channelMetrics[channel] = ChannelMetrics()
+            return self.channelMetrics[channel]
+        finally:
+            self.registryLock.release()
+
+    def getChannels(self):
+        """!
+        Get channels with metrics.
+
+        @return List of Channel objects.
+        """
+        self.registryLock.acquire()
+        try:
+            return list(self.channelMetrics.keys())
+        finally:
+            self.registryLock.release()
@@ -0,0 +1,189 @@
+# Copyright (C) Ivo Slanina <ivo.slanina@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+class Scheduler:
+    """!
+    Execute scheduled jobs from single thread. Pending jobs are kept in heap ordered
+    by their deadlines, so number of threads doesn't depend on number of jobs.
+
+    Job actions are executed in scheduler thread. They should not block, otherwise
+    all other jobs will be delayed.
+    """
+
+    ## @var jobHeap
+    # Heap of (deadline, sequence, job) tuples.
+
+    ## @var jobCondition
+    # Condition variable guarding job heap.
+
+    ## @var sequence
+    # Counter which keeps jobs with equal deadlines in FIFO order.
+
+    ## @var running
+    # Keep track if scheduler is running.
+
+    ## @var thread
+    # Scheduler thread.
+
+    def __init__(self):
+        """!
+        Initiate scheduler.
+        """
+        self.jobHeap = []
+        self.jobCondition = threading.Condition()
+        self.sequence = itertools.count()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        """!
+        Start scheduler thread.
+        """
+        self.running = True
+        self.thread = threading.Thread(target = self.run)
+        self.thread.start()
+
+    def stop(self):
+        """!
+        Cancel all pending jobs and stop scheduler thread.
+        """
+        self.jobCondition.acquire()
+        try:
+            self.running = False
+            for _, _, job in self.jobHeap:
+                job.cancel()
+            self.jobHeap = []
+            self.jobCondition.notify()
+        finally:
+            self.jobCondition.release()
+
+    def schedule(self, scheduleTime, action):
+        """!
+        Schedule new job.
+
+        @param scheduleTime Timedelta object.
+        @param action Callable object executed after schedule time expires. Action takes one argument,
+            which is reference to scheduled job.
+        @return ScheduledJob object.
+        """
+        job = ScheduledJob(time.monotonic() + scheduleTime.total_seconds(), action)
+        self.jobCondition.acquire()
+        try:
+            heapq.heappush(self.jobHeap, (job.deadline, next(self.sequence), job))
+            # Wake up scheduler thread only if new job expires first.
+            if self.jobHeap[0][2] is job:
+                self.jobCondition.notify()
+        finally:
+            self.jobCondition.release()
+        return job
+
+    def getPendingCount(self):
+        """!
+        Get number of jobs waiting in scheduler.
+
+        @return Number of jobs, including cancelled jobs which hasn't expired yet.
+        """
+        return len(self.jobHeap)
+
+    def run(self):
+        """!
+        Scheduler thread code.
+        """
+        while True:
+            job = self.waitForJob()
+            if job is None:
+                return
+            try:
+                job.execute()
+            except Exception as ex:
+                logging.getLogger().error("Scheduled job error: %s", ex)
+
+    def waitForJob(self):
+        """!
+        Wait until some job expires.
+
+        @return Expired ScheduledJob object or None if scheduler was stopped.
+        """
+        self.jobCondition.acquire()
+        try:
+            while self.running:
+                if len(self.jobHeap) == 0:
+                    self.jobCondition.wait()
+                    continue
+                deadline, _, job = self.jobHeap[0]
+                if job.isCancelled():
+                    heapq.heappop(self.jobHeap)
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    self.jobCondition.wait(remaining)
+                    continue
+                heapq.heappop(self.jobHeap)
+                return job
+            return None
+        finally:
+            self.jobCondition.release()
+
+class ScheduledJob:
+    """!
+    Job waiting in scheduler.
+    """
+
+    ## @var deadline
+    # Monotonic time when job expires.
+
+    ## @var action
+    # Scheduled action.
+
+    ## @var cancelled
+    # Keep track if job was cancelled.
+
+    def __init__(self, deadline, action):
+        """!
+        Initiate scheduled job.
+
+        @param deadline Monotonic time when job expires.
+        @param action Callable object taking this job as argument.
+        """
+        self.deadline = deadline
+        self.action = action
+        self.cancelled = False
+
+    def execute(self):
+        """!
+        Run job action unless job was cancelled.
+        """
+        if not self.cancelled:
+            self.action(self)
+
+    def cancel(self):
+        """!
+        Cancel job. Cancelled job is never executed.
+        """
+        self.cancelled = True
+
+    def isCancelled(self):
+        """!
+        Check if job was cancelled.
+
+        @return True if job was cancelled, False otherwise.
+        """
+        return self.cancelled
@@ -15,11 +15,20 @@
 
 import collections
 import datetime
+import enum
+import heapq
 import http.client
+import itertools
+import json
 import threading
+import time
 import logging
+import queue
 import urllib.parse
 from mqspeak.channel import ChannelType
+from mqspeak.data import MeasurementBatch, getMeasurements
+from mqspeak.metrics import Stage
+from mqspeak.statistics import RunningStatistics
 
 class ChannelUpdateDispatcher:
     """!
@@ -36,18 +45,100 @@ class ChannelUpdateDispatcher:
     # Keep track if dispatcher is running.
 
     ## @var updateQueue
-    # Queue of pending updates.
+    # DeadlineUpdateQueue object of pending updates.
 
-    def __init__(self, channelConvertMapping):
+    ## @var queueLock
+    # Mutual exclusion for update queue.
+
+    ## @var sendingOptions
+    # SendingOptions object.
+
+    ## @var connectionPools
+    # List of ConnectionPool objects used by senders.
+
+    ## @var senderPools
+    # Mapping {channelType: SenderPool}.
+
+    ## @var spool
+    # MeasurementSpool object or None if measurements are not spooled.
+
+    ## @var metrics
+    # MetricsRegistry object or None.
+
+    ## @var rateLimiter
+    # RateLimiter object delaying updates of channels updated too often.
+
+    ## @var scheduler
+    # Scheduler object firing delayed updates or None.
+
+    ## @var delayedJobs
+    # Set of scheduled jobs of delayed updates.
+
+    ## @var reservedChannels
+    # Set of queued channels which already reserved their rate limited update.
+
+    ## @var delayLock
+    # Mutual exclusion for delayed jobs.
+
+    ## @var circuitBreakers
+    # Mapping {channelType: CircuitBreaker}.
+
+    def __init__(self, channelConvertMapping, sendingOptions = None):
         """!
         Initiate ChannelUpdateDispatcher object.
 
         @param channelConvertMapping Mapping {channel: channelParamConverter}.
+        @param sendingOptions SendingOptions object or None for default options.
         """
+        if sendingOptions is None:
+            sendingOptions = SendingOptions()
+        self.sendingOptions = sendingOptions
+        self.connectionPools = []
         self.channelSenders = self.createChannelSenders(channelConvertMapping)
+        self.senderPools = self.createSenderPools()
         self.dispatchLock = threading.Semaphore(0)
         self.running = False
-        self.updateQueue = collections.deque()
+        self.updateQueue = DeadlineUpdateQueue()
+        self.queueLock = threading.Semaphore(1)
+        self.spool = None
+        self.metrics = None
+        self.rateLimiter = RateLimiter(sendingOptions)
+        self.scheduler = None
+        self.delayedJobs = set()
+        self.delayLock = threading.Semaphore(1)
+        self.reservedChannels = set()
+        self.circuitBreakers = {}
+        for channelType in ChannelType:
+            self.circuitBreakers[channelType] = CircuitBreaker(
+                channelType.name,
+                sendingOptions.breakerThreshold,
+                sendingOptions.breakerTimeout)
+
+    def setScheduler(self, scheduler):
+        """!
+        Assign a scheduler. Updates exceeding rate limit are delayed with scheduler,
+        without scheduler they are sent immediately.
+
+        @param scheduler Scheduler object.
+        """
+        self.scheduler = scheduler
+
+    def setSpool(self, spool):
+        """!
+        Assign a spool. Measurements are written to spool before dispatch and
+        removed when they are successfully sent.
+
+        @param spool MeasurementSpool object.
+        """
+        self.spool = spool
+
+    def setMetrics(self, metricsRegistry):
+        """!
+        Assign channel metrics. Each send attempt is recorded.
+
+        @param metricsRegistry MetricsRegistry object.
+        """
+        self.metrics = metricsRegistry
 
     def createChannelSenders(self, channelConvertMapping):
         """!
@@ -57,10 +148,70 @@ class ChannelUpdateDispatcher:
         @return Senders mapping.
         """
         channelSenders = {}
-        channelSenders[ChannelType.thingspeak] = ThingSpeakSender(channelConvertMapping)
-        channelSenders[ChannelType.phant] = PhantSender(channelConvertMapping)
+        senderClasses = {
+            ChannelType.thingspeak: ThingSpeakSender,
+            ChannelType.phant: PhantSender}
+        for channelType, senderClass in senderClasses.items():
+            host, secure = self.sendingOptions.getServer(channelType) or (senderClass.host, senderClass.secure)
+            channelSenders[channelType] = senderClass(
+                channelConvertMapping,
+                self.createConnectionPool(host, secure))
         return channelSenders
 
+    def createSenderPools(self):
+        """!
+        Create and start sender thread pools for each channel type.
+
+        @return Mapping {channelType: SenderPool}.
+        """
+        senderPools = {}
+        for channelType in ChannelType:
+            senderPool = SenderPool(channelType.name, self.sendingOptions.getWorkerCount(channelType))
+            senderPool.setIdleListener(self.wakeUp)
+            senderPool.start()
+            senderPools[channelType] = senderPool
+        return senderPools
+
+    def getSenderPools(self):
+        """!
+        Get sender thread pools.
+
+        @return Mapping {channelType: SenderPool}.
+        """
+        return self.senderPools
+
+    def getQueueDepth(self):
+        """!
+        Get number of updates waiting for dispatch. Method doesn't lock queue.
+
+        @return Number of updates.
+        """
+        return self.updateQueue.depth
+
+    def getCircuitBreakers(self):
+        """!
+        Get circuit breakers of channel types.
+
+        @return Mapping {channelType: CircuitBreaker}.
+        """
+        return self.circuitBreakers
+
+    def createConnectionPool(self, host, secure):
+        """!
+        Create connection pool shared by all channels sending data to host.
+
+        @param host Server hostname.
+        @param secure Use HTTPS if True, HTTP otherwise.
+        @return ConnectionPool object.
+        """
+        connectionPool = ConnectionPool(
+            host,
+            secure,
+            self.sendingOptions.maxConnections,
+            self.sendingOptions.idleTimeout)
+        self.connectionPools.append(connectionPool)
+        return connectionPool
+
     def updateAvailable(self, channel, measurement, resultNotify):
         """!
         Notify main thread when new data is available.
@@ -69,17 +220,134 @@ class ChannelUpdateDispatcher:
         @param measurement
         @param resultNotify
         """
-        self.updateQueue.append((channel, measurement, resultNotify))
-        self.dispatchLock.release()
+        enqueuedTime = time.monotonic()
+        for item in getMeasurements(measurement):
+            item.markStage(Stage.enqueued, enqueuedTime)
+        # Measurement is stored before it is queued, so no sender can
+        # acknowledge it before its record is written.
+        if self.spool is not None:
+            self.spool.store(channel, measurement)
+        self.enqueue(channel, measurement, resultNotify)
+
+    def enqueue(self, channel, measurement, updater):
+        """!
+        Add update into dispatch queue and wake up dispatcher thread.
+
+        @param channel Updated channel.
+        @param measurement Update data.
+        @param updater Notified object with update results.
+        """
+        self.queueLock.acquire()
+        try:
+            discarded = self.updateQueue.put(channel, measurement, updater)
+        finally:
+            self.queueLock.release()
+        if len(discarded) > 0:
+            if self.spool is not None:
+                self.spool.acknowledge(MeasurementBatch(discarded))
+            if self.metrics is not None:
+                self.metrics.getChannelMetrics(channel).recordDrop(len(discarded))
+        self.wakeUp()
 
     def sendJobDone(self, result):
         """!
-        Notify updater.
+        Notify updater. Circuit breaker and updater are notified even if
+        recording of result fails, otherwise channel would never be updated again.
 
-        @param result
+        @param result Tuple (UpdateResult, updater, channel, measurement).
         """
-        (returnCode, updater) = result
-        updater.notifyUpdateResult(returnCode)
+        (returnCode, updater, channel, measurement) = result
+        try:
+            self.recordUpdateResult(channel, measurement, returnCode)
+        finally:
+            try:
+                self.resolveCircuitBreaker(self.circuitBreakers[channel.channelType], measurement, returnCode)
+            except Exception as ex:
+                logging.getLogger().error("Channel <%s>: circuit breaker error: %s", channel, ex)
+            finally:
+                updater.notifyUpdateResult(returnCode)
+
+    def recordUpdateResult(self, channel, measurement, result):
+        """!
+        Record update result into spool, rate limiter and metrics. Errors are
+        logged and not propagated.
+
+        @param channel Updated channel.
+        @param measurement Sent data.
+        @param result UpdateResult object.
+        """
+        if self.spool is not None and result.wasSuccessful():
+            try:
+                self.spool.acknowledge(measurement)
+            except Exception as ex:
+                logging.getLogger().error("Channel <%s>: can't acknowledge spooled data: %s", channel, ex)
+        if result.wasRateLimited():
+            try:
+                self.rateLimiter.penalize(channel, self.channelSenders[channel.channelType].connectionPool.host)
+            except Exception as ex:
+                logging.getLogger().error("Channel <%s>: rate limiter error: %s", channel, ex)
+        if self.metrics is not None:
+            try:
+                self.metrics.getChannelMetrics(channel).recordSend(result, measurement)
+            except Exception as ex:
+                logging.getLogger().error("Channel <%s>: can't record metrics: %s", channel, ex)
+
+    def resolveCircuitBreaker(self, circuitBreaker, measurement, result):
+        """!
+        Pass update result to circuit breaker. Schedule probe of opened circuit
+        and return parked updates into dispatch queue when circuit is closed
+        again, so they are dispatched earliest deadline first as sender threads
+        become idle.
+
+        @param circuitBreaker CircuitBreaker object.
+        @param measurement Sent data.
+        @param result UpdateResult object.
+        """
+        state = circuitBreaker.recordResult(measurement, result)
+        if state is CircuitState.open:
+            self.scheduleCircuitProbe(circuitBreaker)
+        elif state is CircuitState.closed:
+            for channel, measurement, updater in circuitBreaker.releaseParked():
+                self.enqueue(channel, measurement, updater)
+
+    def scheduleCircuitProbe(self, circuitBreaker):
+        """!
+        Schedule probe of opened circuit after circuit timeout expires.
+
+        @param circuitBreaker CircuitBreaker object.
+        """
+        if self.scheduler is None:
+            return
+        self.delayLock.acquire()
+        try:
+            job = self.scheduler.schedule(
+                circuitBreaker.openTimeout,
+                lambda job: self.onCircuitTimeout(job, circuitBreaker))
+            self.delayedJobs.add(job)
+        finally:
+            self.delayLock.release()
+
+    def onCircuitTimeout(self, job, circuitBreaker):
+        """!
+        Scheduler callback. Send one parked update to probe whether server recovered.
+
+        @param job Expired job.
+        @param circuitBreaker CircuitBreaker object.
+        """
+        self.delayLock.acquire()
+        try:
+            self.delayedJobs.discard(job)
+        finally:
+            self.delayLock.release()
+        update = circuitBreaker.takeProbe()
+        if update is not None:
+            self.submit(*update)
+
+    def wakeUp(self):
+        """!
+        Wake up dispatcher thread to check for updates which can be dispatched.
+        """
+        self.dispatchLock.release()
 
     def run(self):
         """!
@@ -93,9 +361,33 @@ class ChannelUpdateDispatcher:
             if not self.running:
                 return
 
-            # start send thread
-            channel, measurement, resultNotify = self.updateQueue.popleft()
-            self.dispatch(channel, measurement, resultNotify)
+            self.dispatchReady()
+
+    def dispatchReady(self):
+        """!
+        Dispatch queued updates, earliest deadline first, while sender pools have
+        idle workers. Updates stay in queue when all workers are busy, so urgent
+        updates queued later don't wait behind them.
+        """
+        while True:
+            self.queueLock.acquire()
+            try:
+                readyTypes = []
+                for channelType, senderPool in self.senderPools.items():
+                    if senderPool.hasIdleWorker():
+                        readyTypes.append(channelType)
+                update = self.updateQueue.get(readyTypes)
+                reserved = update is not None and update[0] in self.reservedChannels
+                if reserved:
+                    self.reservedChannels.discard(update[0])
+            finally:
+                self.queueLock.release()
+            if update is None:
+                return
+            if reserved:
+                self.dispatch(*update)
+            else:
+                self.dispatchLimited(*update)
 
     def stop(self):
         """!
@@ -104,39 +396,122 @@ class ChannelUpdateDispatcher:
         if self.running:
             self.running = False
             self.dispatchLock.release()
+        self.delayLock.acquire()
+        try:
+            for job in self.delayedJobs:
+                job.cancel()
+            self.delayedJobs = set()
+        finally:
+            self.delayLock.release()
+        for senderPool in self.senderPools.values():
+            senderPool.stop()
+        for senderPool in self.senderPools.values():
+            senderPool.join(self.sendingOptions.shutdownTimeout)
+        for connectionPool in self.connectionPools:
+            connectionPool.close()
+
+    def dispatchLimited(self, channel, measurement, updater):
+        """!
+        Dispatch update when channel rate limit allows it, otherwise delay it
+        until channel may be updated again.
+
+        @param channel Updated channel.
+        @param measurement Update data.
+        @param updater Notified object with update results.
+        """
+        delay = self.rateLimiter.reserve(channel, self.channelSenders[channel.channelType].connectionPool.host)
+        if delay <= 0 or self.scheduler is None:
+            self.dispatch(channel, measurement, updater)
+            return
+        logging.getLogger().info("Channel %s: rate limit exceeded, update delayed by %.1f seconds.",
+            channel, delay)
+        self.delayLock.acquire()
+        try:
+            job = self.scheduler.schedule(
+                datetime.timedelta(seconds = delay),
+                lambda job: self.onDelayExpired(job, channel, measurement, updater))
+            self.delayedJobs.add(job)
+        finally:
+            self.delayLock.release()
+
+    def onDelayExpired(self, job, channel, measurement, updater):
+        """!
+        Scheduler callback. Return delayed update into dispatch queue. Update
+        already holds its rate limit reservation, so it isn't delayed again.
+
+        @param job Expired job.
+        @param channel Updated channel.
+        @param measurement Update data.
+        @param updater Notified object with update results.
+        """
+        self.delayLock.acquire()
+        try:
+            self.delayedJobs.discard(job)
+        finally:
+            self.delayLock.release()
+        self.queueLock.acquire()
+        try:
+            self.reservedChannels.add(channel)
+        finally:
+            self.queueLock.release()
+        self.enqueue(channel, measurement, updater)
 
     def dispatch(self, channel, measurement, updater):
         """!
-        Dispatch new ThingSpeak update thread.
+        Dispatch new ThingSpeak update job into sender pool. When circuit of
+        channel type is open, update is parked until server recovers.
+
+        @param channel Updated channel.
+        @param measurement Update data.
+        @param updater Notified object with update results.
+        """
+        if self.circuitBreakers[channel.channelType].admit((channel, measurement, updater)):
+            self.submit(channel, measurement, updater)
+
+    def submit(self, channel, measurement, updater):
+        """!
+        Submit update job into sender pool.
 
         @param channel Updated channel.
         @param measurement Update data.
         @param updater Notified object with update results.
         """
-        sendThread = threading.Thread(
-            target = SendRunner(
+        self.senderPools[channel.channelType].submit(
+            SendRunner(
                 self.channelSenders[channel.channelType],
                 channel,
                 measurement,
                 updater,
                 self))
-        sendThread.start()
 
 class BaseSender:
     """!
     Sender base class.
     """
 
+    ## @var host
+    # Server hostname.
+    host = None
+
+    ## @var secure
+    # Use HTTPS if True, HTTP otherwise.
+    secure = True
+
     ## @var channelConvertMapping
     # Mapping {channel: channelParamConverter}.
 
-    def __init__(self, channelConvertMapping):
+    ## @var connectionPool
+    # ConnectionPool object.
+
+    def __init__(self, channelConvertMapping, connectionPool):
         """!
         Initiate Sender base class.
 
         @param channelConvertMapping Mapping {channel: channelParamConverter}.
+        @param connectionPool ConnectionPool object connected to sender host.
         """
         self.channelConvertMapping = channelConvertMapping
+        self.connectionPool = connectionPool
 
     def send(self, channel, measurement):
         """!
@@ -146,19 +521,22 @@ class BaseSender:
         @param measurement Measured data.
         """
         success = False
+        # Network errors are transient, failure can be retried.
+        retryable = True
+        rateLimited = False
         try:
-            logging.getLogger().info(
-                "Sending data to channel {}: {}...".format(channel, measurement))
+            logging.getLogger().info("Sending data to channel %s: %s...", channel, measurement)
             status, reason, responseBytes = self.fetch(channel, measurement)
             response = self.decodeResponseData(responseBytes)
-            logging.getLogger().info(
-                "Channel {} response: {} {}: {}".format(channel, status, reason, response))
+            logging.getLogger().info("Channel %s response: %s %s: %s", channel, status, reason, response)
             result = (status, reason, response)
             success = self.checkSendResult(result)
+            retryable = not success and self.isRetryable(result)
+            rateLimited = not success and self.isRateLimited(result)
         except BaseException as ex:
-            logging.getLogger().info("Send exception: {}".format(ex))
+            logging.getLogger().info("Send exception: %s", ex)
         finally:
-            return UpdateResult(success)
+            return UpdateResult(success, retryable, rateLimited)
 
     def decodeResponseData(self, responseBytes):
         """!
@@ -171,7 +549,7 @@ class BaseSender:
         try:
             data = responseBytes.decode("utf-8").strip()
         except UnicodeError as ex:
-            logging.getLogger().error("Can't decode response data: {}".format(responseBytes))
+            logging.getLogger().error("Can't decode response data: %s", responseBytes)
             data = "<Decode error>"
         finally:
             return data
@@ -193,36 +571,78 @@ class BaseSender:
         """
         raise NotImplementedError("Override this mehod in sub-class")
 
+    def isRetryable(self, result):
+        """!
+        Check if failed upload may succeed when it is repeated later. Server
+        errors and rate limiting are transient, other client errors are not.
+
+        @param result Tuple of (status, reason, response).
+        @return True if upload can be retried, False otherwise.
+        """
+        status, reason, data = result
+        return status >= 500 or self.isRateLimited(result)
+
+    def isRateLimited(self, result):
+        """!
+        Check if upload was rejected because channel was updated too often.
+
+        @param result Tuple of (status, reason, response).
+        @return True if upload was rate limited, False otherwise.
+        """
+        status, reason, data = result
+        return status == 429
+
 class ThingSpeakSender(BaseSender):
     """!
     Class for sending data to ThingSpeak. This class send measurements to URL api.thingspeak.com
     using HTTPS method. It also parses send result and checks if transfer was successful.
     """
 
+    host = "api.thingspeak.com"
+    secure = True
+
     def fetch(self, channel, measurement):
         """!
         @copydoc BaseSender::fetch()
         """
+        if isinstance(measurement, MeasurementBatch):
+            return self.fetchBulk(channel, measurement)
         body = self.channelConvertMapping[channel].convert(measurement)
         body.update({'created_at': measurement.time.isoformat(sep = ' ')})
         body.update({'api_key': channel.apiKey})
         bodyEncoded = urllib.parse.urlencode(body)
-        conn = http.client.HTTPSConnection("api.thingspeak.com", timeout = 30)
-        conn.request("POST", "/update", bodyEncoded)
-        response = conn.getresponse()
-        status = response.status
-        reason = response.reason
-        responseBytes = response.read()
-        conn.close()
-        return status, reason, responseBytes
+        headers = {"Content-Type": "application/x-www-form-urlencoded"}
+        return self.connectionPool.request("POST", "/update", bodyEncoded, headers)
+
+    def fetchBulk(self, channel, batch):
+        """!
+        Upload several measurements with their timestamps using bulk update API.
+
+        @param channel Channel identification object.
+        @param batch MeasurementBatch object.
+        """
+        updates = []
+        for measurement in batch.measurements:
+            update = self.channelConvertMapping[channel].convert(measurement)
+            update.update({'created_at': measurement.time.isoformat(sep = ' ')})
+            updates.append(update)
+        bodyEncoded = json.dumps({'write_api_key': channel.apiKey, 'updates': updates})
+        headers = {"Content-Type": "application/json"}
+        return self.connectionPool.request(
+            "POST",
+            "/channels/{}/bulk_update.json".format(channel.channelID),
+            bodyEncoded,
+            headers)
 
     def checkSendResult(self, result):
         """!
         @copydoc BaseSender::checkSendResult()
         """
         status, reason, data = result
+        if status == 202:
+            return self.checkBulkSendResult(result)
         if status != 200:
-            logging.getLogger().error("Response status error: {} {} - {}.".format(status, reason, data))
+            logging.getLogger().error("Response status error: %s %s - %s.", status, reason, data)
             return False
         try:
             entries = int(data)
@@ -230,15 +650,47 @@ class ThingSpeakSender(BaseSender):
                 logging.getLogger().error("Data send error: ThingSpeak responded with return code 0.")
                 return False
         except ValueError as ex:
-            logging.getLogger().error("Data send error: ThingSpeak responded with unexpected response: {}".format(repr(data)))
+            logging.getLogger().error("Data send error: ThingSpeak responded with unexpected response: %s",
+                repr(data))
             return False
         return True
 
+    def isRateLimited(self, result):
+        """!
+        @copydoc BaseSender::isRateLimited()
+        """
+        status, reason, data = result
+        if status == 200:
+            # ThingSpeak responds with entry id 0 when update was rejected,
+            # usually because channel was updated too early.
+            return data == "0"
+        return BaseSender.isRateLimited(self, result)
+
+    def checkBulkSendResult(self, result):
+        """!
+        Check if bulk update was accepted.
+
+        @param result Tuple of (status, reason, response).
+        @return True if update was accepted, False otherwise.
+        """
+        status, reason, data = result
+        try:
+            if json.loads(data).get("success") is True:
+                return True
+        except (ValueError, AttributeError) as ex:
+            pass
+        logging.getLogger().error("Data send error: ThingSpeak responded with unexpected bulk update response: %s",
+            repr(data))
+        return False
+
 class PhantSender(BaseSender):
     """!
     Send data to Phant server.
     """
 
+    host = "data.sparkfun.com"
+    secure = False
+
     def fetch(self, channel, measurement):
         """!
         @copydoc BaseSender::fetch()
@@ -247,14 +699,7 @@ class PhantSender(BaseSender):
         bodyEncoded = urllib.parse.urlencode(body)
         headers = {"Phant-Private-Key": channel.apiKey,
                     "Content-Type": "application/x-www-form-urlencoded"}
-        conn = http.client.HTTPConnection("data.sparkfun.com", timeout = 30)
-        conn.request("POST", "/input/{}".format(channel.channelID), bodyEncoded, headers=headers)
-        response = conn.getresponse()
-        status = response.status
-        reason = response.reason
-        responseBytes = response.read()
-        conn.close()
-        return status, reason, responseBytes
+        return self.connectionPool.request("POST", "/input/{}".format(channel.channelID), bodyEncoded, headers)
 
     def checkSendResult(self, result):
         """!
@@ -262,10 +707,924 @@ class PhantSender(BaseSender):
         """
         (status, reason, data) = result
         if status != 200:
-            logging.getLogger().error("Response status error: {} {} - {}.".format(status, reason, data))
+            logging.getLogger().error("Response status error: %s %s - %s.", status, reason, data)
             return False
         return True
 
+class ConnectionPool:
+    """!
+    Pool of persistent keep-alive connections to single HTTP server. Connections are
+    reused by all channels sending data to the same host, so each update doesn't pay
+    for new TCP connection and TLS handshake.
+
+    Connections idle longer than idle timeout are closed. Stale connection closed by
+    server is transparently replaced by new one.
+    """
+
+    ## @var host
+    # Server hostname.
+
+    ## @var secure
+    # Use HTTPS if True, HTTP otherwise.
+
+    ## @var idleTimeout
+    # Maximum time in seconds of keeping unused connection open.
+
+    ## @var timeout
+    # Socket timeout in seconds.
+
+    ## @var connectionSlots
+    # Semaphore limiting number of simultaneously used connections.
+
+    ## @var idleLock
+    # Mutual exclusion for idle connections and connection counters.
+
+    ## @var idleConnections
+    # List of (connection, lastUsed) tuples. Most recently used connection is last.
+
+    ## @var createdCount
+    # Number of opened connections.
+
+    ## @var reusedCount
+    # Number of requests sent over reused connection.
+
+    def __init__(self, host, secure = True, maxConnections = 4, idleTimeout = 60, timeout = 30):
+        """!
+        Initiate ConnectionPool object.
+
+        @param host Server hostname, optionally with port.
+        @param secure Use HTTPS if True, HTTP otherwise.
+        @param maxConnections Maximum number of simultaneously used connections.
+        @param idleTimeout Maximum time in seconds of keeping unused connection open.
+        @param timeout Socket timeout in seconds.
+        """
+        self.host = host
+        self.secure = secure
+        self.idleTimeout = idleTimeout
+        self.timeout = timeout
+        self.connectionSlots = threading.BoundedSemaphore(maxConnections)
+        self.idleLock = threading.Semaphore(1)
+        self.idleConnections = []
+        self.createdCount = 0
+        self.reusedCount = 0
+
+    def request(self, method, url, body = None, headers = None):
+        """!
+        Send HTTP request and read whole response.
+
+        @param method HTTP method.
+        @param url Request URL.
+        @param body Request body.
+        @param headers Request headers.
+        @return Tuple of (status, reason, responseBytes).
+        """
+        if headers is None:
+            headers = {}
+        self.connectionSlots.acquire()
+        try:
+            conn = self.getIdleConnection()
+            if conn is not None:
+                try:
+                    result = self.fetch(conn, method, url, body, headers)
+                    self.idleLock.acquire()
+                    try:
+                        self.reusedCount += 1
+                    finally:
+                        self.idleLock.release()
+                    return result
+                except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as ex:
+                    # Server closed connection while it was idle. Reconnect.
+                    logging.getLogger().info("Reconnecting stale connection to %s: %s", self.host, ex)
+            return self.fetch(self.createConnection(), method, url, body, headers)
+        finally:
+            self.connectionSlots.release()
+
+    def fetch(self, conn, method, url, body, headers):
+        """!
+        Send request over connection. Keep connection for future requests when
+        server allows it.
+
+        @param conn HTTPConnection object.
+        @param method HTTP method.
+        @param url Request URL.
+        @param body Request body.
+        @param headers Request headers.
+        @return Tuple of (status, reason, responseBytes).
+        """
+        try:
+            conn.request(method, url, body, headers)
+            response = conn.getresponse()
+            status = response.status
+            reason = response.reason
+            responseBytes = response.read()
+        except BaseException as ex:
+            conn.close()
+            raise
+        if response.will_close:
+            conn.close()
+        else:
+            self.releaseConnection(conn)
+        return status, reason, responseBytes
+
+    def createConnection(self):
+        """!
+        Open new connection.
+
+        @return HTTPConnection object.
+        """
+        self.idleLock.acquire()
+        try:
+            self.createdCount += 1
+        finally:
+            self.idleLock.release()
+        if self.secure:
+            return http.client.HTTPSConnection(self.host, timeout = self.timeout)
+        else:
+            return http.client.HTTPConnection(self.host, timeout = self.timeout)
+
+    def getIdleConnection(self):
+        """!
+        Get most recently used idle connection. Close expired idle connections.
+
+        @return HTTPConnection object or None if there isn't any idle connection.
+        """
+        self.idleLock.acquire()
+        try:
+            self.evictIdleConnections()
+            if len(self.idleConnections) == 0:
+                return None
+            conn, _ = self.idleConnections.pop()
+            return conn
+        finally:
+            self.idleLock.release()
+
+    def releaseConnection(self, conn):
+        """!
+        Return connection to pool.
+
+        @param conn HTTPConnection object.
+        """
+        self.idleLock.acquire()
+        try:
+            self.idleConnections.append((conn, time.monotonic()))
+        finally:
+            self.idleLock.release()
+
+    def evictIdleConnections(self):
+        """!
+        Close connections idle longer than idle timeout. Call with idleLock held.
+        """
+        deadline = time.monotonic() - self.idleTimeout
+        while len(self.idleConnections) > 0 and self.idleConnections[0][1] < deadline:
+            conn, _ = self.idleConnections.pop(0)
+            conn.close()
+
+    def getIdleCount(self):
+        """!
+        Get number of idle connections.
+
+        @return Number of idle connections.
+        """
+        return len(self.idleConnections)
+
+    def close(self):
+        """!
+        Close all idle connections.
+        """
+        self.idleLock.acquire()
+        try:
+            for conn, _ in self.idleConnections:
+                conn.close()
+            self.idleConnections = []
+        finally:
+            self.idleLock.release()
+
+class SenderPool:
+    """!
+    Fixed number of threads running send jobs. When all threads are busy, jobs
+    wait in queue, so slow server can't exhaust threads or file descriptors.
+    """
+
+    ## @var name
+    # Pool name.
+
+    ## @var workerCount
+    # Number of worker threads.
+
+    ## @var jobQueue
+    # Queue of (enqueueTime, job) tuples.
+
+    ## @var workers
+    # List of worker threads.
+
+    ## @var activeCount
+    # Number of currently running jobs.
+
+    ## @var submittedCount
+    # Number of submitted jobs.
+
+    ## @var waitStatistics
+    # RunningStatistics of time in seconds spent by jobs in queue.
+
+    ## @var statisticsLock
+    # Mutual exclusion for pool counters.
+
+    ## @var pendingCount
+    # Number of submitted jobs which haven't finished yet.
+
+    ## @var idleListener
+    # Callable object called after job finishes or None.
+
+    def __init__(self, name, workerCount):
+        """!
+        Initiate SenderPool object.
+
+        @param name Pool name.
+        @param workerCount Number of worker threads.
+        """
+        self.name = name
+        self.workerCount = workerCount
+        self.jobQueue = queue.Queue()
+        self.workers = []
+        self.activeCount = 0
+        self.submittedCount = 0
+        self.waitStatistics = RunningStatistics()
+        self.statisticsLock = threading.Semaphore(1)
+        self.pendingCount = 0
+        self.idleListener = None
+
+    def setIdleListener(self, idleListener):
+        """!
+        Set listener notified each time some job finishes and worker becomes idle.
+
+        @param idleListener Callable object without arguments.
+        """
+        self.idleListener = idleListener
+
+    def start(self):
+        """!
+        Start worker threads.
+        """
+        for _ in range(self.workerCount):
+            worker = threading.Thread(target = self.work)
+            worker.start()
+            self.workers.append(worker)
+
+    def stop(self):
+        """!
+        Stop accepting jobs. Worker threads finish already queued jobs and exit.
+        """
+        for _ in self.workers:
+            self.jobQueue.put(None)
+
+    def join(self, timeout):
+        """!
+        Wait for worker threads to finish.
+
+        @param timeout Maximum time in seconds to wait for all threads.
+        """
+        deadline = time.monotonic() + timeout
+        for worker in self.workers:
+            worker.join(max(deadline - time.monotonic(), 0))
+            if worker.is_alive():
+                logging.getLogger().warning("Sender pool %s: threads are still running", self.name)
+                break
+        self.workers = []
+
+    def submit(self, job):
+        """!
+        Queue send job.
+
+        @param job Callable object.
+        """
+        self.statisticsLock.acquire()
+        try:
+            self.submittedCount += 1
+            self.pendingCount += 1
+        finally:
+            self.statisticsLock.release()
+        self.jobQueue.put((time.monotonic(), job))
+
+    def work(self):
+        """!
+        Worker thread code.
+        """
+        while True:
+            item = self.jobQueue.get()
+            if item is None:
+                return
+            enqueueTime, job = item
+            self.statisticsLock.acquire()
+            try:
+                self.waitStatistics.push(time.monotonic() - enqueueTime)
+                self.activeCount += 1
+            finally:
+                self.statisticsLock.release()
+            try:
+                job()
+            except Exception as ex:
+                logging.getLogger().error("Sender pool %s: %s", self.name, ex)
+            finally:
+                self.statisticsLock.acquire()
+                try:
+                    self.activeCount -= 1
+                    self.pendingCount -= 1
+                finally:
+                    self.statisticsLock.release()
+                if self.idleListener is not None:
+                    self.idleListener()
+
+    def getQueueDepth(self):
+        """!
+        Get number of jobs waiting for free thread.
+
+        @return Number of queued jobs.
+        """
+        return self.jobQueue.qsize()
+
+    def getActiveCount(self):
+        """!
+        Get number of currently running jobs.
+
+        @return Number of running jobs.
+        """
+        return self.activeCount
+
+    def hasIdleWorker(self):
+        """!
+        Check if some worker thread would start new job immediately.
+
+        @return True if some worker is idle, False otherwise.
+        """
+        return self.pendingCount < self.workerCount
+
+    def getWaitStatistics(self):
+        """!
+        Get statistics of time spent by jobs in queue.
+
+        @return RunningStatistics object.
+        """
+        return self.waitStatistics
+
+class DeadlineUpdateQueue:
+    """!
+    Queue of pending updates. Updates are taken earliest deadline first.
+    Deadline of update is its measurement time plus channel update interval
+    divided by channel priority. Deadline never changes, so update of low
+    priority channel is delayed only by updates with earlier deadlines and it
+    can't starve.
+
+    Each channel has single updater which keeps at most one update in flight,
+    so queue holds at most one update of each channel and its size depends on
+    number of channels, not on number of received messages. Unexpected second
+    update of queued channel is merged with queued one: measurements of bulk
+    update channel are joined into single batch, otherwise newer update
+    replaces queued one.
+
+    Queue is not thread safe.
+    """
+
+    ## @var channelHeaps
+    # Mapping {channelType: heap of [deadline, sequence, channel, measurement, updater]
+    # entries}.
+
+    ## @var queuedEntries
+    # Mapping {channel: heap entry} of channels with queued update.
+
+    ## @var sequence
+    # Counter which keeps updates with equal deadlines in FIFO order.
+
+    ## @var depth
+    # Number of queued updates. Updated with queue content, so it can be read
+    # without locking.
+
+    def __init__(self):
+        """!
+        Initiate empty queue.
+        """
+        self.channelHeaps = {}
+        self.queuedEntries = {}
+        self.sequence = itertools.count()
+        self.depth = 0
+
+    def put(self, channel, measurement, updater):
+        """!
+        Add update into queue.
+
+        @param channel Updated channel.
+        @param measurement Measurement or MeasurementBatch object.
+        @param updater Notified object with update results.
+        @return List of Measurement objects discarded from queue.
+        """
+        entry = self.queuedEntries.get(channel)
+        if entry is not None:
+            logging.getLogger().error("Channel <%s>: update is already queued, merging updates.", channel)
+            return self.mergeUpdate(channel, entry, measurement, updater)
+        deadline = self.getDeadline(channel, measurement, updater)
+        entry = [deadline, next(self.sequence), channel, measurement, updater]
+        heapq.heappush(self.channelHeaps.setdefault(channel.channelType, []), entry)
+        self.queuedEntries[channel] = entry
+        self.depth += 1
+        return []
+
+    def mergeUpdate(self, channel, entry, measurement, updater):
+        """!
+        Merge new update into queued update of the same channel. Queued update
+        keeps its deadline.
+
+        @param channel Updated channel.
+        @param entry Heap entry of queued update.
+        @param measurement New Measurement or MeasurementBatch object.
+        @param updater Notified object with update results.
+        @return List of Measurement objects discarded from queue.
+        """
+        if channel.hasBulkUpdate():
+            measurements = getMeasurements(entry[3]) + getMeasurements(measurement)
+            # Oldest measurements which don't fit into batch are discarded.
+            discarded = measurements[:-channel.bulkSize]
+            measurements = measurements[-channel.bulkSize:]
+            merged = MeasurementBatch(measurements) if len(measurements) > 1 else measurements[0]
+        else:
+            discarded = getMeasurements(entry[3])
+            merged = measurement
+        entry[3] = merged
+        entry[4] = updater
+        return discarded
+
+    def get(self, channelTypes):
+        """!
+        Take update with earliest deadline.
+
+        @param channelTypes Iterable of ChannelType enumeration objects of channels
+            which can be taken.
+        @return Tuple (channel, measurement, updater) or None if there is no such update.
+        """
+        channelHeap = None
+        for channelType in channelTypes:
+            heap = self.channelHeaps.get(channelType)
+            if heap and (channelHeap is None or heap[0][:2] < channelHeap[0][:2]):
+                channelHeap = heap
+        if channelHeap is None:
+            return None
+        _, _, channel, measurement, updater = heapq.heappop(channelHeap)
+        del self.queuedEntries[channel]
+        self.depth -= 1
+        return (channel, measurement, updater)
+
+    def getDeadline(self, channel, measurement, updater):
+        """!
+        Calculate update deadline.
+
+        @param channel Updated channel.
+        @param measurement Measurement or MeasurementBatch object.
+        @param updater Updater object.
+        @return Datetime object.
+        """
+        if isinstance(measurement, MeasurementBatch):
+            measurementTime = measurement.measurements[0].time
+        else:
+            measurementTime = measurement.time
+        return measurementTime + updater.getUpdateInterval() / channel.priority
+
+    def __len__(self):
+        """!
+        Get number of queued updates.
+
+        @return Number of updates.
+        """
+        return self.depth
+
+class CircuitState(enum.Enum):
+    """!
+    Enumeration of circuit breaker states.
+    """
+
+    ## Updates are sent.
+    closed = 0
+    ## Server is considered unavailable, updates are parked.
+    open = 1
+    ## Single probe update is sent, other updates are parked.
+    halfOpen = 2
+
+class CircuitBreaker:
+    """!
+    Stop sending updates to server which repeatedly fails. After consecutive
+    failures reach threshold, circuit opens and updates are parked instead of
+    waiting for timeouts. When open timeout expires, circuit is half-open and
+    single parked update probes the server. Successful probe closes circuit and
+    releases parked updates, failed probe opens circuit again. Probe is identified
+    by its measurement, so results of updates sent before circuit was opened
+    don't resolve half-open circuit.
+
+    Only failures of server (server errors, network errors and timeouts) are
+    counted. Rejected updates show that server is available.
+    """
+
+    ## @var name
+    # Circuit name.
+
+    ## @var failureThreshold
+    # Number of consecutive failures which opens circuit. Zero disables circuit breaker.
+
+    ## @var openTimeout
+    # Timedelta object. Time after which opened circuit is probed.
+
+    ## @var state
+    # CircuitState enumeration object.
+
+    ## @var failureCount
+    # Number of consecutive failures.
+
+    ## @var openedTime
+    # Monotonic time when circuit was opened.
+
+    ## @var probeMeasurement
+    # Measurement of probe update being sent or None.
+
+    ## @var parkedUpdates
+    # Queue of parked (channel, measurement, updater) tuples.
+
+    ## @var transitionCounts
+    # Mapping {(fromState, toState): number of transitions}.
+
+    ## @var breakerLock
+    # Mutual exclusion for circuit state.
+
+    def __init__(self, name, failureThreshold, openTimeout):
+        """!
+        Initiate closed CircuitBreaker object.
+
+        @param name Circuit name.
+        @param failureThreshold Number of consecutive failures which opens circuit.
+        @param openTimeout Number of seconds after which opened circuit is probed.
+        """
+        self.name = name
+        self.failureThreshold = failureThreshold
+        self.openTimeout = datetime.timedelta(seconds = openTimeout)
+        self.state = CircuitState.closed
+        self.failureCount = 0
+        self.openedTime = None
+        self.probeMeasurement = None
+        self.parkedUpdates = collections.deque()
+        self.transitionCounts = {}
+        self.breakerLock = threading.Semaphore(1)
+
+    def admit(self, update):
+        """!
+        Check if update can be sent. Update which can't be sent is parked.
+
+        @param update Tuple (channel, measurement, updater).
+        @return True if update can be sent, False if it was parked.
+        """
+        self.breakerLock.acquire()
+        try:
+            if self.state is CircuitState.open:
+                if time.monotonic() - self.openedTime >= self.openTimeout.total_seconds():
+                    self.transition(CircuitState.halfOpen)
+            if self.state is CircuitState.closed:
+                return True
+            if self.state is CircuitState.halfOpen and self.probeMeasurement is None:
+                self.probeMeasurement = update[1]
+                return True
+            self.parkedUpdates.append(update)
+            return False
+        finally:
+            self.breakerLock.release()
+
+    def recordResult(self, measurement, result):
+        """!
+        Record result of sent update.
+
+        @param measurement Sent data.
+        @param result UpdateResult object.
+        @return CircuitState enumeration object if circuit changed state, None otherwise.
+        """
+        if self.failureThreshold == 0:
+            return None
+        failure = result.isRetryable() and not result.wasRateLimited()
+        self.breakerLock.acquire()
+        try:
+            if self.state is CircuitState.halfOpen:
+                if measurement is not self.probeMeasurement:
+                    # Result of update sent before circuit was opened.
+                    return None
+                self.probeMeasurement = None
+                if failure:
+                    return self.transition(CircuitState.open)
+                return self.transition(CircuitState.closed)
+            if self.state is CircuitState.closed:
+                if not failure:
+                    self.failureCount = 0
+                    return None
+                self.failureCount += 1
+                if self.failureCount >= self.failureThreshold:
+                    return self.transition(CircuitState.open)
+            # Results of updates sent before circuit was opened are ignored.
+            return None
+        finally:
+            self.breakerLock.release()
+
+    def takeProbe(self):
+        """!
+        Move opened circuit into half-open state and take parked update which
+        probes the server.
+
+        @return Tuple (channel, measurement, updater) or None if no update is parked.
+        """
+        self.breakerLock.acquire()
+        try:
+            if self.state is CircuitState.open:
+                self.transition(CircuitState.halfOpen)
+            if self.state is not CircuitState.halfOpen or self.probeMeasurement is not None:
+                return None
+            if len(self.parkedUpdates) == 0:
+                # Next dispatched update will probe the server.
+                return None
+            update = self.parkedUpdates.popleft()
+            self.probeMeasurement = update[1]
+            return update
+        finally:
+            self.breakerLock.release()
+
+    def releaseParked(self):
+        """!
+        Take all parked updates.
+
+        @return List of (channel, measurement, updater) tuples.
+        """
+        self.breakerLock.acquire()
+        try:
+            parkedUpdates = list(self.parkedUpdates)
+            self.parkedUpdates.clear()
+            return parkedUpdates
+        finally:
+            self.breakerLock.release()
+
+    def transition(self, state):
+        """!
+        Change circuit state. Call with breakerLock held.
+
+        @param state New CircuitState enumeration object.
+        @return New state.
+        """
+        if state is CircuitState.open:
+            self.openedTime = time.monotonic()
+            if self.state is CircuitState.halfOpen:
+                logging.getLogger().warning("Circuit %s probe failed, %s updates parked.",
+                    self.name, len(self.parkedUpdates))
+            else:
+                logging.getLogger().warning("Circuit %s opened after %s failures.",
+                    self.name, self.failureCount)
+        elif state is CircuitState.closed:
+            logging.getLogger().warning("Circuit %s closed, releasing %s parked updates.",
+                self.name, len(self.parkedUpdates))
+        self.failureCount = 0
+        transition = (self.state, state)
+        self.transitionCounts[transition] = self.transitionCounts.get(transition, 0) + 1
+        self.state = state
+        return state
+
+    def getState(self):
+        """!
+        Get circuit state.
+
+        @return CircuitState enumeration object.
+        """
+        return self.state
+
+    def getParkedCount(self):
+        """!
+        Get number of parked updates.
+
+        @return Number of updates.
+        """
+        return len(self.parkedUpdates)
+
+    def getTransitionCounts(self):
+        """!
+        Get number of transitions between states. Transitions which never
+        happened are not included.
+
+        @return Mapping {(fromState, toState): count}, states are CircuitState
+            enumeration objects.
+        """
+        self.breakerLock.acquire()
+        try:
+            return dict(self.transitionCounts)
+        finally:
+            self.breakerLock.release()
+
+class RateLimiter:
+    """!
+    Limit update rate of channels with token buckets. Each channel API key on each
+    host has its own bucket, so channels sharing the same key are limited together.
+    """
+
+    ## @var sendingOptions
+    # SendingOptions object.
+
+    ## @var buckets
+    # Mapping {(host, apiKey): TokenBucket}.
+
+    ## @var bucketLock
+    # Mutual exclusion for buckets.
+
+    def __init__(self, sendingOptions):
+        """!
+        Initiate RateLimiter object.
+
+        @param sendingOptions SendingOptions object.
+        """
+        self.sendingOptions = sendingOptions
+        self.buckets = {}
+        self.bucketLock = threading.Semaphore(1)
+
+    def reserve(self, channel, host):
+        """!
+        Reserve one update of channel.
+
+        @param channel Updated channel.
+        @param host Server hostname.
+        @return Number of seconds the update must be delayed.
+        """
+        self.bucketLock.acquire()
+        try:
+            bucket = self.getBucket(channel, host)
+            if bucket is None:
+                return 0
+            return bucket.reserve(time.monotonic())
+        finally:
+            self.bucketLock.release()
+
+    def penalize(self, channel, host):
+        """!
+        Notify that server rejected update of channel because of rate limit.
+
+        @param channel Updated channel.
+        @param host Server hostname.
+        """
+        self.bucketLock.acquire()
+        try:
+            bucket = self.getBucket(channel, host)
+            if bucket is not None:
+                bucket.drain(time.monotonic())
+        finally:
+            self.bucketLock.release()
+
+    def getBucket(self, channel, host):
+        """!
+        Get bucket of channel. Call with bucketLock held.
+
+        @param channel Updated channel.
+        @param host Server hostname.
+        @return TokenBucket object or None if channel type isn't limited.
+        """
+        rateLimit = self.sendingOptions.getRateLimit(channel.channelType)
+        if rateLimit is None:
+            return None
+        key = (host, channel.apiKey)
+        if key not in self.buckets:
+            interval, burst = rateLimit
+            self.buckets[key] = TokenBucket(interval, burst, time.monotonic())
+        return self.buckets[key]
+
+class TokenBucket:
+    """!
+    Token bucket. One token is added each interval, up to burst tokens. Reservation
+    takes a token even if bucket is empty, so reservations are served in order.
+    """
+
+    ## @var interval
+    # Number of seconds to add one token.
+
+    ## @var burst
+    # Maximum number of tokens.
+
+    ## @var tokens
+    # Number of available tokens. Negative when tokens are reserved in advance.
+
+    ## @var updated
+    # Monotonic time of last tokens update.
+
+    def __init__(self, interval, burst, now):
+        """!
+        Initiate full TokenBucket object.
+
+        @param interval Number of seconds to add one token.
+        @param burst Maximum number of tokens.
+        @param now Current monotonic time.
+        """
+        self.interval = interval
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def refill(self, now):
+        """!
+        Add tokens for time elapsed since last update.
+
+        @param now Current monotonic time.
+        """
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) / self.interval)
+        self.updated = now
+
+    def reserve(self, now):
+        """!
+        Take one token.
+
+        @param now Current monotonic time.
+        @return Number of seconds until taken token is available.
+        """
+        self.refill(now)
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0
+        return -self.tokens * self.interval
+
+    def drain(self, now):
+        """!
+        Remove all available tokens, so next reservation waits whole interval.
+
+        @param now Current monotonic time.
+        """
+        self.refill(now)
+        self.tokens = min(self.tokens, 0)
+
+class SendingOptions:
+    """!
+    Options of sending layer.
+    """
+
+    ## @var maxConnections
+    # Maximum number of simultaneously used connections to single host.
+
+    ## @var idleTimeout
+    # Maximum time in seconds of keeping unused connection open.
+
+    ## @var workers
+    # Default number of sender threads of each channel type.
+
+    ## @var channelTypeWorkers
+    # Mapping {channelType: workerCount} overriding default number of sender threads.
+
+    ## @var shutdownTimeout
+    # Maximum time in seconds to wait for running send jobs on exit.
+
+    ## @var rateLimits
+    # Mapping {channelType: (interval, burst)} of update rate limits of single channel.
+    # Channel types without limit are not present.
+
+    ## @var breakerThreshold
+    # Number of consecutive failed updates which opens circuit. Zero disables circuit breaker.
+
+    ## @var breakerTimeout
+    # Time in seconds after which opened circuit is probed.
+
+    ## @var servers
+    # Mapping {channelType: (host, secure)} overriding default server of sender.
+
+    def __init__(self):
+        """!
+        Initiate SendingOptions object with default values.
+        """
+        self.maxConnections = 4
+        self.idleTimeout = 60
+        self.workers = 4
+        self.channelTypeWorkers = {}
+        self.shutdownTimeout = 35
+        # ThingSpeak accepts one update of channel each 15 seconds.
+        self.rateLimits = {ChannelType.thingspeak: (15, 1)}
+        self.breakerThreshold = 5
+        self.breakerTimeout = 60
+        self.servers = {}
+
+    def getWorkerCount(self, channelType):
+        """!
+        Get number of sender threads of channel type.
+
+        @param channelType ChannelType enumeration object.
+        @return Number of threads.
+        """
+        return self.channelTypeWorkers.get(channelType, self.workers)
+
+    def getRateLimit(self, channelType):
+        """!
+        Get update rate limit of single channel.
+
+        @param channelType ChannelType enumeration object.
+        @return Tuple (interval, burst) or None if updates are not limited.
+        """
+        return self.rateLimits.get(channelType)
+
+    def getServer(self, channelType):
+        """!
+        Get server which receives updates of channel type.
+
+        @param channelType ChannelType enumeration object.
+        @return Tuple (host, secure) or None if default server of sender is used.
+        """
+        return self.servers.get(channelType)
+
 class SendRunner:
     """!
     Callable wrapper class for sending data to ThingSpeak in separate thread.
@@ -306,11 +1665,20 @@ class SendRunner:
         """!
         Thread code.
         """
-        try :
-            result = (self.sender.send(self.channel, self.measurement), self.updater)
-            self.jobNotify.sendJobDone(result)
+        measurements = getMeasurements(self.measurement)
+        sendStarted = time.monotonic()
+        for item in measurements:
+            item.markStage(Stage.sendStarted, sendStarted)
+        try:
+            sendResult = self.sender.send(self.channel, self.measurement)
         except Exception as ex:
-            self.jobNotify.sendJobDone(ex)
+            # Sender failed unexpectedly, handle it as transient error.
+            logging.getLogger().error("Channel <%s>: send error: %s", self.channel, ex)
+            sendResult = UpdateResult(False, True)
+        responded = time.monotonic()
+        for item in measurements:
+            item.markStage(Stage.responded, responded)
+        self.jobNotify.sendJobDone((sendResult, self.updater, self.channel, self.measurement))
 
 class UpdateResult:
     """!
@@ -320,13 +1688,23 @@ class UpdateResult:
     ## @var success
     # Flag if update was successful.
 
-    def __init__(self, success):
+    ## @var retryable
+    # Flag if failed update can be retried.
+
+    ## @var rateLimited
+    # Flag if update was rejected because channel was updated too often.
+
+    def __init__(self, success, retryable = False, rateLimited = False):
         """!
         Initiate update result.
 
         @param success Indicate if update was successful or not
+        @param retryable Indicate if failed update can be retried.
+        @param rateLimited Indicate if update was rejected by server rate limit.
         """
         self.success = success
+        self.retryable = retryable
+        self.rateLimited = rateLimited
 
     def wasSuccessful(self):
         """!
@@ -335,3 +1713,19 @@ class UpdateResult:
         @return True if was sucessful, False otherwise.
         """
         return self.success
+
+    def isRetryable(self):
+        """!
+        Check if failed update can be retried.
+
+        @return True if update failed with transient error, False otherwise.
+        """
+        return not self.success and self.retryable
+
+    def wasRateLimited(self):
+        """!
+        Check if update was rejected by server rate limit.
+
+        @return True if update was rate limited, False otherwise.
+        """
+        return not self.success and self.rateLimited
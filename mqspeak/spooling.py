@@ -0,0 +1,373 @@
+# Copyright (C) Ivo Slanina <ivo.slanina@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+import json
+import logging
+import queue
+import sqlite3
+import threading
+from mqspeak.data import getMeasurements
+from mqspeak.decoding import getFieldKey
+
+class MeasurementSpool:
+    """!
+    Durable queue of measurements which weren't sent yet. Measurements are
+    written into SQLite database in WAL mode before they are dispatched and
+    removed after they are successfully sent. Measurements which weren't sent
+    before exit are loaded again on startup.
+
+    Record identifiers are assigned immediately and records are written by
+    separate writer thread, so callers holding their locks don't wait for disk.
+    Writes are committed in batches, so disk is synchronized at most once per
+    sync interval regardless of update rate. Space of removed records is
+    returned to file system when spool becomes empty or after many records
+    were removed.
+    """
+
+    ## @var compactThreshold
+    # Number of removed records after which spool file is compacted.
+    compactThreshold = 10000
+
+    ## @var loadPageSize
+    # Number of records loaded from database at once.
+    loadPageSize = 1000
+
+    ## @var maxUncommitted
+    # Number of changed records after which transaction is committed before sync interval expires.
+    maxUncommitted = 1000
+
+    ## @var path
+    # Path to spool database file.
+
+    ## @var syncInterval
+    # Timedelta object. Maximum time between write and its commit.
+
+    ## @var connection
+    # SQLite connection or None if spool is closed.
+
+    ## @var spoolLock
+    # Mutual exclusion for database connection.
+
+    ## @var writeQueue
+    # Queue of pending writes. Each item is tuple (deletedIds, records) or None
+    # to stop writer thread.
+
+    ## @var writerThread
+    # Thread writing pending writes or None if spool is closed.
+
+    ## @var idLock
+    # Mutual exclusion for record identifiers.
+
+    ## @var lastId
+    # Last assigned record identifier.
+
+    ## @var uncommittedCount
+    # Number of changed records in running transaction.
+
+    ## @var removedCount
+    # Number of records removed since last compaction.
+
+    ## @var scheduler
+    # Scheduler object running periodic sync or None.
+
+    ## @var syncJob
+    # Scheduled sync job or None.
+
+    def __init__(self, path, syncInterval):
+        """!
+        Initiate MeasurementSpool object.
+
+        @param path Path to spool database file.
+        @param syncInterval Timedelta object. Zero commits every write immediately.
+        """
+        self.path = path
+        self.syncInterval = syncInterval
+        self.connection = None
+        self.spoolLock = threading.Semaphore(1)
+        self.writeQueue = queue.Queue()
+        self.writerThread = None
+        self.idLock = threading.Semaphore(1)
+        self.lastId = 0
+        self.uncommittedCount = 0
+        self.removedCount = 0
+        self.scheduler = None
+        self.syncJob = None
+
+    def open(self):
+        """!
+        Open spool database. Database file is created if it doesn't exist.
+        """
+        # Transactions are controlled explicitly.
+        self.connection = sqlite3.connect(self.path, check_same_thread = False, isolation_level = None)
+        # Auto vacuum mode must be set before first table is created.
+        self.connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = FULL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS measurements ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "channel TEXT NOT NULL, "
+            "time TEXT NOT NULL, "
+            "fields TEXT NOT NULL)")
+        self.lastId = self.connection.execute("SELECT COALESCE(MAX(id), 0) FROM measurements").fetchone()[0]
+        self.writerThread = threading.Thread(target = self.runWriter)
+        self.writerThread.start()
+
+    def start(self, scheduler):
+        """!
+        Start periodic commits of written records.
+
+        @param scheduler Scheduler object.
+        """
+        self.scheduler = scheduler
+        if self.syncInterval.total_seconds() > 0:
+            self.syncJob = self.scheduler.schedule(self.syncInterval, self.onSync)
+
+    def close(self):
+        """!
+        Write and commit pending records and close spool database.
+        """
+        if self.writerThread is not None:
+            self.writeQueue.put(None)
+            self.writerThread.join()
+            self.writerThread = None
+        self.spoolLock.acquire()
+        try:
+            if self.syncJob is not None:
+                self.syncJob.cancel()
+                self.syncJob = None
+            if self.connection is not None:
+                self.commit()
+                self.connection.close()
+                self.connection = None
+        finally:
+            self.spoolLock.release()
+
+    def store(self, channel, measurement):
+        """!
+        Write measurement before it is sent. Records superseded by measurement
+        are removed in the same transaction, so data are never missing in spool.
+        Record identifiers are assigned immediately, write is done by writer
+        thread. Call it before measurement is passed to other threads, so its
+        record is written before it is acknowledged.
+
+        @param channel Channel object.
+        @param measurement Measurement or MeasurementBatch object.
+        """
+        deletedIds = []
+        records = []
+        self.idLock.acquire()
+        try:
+            for item in getMeasurements(measurement):
+                deletedIds.extend(item.supersededIds)
+                item.supersededIds = []
+                if item.spoolId is None:
+                    self.lastId += 1
+                    item.spoolId = self.lastId
+                    records.append((item.spoolId, channel.name, item.time, item.fields))
+        finally:
+            self.idLock.release()
+        self.writeQueue.put((deletedIds, records))
+
+    def acknowledge(self, measurement):
+        """!
+        Remove successfully sent measurement.
+
+        @param measurement Measurement or MeasurementBatch object.
+        """
+        spoolIds = []
+        for item in getMeasurements(measurement):
+            if item.spoolId is not None:
+                spoolIds.append(item.spoolId)
+                item.spoolId = None
+        self.remove(spoolIds)
+
+    def remove(self, spoolIds):
+        """!
+        Remove records. Records are removed by writer thread.
+
+        @param spoolIds Iterable of record identifiers.
+        """
+        self.writeQueue.put((list(spoolIds), []))
+
+    def runWriter(self):
+        """!
+        Write pending writes until spool is closed.
+        """
+        while True:
+            write = self.writeQueue.get()
+            if write is None:
+                return
+            deletedIds, records = write
+            self.spoolLock.acquire()
+            try:
+                self.begin()
+                self.delete(deletedIds)
+                self.insert(records)
+                self.commitIfNeeded()
+            except sqlite3.Error as ex:
+                logging.getLogger().error("Spool write error: %s", ex)
+            finally:
+                self.spoolLock.release()
+
+    def loadPages(self):
+        """!
+        Load records in pages of at most loadPageSize records, newest first. Only
+        single page is kept in memory, records may be removed between pages.
+
+        @return Generator of lists of tuples (spoolId, channelName, time, fields),
+            where fields is mapping {fieldKey: value}, see getFieldKey().
+        """
+        lastId = None
+        while True:
+            self.spoolLock.acquire()
+            try:
+                if lastId is None:
+                    rows = self.connection.execute(
+                        "SELECT id, channel, time, fields FROM measurements ORDER BY id DESC LIMIT ?",
+                        (self.loadPageSize, )).fetchall()
+                else:
+                    rows = self.connection.execute(
+                        "SELECT id, channel, time, fields FROM measurements WHERE id < ? ORDER BY id DESC LIMIT ?",
+                        (lastId, self.loadPageSize)).fetchall()
+            finally:
+                self.spoolLock.release()
+            if len(rows) == 0:
+                return
+            lastId = rows[-1][0]
+            yield [
+                (spoolId, channelName, datetime.datetime.fromisoformat(timestamp), self.decodeFields(fields))
+                for spoolId, channelName, timestamp, fields in rows]
+
+    def getCount(self):
+        """!
+        Get number of spooled records. Writes waiting for writer thread are not
+        included.
+
+        @return Number of records.
+        """
+        self.spoolLock.acquire()
+        try:
+            return self.connection.execute("SELECT COUNT(*) FROM measurements").fetchone()[0]
+        finally:
+            self.spoolLock.release()
+
+    def onSync(self, job):
+        """!
+        Scheduler callback. Commit written records.
+
+        @param job Expired job.
+        """
+        self.spoolLock.acquire()
+        try:
+            if job is not self.syncJob:
+                return
+            try:
+                self.commit()
+            except sqlite3.Error as ex:
+                logging.getLogger().error("Spool sync error: %s", ex)
+            self.syncJob = self.scheduler.schedule(self.syncInterval, self.onSync)
+        finally:
+            self.spoolLock.release()
+
+    def begin(self):
+        """!
+        Begin transaction if no transaction is running. Call with spoolLock held.
+        """
+        if not self.connection.in_transaction:
+            self.connection.execute("BEGIN")
+
+    def commitIfNeeded(self):
+        """!
+        Commit transaction if commits are not batched or if batch is too large.
+        Call with spoolLock held.
+        """
+        if self.syncInterval.total_seconds() <= 0 or self.uncommittedCount >= self.maxUncommitted:
+            self.commit()
+
+    def commit(self):
+        """!
+        Commit running transaction and compact spool file if needed. Call with
+        spoolLock held.
+        """
+        if self.connection.in_transaction:
+            self.connection.execute("COMMIT")
+        self.uncommittedCount = 0
+        self.compactIfNeeded()
+
+    def insert(self, records):
+        """!
+        Insert records in running transaction. Call with spoolLock held.
+
+        @param records Iterable of tuples (spoolId, channelName, time, fields).
+        """
+        parameters = [
+            (spoolId, channelName, timestamp.isoformat(), self.encodeFields(fields))
+            for spoolId, channelName, timestamp, fields in records]
+        if len(parameters) > 0:
+            self.connection.executemany(
+                "INSERT INTO measurements (id, channel, time, fields) VALUES (?, ?, ?, ?)",
+                parameters)
+            self.uncommittedCount += len(parameters)
+
+    def delete(self, spoolIds):
+        """!
+        Delete records in running transaction. Call with spoolLock held.
+
+        @param spoolIds Iterable of record identifiers.
+        """
+        parameters = [(spoolId, ) for spoolId in spoolIds]
+        if len(parameters) > 0:
+            self.connection.executemany("DELETE FROM measurements WHERE id = ?", parameters)
+            self.uncommittedCount += len(parameters)
+            self.removedCount += len(parameters)
+
+    def compactIfNeeded(self):
+        """!
+        Truncate write-ahead log and release free pages when spool is empty or
+        when many records were removed. Call with spoolLock held and no transaction
+        running.
+        """
+        if self.removedCount == 0:
+            return
+        isEmpty = self.connection.execute("SELECT NOT EXISTS (SELECT 1 FROM measurements)").fetchone()[0]
+        if isEmpty or self.removedCount >= self.compactThreshold:
+            self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.connection.execute("PRAGMA incremental_vacuum")
+            self.removedCount = 0
+
+    def encodeFields(self, fields):
+        """!
+        Serialize measurement fields.
+
+        @param fields Mapping {DataIdentifier: value}.
+        @return JSON string.
+        """
+        return json.dumps([
+            list(getFieldKey(dataIdentifier)) + [value]
+            for dataIdentifier, value in fields.items()])
+
+    def decodeFields(self, fields):
+        """!
+        Deserialize measurement fields.
+
+        @param fields JSON string.
+        @return Mapping {fieldKey: value}, see getFieldKey().
+        """
+        mapping = {}
+        for item in json.loads(fields):
+            mapping[tuple(item[:-1])] = item[-1]
+        return mapping
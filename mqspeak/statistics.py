@@ -0,0 +1,330 @@
+# Copyright (C) Ivo Slanina <ivo.slanina@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import math
+
+class RunningStatistics:
+    """!
+    Streaming statistics of series of numbers. Values are not stored, object
+    keeps only count, mean, minimum, maximum and sum of squared differences
+    from the mean (Welford's method).
+    """
+
+    ## @var count
+    # Number of values.
+
+    ## @var mean
+    # Arithmetic mean of values.
+
+    ## @var squaredDeviations
+    # Sum of squared differences from the mean.
+
+    ## @var minimum
+    # Smallest value or None.
+
+    ## @var maximum
+    # Largest value or None.
+
+    def __init__(self):
+        """!
+        Initiate empty statistics.
+        """
+        self.count = 0
+        self.mean = 0.0
+        self.squaredDeviations = 0.0
+        self.minimum = None
+        self.maximum = None
+
+    def push(self, value):
+        """!
+        Add new value.
+
+        @param value Number.
+        """
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.squaredDeviations += delta * (value - self.mean)
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    def merge(self, other):
+        """!
+        Add all values summarized by another statistics object (Chan's parallel
+        algorithm).
+
+        @param other RunningStatistics object.
+        """
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.squaredDeviations += other.squaredDeviations + delta * delta * self.count * other.count / count
+        self.count = count
+        if self.minimum is None or other.minimum < self.minimum:
+            self.minimum = other.minimum
+        if self.maximum is None or other.maximum > self.maximum:
+            self.maximum = other.maximum
+
+    def getCount(self):
+        """!
+        Get number of values.
+
+        @return Number of values.
+        """
+        return self.count
+
+    def getMean(self):
+        """!
+        Get arithmetic mean.
+
+        @return Mean value.
+        """
+        return self.mean
+
+    def getMin(self):
+        """!
+        Get smallest value.
+
+        @return Minimum.
+        """
+        return self.minimum
+
+    def getMax(self):
+        """!
+        Get largest value.
+
+        @return Maximum.
+        """
+        return self.maximum
+
+    def getVariance(self):
+        """!
+        Get population variance.
+
+        @return Variance.
+        """
+        if self.count == 0:
+            return 0.0
+        return self.squaredDeviations / self.count
+
+    def getStandardDeviation(self):
+        """!
+        Get population standard deviation.
+
+        @return Standard deviation.
+        """
+        return math.sqrt(self.getVariance())
+
+    def __str__(self):
+        """!
+        Convert object to string.
+
+        @return String.
+        """
+        return "count: {}, mean: {}, min: {}, max: {}".format(
+            self.count, self.mean, self.minimum, self.maximum)
+
+    def __repr__(self):
+        """!
+        Convert object to representation string.
+
+        @return representation string.
+        """
+        return "<{}>".format(self.__str__())
+
+class TDigest:
+    """!
+    Streaming quantile sketch (merging t-digest). Values are summarized by bounded
+    number of weighted centroids, which are small near distribution tails and large
+    in the middle. Memory depends only on compression, not on number of values.
+    Two sketches can be merged together.
+    """
+
+    ## @var compression
+    # Compression parameter. Higher value means more centroids and better accuracy.
+
+    ## @var bufferSize
+    # Maximum number of unmerged values.
+
+    ## @var means
+    # Sorted list of centroid means.
+
+    ## @var weights
+    # List of centroid weights.
+
+    ## @var unmerged
+    # List of (mean, weight) tuples waiting to be merged into centroids.
+
+    ## @var count
+    # Total weight of all values.
+
+    ## @var minimum
+    # Smallest value or None.
+
+    ## @var maximum
+    # Largest value or None.
+
+    def __init__(self, compression = 100):
+        """!
+        Initiate empty sketch.
+
+        @param compression Compression parameter.
+        """
+        self.compression = compression
+        self.bufferSize = 5 * compression
+        self.means = []
+        self.weights = []
+        self.unmerged = []
+        self.count = 0
+        self.minimum = None
+        self.maximum = None
+
+    def push(self, value, weight = 1):
+        """!
+        Add new value.
+
+        @param value Number.
+        @param weight Value weight.
+        """
+        self.unmerged.append((value, weight))
+        self.count += weight
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+        if len(self.unmerged) >= self.bufferSize:
+            self.compress()
+
+    def merge(self, other):
+        """!
+        Add all values summarized by another sketch.
+
+        @param other TDigest object.
+        """
+        other.compress()
+        for mean, weight in zip(other.means, other.weights):
+            self.push(mean, weight)
+        if other.minimum is not None and other.minimum < self.minimum:
+            self.minimum = other.minimum
+        if other.maximum is not None and other.maximum > self.maximum:
+            self.maximum = other.maximum
+
+    def compress(self):
+        """!
+        Merge buffered values into centroids.
+        """
+        if len(self.unmerged) == 0:
+            return
+        items = sorted(list(zip(self.means, self.weights)) + self.unmerged)
+        self.unmerged = []
+        means = []
+        weights = []
+        mergedWeight = 0
+        qLimit = self.getQuantileLimit(0.0)
+        centroidMean, centroidWeight = items[0]
+        for mean, weight in items[1:]:
+            if (mergedWeight + centroidWeight + weight) / self.count <= qLimit:
+                centroidWeight += weight
+                centroidMean += (mean - centroidMean) * weight / centroidWeight
+            else:
+                means.append(centroidMean)
+                weights.append(centroidWeight)
+                mergedWeight += centroidWeight
+                qLimit = self.getQuantileLimit(mergedWeight / self.count)
+                centroidMean, centroidWeight = mean, weight
+        means.append(centroidMean)
+        weights.append(centroidWeight)
+        self.means = means
+        self.weights = weights
+
+    def getQuantileLimit(self, q):
+        """!
+        Get largest quantile which may be merged into centroid starting at quantile q.
+        Uses arcsine scale function, which keeps tail centroids small.
+
+        @param q Quantile of centroid start.
+        @return Quantile limit.
+        """
+        k = self.compression / (2 * math.pi) * math.asin(2 * q - 1) + 1
+        if k >= self.compression / 4:
+            return 1.0
+        return (math.sin(k * 2 * math.pi / self.compression) + 1) / 2
+
+    def getCount(self):
+        """!
+        Get number of values.
+
+        @return Number of values.
+        """
+        return self.count
+
+    def getQuantile(self, q):
+        """!
+        Estimate quantile.
+
+        @param q Quantile in range from 0 to 1.
+        @return Estimated value or None if sketch is empty.
+        """
+        self.compress()
+        if self.count == 0:
+            return None
+        if len(self.means) == 1:
+            return self.means[0]
+        target = q * self.count
+        # Each centroid is located in the middle of its weight.
+        cumulative = self.weights[0] / 2
+        if target <= cumulative:
+            return self.interpolate(self.minimum, self.means[0], target / cumulative)
+        for i in range(1, len(self.means)):
+            center = cumulative + (self.weights[i - 1] + self.weights[i]) / 2
+            if target <= center:
+                return self.interpolate(
+                    self.means[i - 1],
+                    self.means[i],
+                    (target - cumulative) / (center - cumulative))
+            cumulative = center
+        remaining = self.count - cumulative
+        return self.interpolate(self.means[-1], self.maximum, (target - cumulative) / remaining)
+
+    def interpolate(self, low, high, fraction):
+        """!
+        Linear interpolation between two values.
+
+        @param low Lower value.
+        @param high Upper value.
+        @param fraction Fraction in range from 0 to 1.
+        @return Interpolated value.
+        """
+        return low + (high - low) * fraction
+
+    def __str__(self):
+        """!
+        Convert object to string.
+
+        @return String.
+        """
+        return "count: {}, centroids: {}".format(self.count, len(self.means))
+
+    def __repr__(self):
+        """!
+        Convert object to representation string.
+
+        @return representation string.
+        """
+        return "<{}>".format(self.__str__())
@@ -13,9 +13,11 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import atexit
 import sys
 import logging
 import logging.handlers
+import queue
 from mqspeak.config import ProgramConfig, ConfigException
 from mqspeak.data import MeasurementParamConverter
 from mqspeak import args
@@ -33,7 +35,6 @@ class System:
         """
 
         l = logging.getLogger()
-        l.setLevel(logging.INFO)
         h = logging.handlers.SysLogHandler(address='/dev/log')
 
         cls.cliArgs = args.parse_args()
@@ -42,19 +43,27 @@ class System:
         if cls.cliArgs.log_stdout:
             h = logging.StreamHandler(stream = sys.stdout)
 
-        # Verbose.
+        # Verbose. Level is set on root logger, so filtered records are
+        # dropped before their message is formatted.
         if cls.cliArgs.verbose:
-            h.setLevel(logging.INFO)
+            l.setLevel(logging.INFO)
         else:
-            h.setLevel(logging.ERROR)
-        l.addHandler(h)
+            l.setLevel(logging.ERROR)
+
+        # Records are written to destination by background thread, logging
+        # threads don't wait for syslog socket or terminal.
+        logQueue = queue.Queue()
+        l.addHandler(logging.handlers.QueueHandler(logQueue))
+        cls.logListener = logging.handlers.QueueListener(logQueue, h)
+        cls.logListener.start()
+        atexit.register(cls.logListener.stop)
 
         config = ProgramConfig(cls.cliArgs.config)
         # TODO: handle config exceptions
         try:
             cls.configCache = config.parse()
         except ConfigException as ex:
-            logging.getLogger().error("Configuration error: {}".format(ex))
+            logging.getLogger().error("Configuration error: %s", ex)
             exit(1)
 
     @classmethod
@@ -103,3 +112,39 @@ class System:
         for channel, updater, _ in cls.configCache.channelUpdateDescribtors:
             channelUpdateMapping[channel] = updater
         return channelUpdateMapping
+
+    @classmethod
+    def getUpdateWorkerDescriptor(cls):
+        """!
+        Get options of threads processing received data.
+
+        @return (workerCount, inboxCapacity, overflowPolicy)
+        """
+        return cls.configCache.updateWorkerDescriptor
+
+    @classmethod
+    def getSendingOptions(cls):
+        """!
+        Get options of sending layer.
+
+        @return SendingOptions object.
+        """
+        return cls.configCache.sendingOptions
+
+    @classmethod
+    def getSpoolDescriptor(cls):
+        """!
+        Get options of measurement spool.
+
+        @return (path, syncInterval) or None if spool is disabled.
+        """
+        return cls.configCache.spoolDescriptor
+
+    @classmethod
+    def getMetricsDescriptor(cls):
+        """!
+        Get options of metrics exporter.
+
+        @return (address, port) or None if exporter is disabled.
+        """
+        return cls.configCache.metricsDescriptor
@@ -13,14 +13,21 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import collections
 import datetime
+import enum
+import math
+import random
 import threading
 import time
 import queue
 import logging
-from mqspeak.collecting import LastValueUpdateBuffer, AverageUpdateBuffer, ChangeValueBuffer
+from mqspeak.collecting import LastValueUpdateBuffer, AverageUpdateBuffer, QuantileUpdateBuffer, ChangeValueBuffer, WindowUpdateBuffer, TopicStore
 from mqreceive.collecting import DataCollector
-from mqspeak.data import Measurement
+from mqspeak.data import Measurement, MeasurementBatch
+from mqspeak.decoding import DecodedDataIdentifier, TopicDecoder, getFieldKey
+from mqspeak.logs import LogCoalescer
+from mqspeak.metrics import Stage
 
 class ChannnelUpdateSupervisor(DataCollector):
     """!
@@ -28,32 +35,133 @@ class ChannnelUpdateSupervisor(DataCollector):
     correct Updater object.
     """
 
+    ## @var payloadLog
+    # LogCoalescer object reporting payloads which aren't valid UTF-8.
+    payloadLog = LogCoalescer(logging.INFO, "%d undecodable payloads skipped on %s in %.1f s")
+
     ## @var channelUpdaterMapping
     # Mapping for {channel: updater}.
 
     ## @var waitingChannels
     # Mapping of channels which has some data wainting.
 
-    def __init__(self, channelUpdaterMapping):
+    ## @var scheduler
+    # Scheduler object.
+
+    ## @var workerPool
+    # UpdateWorkerPool object draining updater inboxes.
+
+    ## @var updaterInboxMapping
+    # Mapping for {updater: inbox}.
+
+    ## @var dataIdentifierInboxMapping
+    # Routing index {dataIdentifier: [inbox]}.
+
+    ## @var topicStore
+    # TopicStore object with received values shared by all updaters.
+
+    ## @var topicDecoderMapping
+    # Mapping {dataIdentifier: TopicDecoder} of topics with decoded payload.
+
+    ## @var brokerMessageCounts
+    # Mapping {brokerName: number of received messages}. Each broker thread
+    # updates only its own counter.
+
+    def __init__(self, channelUpdaterMapping, scheduler, workerCount = 4, inboxCapacity = 100,
+            overflowPolicy = None):
         """!
         Initiate ChannnelUpdateSupervisor object.
 
         @param channelUpdaterMapping Mapping for {channel: updater}.
+        @param scheduler Scheduler object shared by all updaters.
+        @param workerCount Number of threads processing received data.
+        @param inboxCapacity Maximum number of received items waiting for single updater.
+        @param overflowPolicy OverflowPolicy enumeration object. Defaults to OverflowPolicy.block.
         """
+        if overflowPolicy is None:
+            overflowPolicy = OverflowPolicy.block
         self.channelUpdaterMapping = channelUpdaterMapping
         self.waitingChannels = {}
-        self.waintingUpdater = SchedulerExecutor(
-            datetime.timedelta(seconds = 1),
-            self.updateWaitingData)
-        threading.Thread(target = self.waintingUpdater).start()
+        self.scheduler = scheduler
+        self.topicStore = TopicStore()
+        for updater in channelUpdaterMapping.values():
+            updater.setScheduler(scheduler)
+            for dataIdentifier in updater.getDataIdentifiers():
+                self.topicStore.getTopicState(dataIdentifier)
+            updater.setTopicStore(self.topicStore)
+        self.workerPool = UpdateWorkerPool(workerCount)
+        self.updaterInboxMapping = {}
+        for updater in channelUpdaterMapping.values():
+            self.updaterInboxMapping[updater] = UpdaterInbox(
+                updater, inboxCapacity, overflowPolicy, self.workerPool)
+        self.dataIdentifierInboxMapping = self.createDataIdentifierInboxMapping(channelUpdaterMapping)
+        self.topicDecoderMapping = self.createTopicDecoderMapping(self.dataIdentifierInboxMapping)
+        self.brokerMessageCounts = {}
+        for dataIdentifier in self.dataIdentifierInboxMapping:
+            self.brokerMessageCounts[dataIdentifier.broker.name] = 0
+        self.workerPool.start()
+
+    def createDataIdentifierInboxMapping(self, channelUpdaterMapping):
+        """!
+        Create routing index of updater inboxes interested in each data identifier.
 
-    def updateWaitingData(self, executor):
+        @param channelUpdaterMapping Mapping for {channel: updater}.
+        @return Mapping {dataIdentifier: [inbox]}.
+        """
+        dataIdentifierInboxMapping = {}
+        for updater in channelUpdaterMapping.values():
+            for dataIdentifier in updater.getDataIdentifiers():
+                if dataIdentifier not in dataIdentifierInboxMapping:
+                    dataIdentifierInboxMapping[dataIdentifier] = []
+                dataIdentifierInboxMapping[dataIdentifier].append(self.updaterInboxMapping[updater])
+        return dataIdentifierInboxMapping
+
+    def createTopicDecoderMapping(self, dataIdentifierInboxMapping):
         """!
-        Do partitial update. Clear waiting data.
+        Create decoders of topics which payload is decoded into several values.
+
+        @param dataIdentifierInboxMapping Routing index {dataIdentifier: [inbox]}.
+        @return Mapping {dataIdentifier: TopicDecoder}.
         """
-        for updater in self.channelUpdaterMapping.values():
-            updater.notifyUpdateWaiting()
-        threading.Thread(target = self.waintingUpdater).start()
+        topicDecoderMapping = {}
+        for dataIdentifier in dataIdentifierInboxMapping:
+            if isinstance(dataIdentifier, DecodedDataIdentifier):
+                sourceIdentifier = dataIdentifier.getSourceIdentifier()
+                if sourceIdentifier not in topicDecoderMapping:
+                    topicDecoderMapping[sourceIdentifier] = TopicDecoder()
+                topicDecoderMapping[sourceIdentifier].addDataIdentifier(dataIdentifier)
+        return topicDecoderMapping
+
+    def getBrokerMessageCounts(self):
+        """!
+        Get number of messages received from each broker.
+
+        @return Mapping {brokerName: count}.
+        """
+        return dict(self.brokerMessageCounts)
+
+    def getBufferedCounts(self):
+        """!
+        Get number of measurements waiting in update buffer of each channel.
+        Method doesn't lock updaters, counts may be outdated.
+
+        @return Mapping {channel: count}.
+        """
+        bufferedCounts = {}
+        for channel, updater in self.channelUpdaterMapping.items():
+            bufferedCounts[channel] = updater.updateBuffer.getPendingCount()
+        return bufferedCounts
+
+    def getInboxDepths(self):
+        """!
+        Get number of received items waiting in each updater inbox.
+
+        @return Mapping {channel: depth}.
+        """
+        inboxDepths = {}
+        for channel, updater in self.channelUpdaterMapping.items():
+            inboxDepths[channel] = self.updaterInboxMapping[updater].getDepth()
+        return inboxDepths
 
     def setDispatcher(self, dispatcher):
         """!
@@ -64,28 +172,335 @@ class ChannnelUpdateSupervisor(DataCollector):
         for updater in self.channelUpdaterMapping.values():
             updater.setDispatcher(dispatcher)
 
+    def setMetrics(self, metricsRegistry):
+        """!
+        Assign channel metrics to all updaters.
+
+        @param metricsRegistry MetricsRegistry object.
+        """
+        for channel, updater in self.channelUpdaterMapping.items():
+            updater.setMetrics(metricsRegistry.getChannelMetrics(channel))
+
+    def setSpool(self, spool):
+        """!
+        Assign a spool to all updaters.
+
+        @param spool MeasurementSpool object.
+        """
+        for updater in self.channelUpdaterMapping.values():
+            updater.setSpool(spool)
+
+    def restoreSpooledMeasurements(self, spool):
+        """!
+        Load measurements which weren't sent before last exit from spool and pass
+        them to channel updaters. Spool is streamed in pages from newest records,
+        so bounded update buffers keep newest data without loading whole spool
+        into memory. Records of unknown channels are removed.
+
+        @param spool MeasurementSpool object.
+        """
+        channelNameMapping = {}
+        for channel, updater in self.channelUpdaterMapping.items():
+            dataIdentifierMapping = {}
+            for dataIdentifier in updater.getDataIdentifiers():
+                dataIdentifierMapping[getFieldKey(dataIdentifier)] = dataIdentifier
+            channelNameMapping[channel.name] = (updater, dataIdentifierMapping)
+        unknownCount = 0
+        restoredCounts = {}
+        for records in spool.loadPages():
+            unknownIds = []
+            pageMeasurements = {}
+            for spoolId, channelName, timestamp, fields in records:
+                if channelName not in channelNameMapping:
+                    unknownIds.append(spoolId)
+                    continue
+                updater, dataIdentifierMapping = channelNameMapping[channelName]
+                measurementFields = {}
+                for key, value in fields.items():
+                    if key in dataIdentifierMapping:
+                        measurementFields[dataIdentifierMapping[key]] = value
+                pageMeasurements.setdefault(updater, []).append(Measurement(measurementFields, timestamp, spoolId))
+            if len(unknownIds) > 0:
+                spool.remove(unknownIds)
+                unknownCount += len(unknownIds)
+            for updater, measurements in pageMeasurements.items():
+                # Records of page are loaded newest first.
+                measurements.reverse()
+                updater.restoreSpooledMeasurements(measurements)
+                restoredCounts[updater] = restoredCounts.get(updater, 0) + len(measurements)
+        if unknownCount > 0:
+            logging.getLogger().warning("Removed %s spooled measurements of unknown channels.", unknownCount)
+        for updater, count in restoredCounts.items():
+            logging.getLogger().info("Channel <%s>: restored %s spooled measurements.", updater.channel, count)
+            updater.finishRestore()
+
     def stop(self):
         """!
         Stop execution of all updaters.
         """
-        self.waintingUpdater.stop()
+        for inbox in self.updaterInboxMapping.values():
+            inbox.close()
+        self.workerPool.stop()
         for updater in self.channelUpdaterMapping.values():
             updater.stop()
 
     def onNewData(self, dataIdentifier, data):
+        brokerName = dataIdentifier.broker.name
+        if brokerName in self.brokerMessageCounts:
+            self.brokerMessageCounts[brokerName] += 1
+
+        topicDecoder = self.topicDecoderMapping.get(dataIdentifier)
+        if topicDecoder is not None:
+            # Payload is parsed once, decoded values are delivered separately.
+            for decodedIdentifier, value in topicDecoder.decode(data):
+                self.deliver(decodedIdentifier, value, self.dataIdentifierInboxMapping[decodedIdentifier])
+
+        inboxes = self.dataIdentifierInboxMapping.get(dataIdentifier)
+        if inboxes is None:
+            # No channel is interested in raw payload of this topic.
+            return
+
         try:
             data = data.decode("utf-8")
         except UnicodeError as ex:
-            logging.getLogger().info("Can't decode received message payload: {}".format(repr(data)))
+            self.payloadLog.log(dataIdentifier, "Can't decode received message payload: %r", data)
 
-        for updater in self.channelUpdaterMapping.values():
-            if updater.isUpdateRelevant(dataIdentifier):
+        self.deliver(dataIdentifier, data, inboxes)
 
-                # Notify updater in separate thread for case that updater will
-                # block for some reason.
-                threading.Thread(
-                    target = updater.updateReceivedData,
-                    args = (dataIdentifier, data)).start()
+    def deliver(self, dataIdentifier, value, inboxes):
+        """!
+        Pass received value to updater inboxes.
+
+        @param dataIdentifier Data identification.
+        @param value Received value.
+        @param inboxes List of UpdaterInbox objects.
+        """
+        # Value is parsed and stored once for all interested updaters. Window
+        # samples are appended to ring shared by all channels of topic, so they
+        # are aggregated even if some inbox drops the value. Inbox item of
+        # window updater only notifies it about new samples.
+        self.topicStore.update(dataIdentifier, value)
+
+        # Updaters are notified by worker pool threads for case that updater
+        # will block for some reason.
+        for inbox in inboxes:
+            inbox.put(dataIdentifier, value)
+
+class OverflowPolicy(enum.Enum):
+    """!
+    Enumeration of actions taken when updater inbox is full.
+    """
+
+    block = 0
+    dropOldest = 1
+    dropNewest = 2
+
+class UpdaterInbox:
+    """!
+    Bounded queue of received data waiting for single updater. Items are delivered
+    to updater in order of arrival and never by more than one thread at time.
+    """
+
+    ## @var updater
+    # Updater object receiving queued data.
+
+    ## @var capacity
+    # Maximum number of queued items.
+
+    ## @var overflowPolicy
+    # OverflowPolicy enumeration object.
+
+    ## @var workerPool
+    # UpdateWorkerPool object which drains this inbox.
+
+    ## @var items
+    # Queue of (dataIdentifier, value, receivedTime) tuples.
+
+    ## @var itemsCondition
+    # Condition variable guarding items queue.
+
+    ## @var isScheduled
+    # Keep track if this inbox is waiting in worker pool or being drained.
+
+    ## @var isClosed
+    # Keep track if inbox accepts new items.
+
+    ## @var droppedCount
+    # Number of items dropped due to overflow.
+
+    def __init__(self, updater, capacity, overflowPolicy, workerPool):
+        """!
+        Initiate UpdaterInbox object.
+
+        @param updater Updater object.
+        @param capacity Maximum number of queued items.
+        @param overflowPolicy OverflowPolicy enumeration object.
+        @param workerPool UpdateWorkerPool object.
+        """
+        self.updater = updater
+        self.capacity = capacity
+        self.overflowPolicy = overflowPolicy
+        self.workerPool = workerPool
+        self.items = collections.deque()
+        self.itemsCondition = threading.Condition()
+        self.isScheduled = False
+        self.isClosed = False
+        self.droppedCount = 0
+
+    def put(self, dataIdentifier, value):
+        """!
+        Queue received data.
+
+        @param dataIdentifier Data identification.
+        @param value Data content.
+        """
+        schedule = False
+        self.itemsCondition.acquire()
+        try:
+            if len(self.items) >= self.capacity:
+                if self.overflowPolicy == OverflowPolicy.block:
+                    while len(self.items) >= self.capacity and not self.isClosed:
+                        self.itemsCondition.wait()
+                elif self.overflowPolicy == OverflowPolicy.dropOldest:
+                    self.items.popleft()
+                    self.droppedCount += 1
+                    self.updater.recordDrop(1)
+                else:
+                    self.droppedCount += 1
+                    self.updater.recordDrop(1)
+                    return
+            if self.isClosed:
+                return
+            self.items.append((dataIdentifier, value, time.monotonic()))
+            if not self.isScheduled:
+                self.isScheduled = True
+                schedule = True
+        finally:
+            self.itemsCondition.release()
+        if schedule:
+            self.workerPool.schedule(self)
+
+    def process(self, limit):
+        """!
+        Deliver queued items to updater. Called from worker pool thread.
+
+        @param limit Maximum number of items delivered before inbox yields
+            worker thread to other inboxes.
+        """
+        for _ in range(limit):
+            self.itemsCondition.acquire()
+            try:
+                if len(self.items) == 0:
+                    self.isScheduled = False
+                    return
+                dataIdentifier, value, receivedTime = self.items.popleft()
+                self.itemsCondition.notify()
+            finally:
+                self.itemsCondition.release()
+            try:
+                self.updater.updateReceivedData(dataIdentifier, value, receivedTime)
+            except Exception as ex:
+                logging.getLogger().error("Channel <%s>: %s", self.updater.channel, ex)
+
+        self.itemsCondition.acquire()
+        try:
+            if len(self.items) == 0:
+                self.isScheduled = False
+                return
+        finally:
+            self.itemsCondition.release()
+        self.workerPool.schedule(self)
+
+    def getDepth(self):
+        """!
+        Get number of queued items.
+
+        @return Queue depth.
+        """
+        return len(self.items)
+
+    def close(self):
+        """!
+        Stop accepting new items and release blocked producers.
+        """
+        self.itemsCondition.acquire()
+        try:
+            self.isClosed = True
+            self.itemsCondition.notify_all()
+        finally:
+            self.itemsCondition.release()
+
+class UpdateWorkerPool:
+    """!
+    Fixed set of threads delivering received data from updater inboxes.
+    """
+
+    ## @var workerCount
+    # Number of worker threads.
+
+    ## @var batchSize
+    # Maximum number of items delivered from single inbox at once.
+
+    ## @var readyInboxes
+    # Queue of inboxes with pending items.
+
+    ## @var workers
+    # List of worker threads.
+
+    def __init__(self, workerCount, batchSize = 32):
+        """!
+        Initiate UpdateWorkerPool object.
+
+        @param workerCount Number of worker threads.
+        @param batchSize Maximum number of items delivered from single inbox at once.
+        """
+        self.workerCount = workerCount
+        self.batchSize = batchSize
+        self.readyInboxes = queue.Queue()
+        self.workers = []
+
+    def start(self):
+        """!
+        Start worker threads.
+        """
+        for _ in range(self.workerCount):
+            worker = threading.Thread(target = self.work)
+            worker.start()
+            self.workers.append(worker)
+
+    def stop(self, timeout = 10):
+        """!
+        Stop worker threads. Workers finish already scheduled inboxes and exit.
+
+        @param timeout Maximum time in seconds to wait for all threads.
+        """
+        for _ in self.workers:
+            self.readyInboxes.put(None)
+        deadline = time.monotonic() + timeout
+        for worker in self.workers:
+            worker.join(max(deadline - time.monotonic(), 0))
+            if worker.is_alive():
+                logging.getLogger().warning("Update worker threads are still running")
+                break
+        self.workers = []
+
+    def schedule(self, inbox):
+        """!
+        Schedule inbox with pending items.
+
+        @param inbox UpdaterInbox object.
+        """
+        self.readyInboxes.put(inbox)
+
+    def work(self):
+        """!
+        Worker thread code.
+        """
+        while True:
+            inbox = self.readyInboxes.get()
+            if inbox is None:
+                return
+            inbox.process(self.batchSize)
 
 class BaseUpdater:
     """!
@@ -96,6 +511,9 @@ class BaseUpdater:
     in its separate thread and notifies back an updater, when update finishes.
     """
 
+    ## @var receiveErrorLog
+    # LogCoalescer object of this updater reporting invalid received data.
+
     ## @var channel
     # Updated channel.
 
@@ -112,12 +530,41 @@ class BaseUpdater:
     # Timestamp of started waiting (when updater has some data and is in
     # waiting state) or None if updater doesn't wait for any remaning data.
 
+    ## @var waitingJob
+    # Scheduled job which starts waiting after update interval expires or
+    # which fires waiting timeout. None if no such job is pending.
+
     ## @var updateLock
     # Mutual exclusion to running updates.
 
+    ## @var sentMeasurements
+    # List of measurements of running update or None.
+
+    ## @var retryCount
+    # Number of repeated attempts to send current data.
+
+    ## @var retryJob
+    # Scheduled job repeating failed update or None.
+
+    ## @var spool
+    # MeasurementSpool object or None if measurements are not spooled.
+
+    ## @var rateController
+    # AdaptiveRateController object or None if update interval is fixed.
+
+    ## @var metrics
+    # ChannelMetrics object or None.
+
+    ## @var pendingStageTimes
+    # Mapping {Stage: monotonic time} of oldest data merged in update buffer
+    # which weren't sent yet or None.
+
     ## @var dispatcher
     # Update dispatcher object.
 
+    ## @var scheduler
+    # Scheduler object.
+
     ## @var updateBuffer
     # Channel UpdateBuffer object.
 
@@ -134,8 +581,22 @@ class BaseUpdater:
         self.isUpdateRunning = False
         self.lastUpdated = datetime.datetime.min
         self.waitingStarted = None
+        self.waitingJob = None
         self.updateLock = threading.Semaphore(1)
         self.updateBuffer = updateBuffer
+        self.sentMeasurements = None
+        self.retryCount = 0
+        self.retryJob = None
+        self.spool = None
+        self.rateController = None
+        self.metrics = None
+        self.pendingStageTimes = None
+        if channel.hasAdaptiveRate():
+            self.rateController = AdaptiveRateController(updateInterval, channel.maxUpdateInterval)
+        # Each channel has its own log, so errors of one channel don't hide others.
+        self.receiveErrorLog = LogCoalescer(
+            logging.ERROR,
+            "Channel <" + str(channel).replace("%", "%%") + ">: %d receive errors skipped on %s in %.1f s")
 
     def setDispatcher(self, dispatcher):
         """!
@@ -145,10 +606,98 @@ class BaseUpdater:
         """
         self.dispatcher = dispatcher
 
+    def setScheduler(self, scheduler):
+        """!
+        Assign a scheduler.
+
+        @param scheduler Scheduler object.
+        """
+        self.scheduler = scheduler
+
+    def setTopicStore(self, topicStore):
+        """!
+        Assign store of received values shared with other updaters.
+
+        @param topicStore TopicStore object.
+        """
+        self.updateBuffer.setTopicStore(topicStore)
+
+    def setSpool(self, spool):
+        """!
+        Assign a spool. Measurements queued in update buffer are written to spool
+        as soon as they are created.
+
+        @param spool MeasurementSpool object.
+        """
+        self.spool = spool
+
+    def setMetrics(self, metrics):
+        """!
+        Assign channel metrics.
+
+        @param metrics ChannelMetrics object.
+        """
+        self.metrics = metrics
+
+    def recordDrop(self, count):
+        """!
+        Count discarded messages or measurements.
+
+        @param count Number of discarded items.
+        """
+        if self.metrics is not None and count > 0:
+            self.metrics.recordDrop(count)
+
+    def recordOverwrite(self, count):
+        """!
+        Count window values overwritten before their window closed.
+
+        @param count Number of overwritten values.
+        """
+        if self.metrics is not None and count > 0:
+            self.metrics.recordOverwrite(count)
+
+    def collectNewMeasurements(self, stageTimes):
+        """!
+        Record stage times of measurements created in update buffer and write
+        them to spool. Spool doesn't wait for disk, records are written by spool
+        writer thread. Data merged into buffer keep stage times of oldest data
+        until they are sent. Call with updateLock held.
+
+        @param stageTimes Mapping {Stage: monotonic time} of received data.
+        """
+        newMeasurements = self.updateBuffer.takeNewMeasurements()
+        for measurement in newMeasurements:
+            measurement.stageTimes.update(stageTimes)
+        if not self.updateBuffer.queuesMeasurements and self.pendingStageTimes is None:
+            self.pendingStageTimes = stageTimes
+        self.recordDrop(self.updateBuffer.takeDiscardedCount())
+        self.recordOverwrite(self.updateBuffer.takeOverwrittenCount())
+        if self.spool is not None and len(newMeasurements) > 0:
+            self.spool.store(self.channel, MeasurementBatch(newMeasurements))
+
     def stop(self):
         """!
-        Override this method if updater manage some other running thread.
+        Cancel pending waiting job and log skipped receive errors. Extend this
+        method if updater manage some other scheduled jobs.
+        """
+        self.updateLock.acquire()
+        try:
+            self.cancelWaiting()
+            if self.retryJob is not None:
+                self.retryJob.cancel()
+                self.retryJob = None
+        finally:
+            self.updateLock.release()
+        self.receiveErrorLog.close()
+
+    def getUpdateInterval(self):
+        """!
+        Get current update interval.
+
+        @return Timedelta object.
         """
+        return self.updateInterval
 
     def isUpdateIntervalExpired(self):
         """!
@@ -164,6 +713,14 @@ class BaseUpdater:
         """
         self.lastUpdated = datetime.datetime.now()
 
+    def getDataIdentifiers(self):
+        """!
+        Get data identifiers this updater is interested in.
+
+        @return Iterable of DataIdentifier objects.
+        """
+        return self.updateBuffer.dataIdentifiers
+
     def isUpdateRelevant(self, dataIdentifier):
         """!
         Check if update is relevant to this channel.
@@ -173,55 +730,109 @@ class BaseUpdater:
         """
         return self.updateBuffer.isUpdateRelevant(dataIdentifier)
 
-    def updateReceivedData(self, dataIdentifier, value):
+    def updateReceivedData(self, dataIdentifier, value, receivedTime = None):
         """!
         Update received data.
 
         @param dataIdentifier Data identification.
         @param value Data content.
+        @param receivedTime Monotonic time of message receipt or None if data
+            were received just now.
         @throws TopicException If unwanted topic is updated.
         """
-        # TODO: execute this code in separate thread. If one channel blocks, all
-        # other channels will be also blocked.
         self.updateLock.acquire()
         try:
+            bufferedTime = time.monotonic()
+            if receivedTime is None:
+                receivedTime = bufferedTime
+            if self.metrics is not None:
+                self.metrics.recordMessage()
             self.updateBuffer.updateReceivedData(dataIdentifier, value)
+            self.collectNewMeasurements({Stage.received: receivedTime, Stage.buffered: bufferedTime})
             if not self.isUpdateRunning:
                 if self.updateBuffer.isComplete():
                     self.dataComplete()
                 else:
-                    if self.isUpdateIntervalExpired() and \
-                            self.channel.hasWaiting() and \
-                            self.waitingStarted is None:
-                        self.waitingStarted = datetime.datetime.now()
+                    self.armWaiting()
         except Exception as ex:
-            logging.getLogger().error("Channel <{}>: {}".format(self.channel, ex))
+            self.receiveErrorLog.log(dataIdentifier, "Channel <%s>: %s", self.channel, ex)
         finally:
             self.updateLock.release()
 
-    def notifyUpdateWaiting(self):
+    def armWaiting(self):
         """!
-        Call this method periodically to chech if waiting interval has been
-        exceeded.
+        Schedule waiting deadline when channel has waiting enabled and update
+        buffer stores some incomplete data. Waiting is delayed until update
+        interval expires. Channels without waiting or without data don't
+        schedule anything. Call with updateLock held.
         """
-        if self.channel.hasWaiting():
-            self.updateLock.acquire()
-            try:
-                if not self.isUpdateRunning:
-                    if self.waitingStarted is not None :
-                        delta = datetime.datetime.now() - self.waitingStarted
-                        if self.updateBuffer.hasAnyData() and delta > self.channel.waiting:
-                            logging.getLogger().warning(
-                                "Waiting timeouted, data items {} hasn't any data.".format(
-                                    ", ".join(str(x) for x in self.updateBuffer.getMissingDataIdentifiers())))
-                            self.runUpdate()
-                            self.updateBuffer.reset()
-                    elif self.updateBuffer.hasAnyData() and self.isUpdateIntervalExpired():
-                        # Update buffer store some data. Start waiting for a case that no
-                        # more data will be received in the future.
-                        self.waitingStarted = datetime.datetime.now()
-            finally:
-                self.updateLock.release()
+        if not self.channel.hasWaiting() or self.waitingJob is not None:
+            return
+        if not self.updateBuffer.hasAnyData() or self.updateBuffer.isComplete():
+            return
+        if self.isUpdateIntervalExpired():
+            # Update buffer store some data. Start waiting for a case that no
+            # more data will be received in the future.
+            self.waitingStarted = datetime.datetime.now()
+            self.waitingJob = self.scheduler.schedule(self.channel.waiting, self.onWaitingTimeout)
+        else:
+            self.armIntervalExpiry()
+
+    def armIntervalExpiry(self):
+        """!
+        Schedule onUpdateIntervalExpired() callback at end of update interval.
+        Call with updateLock held and no waiting job pending.
+        """
+        remaining = self.lastUpdated + self.updateInterval - datetime.datetime.now()
+        self.waitingJob = self.scheduler.schedule(
+            max(remaining, datetime.timedelta(0)),
+            self.onUpdateIntervalExpired)
+
+    def cancelWaiting(self):
+        """!
+        Cancel pending waiting job. Call with updateLock held.
+        """
+        if self.waitingJob is not None:
+            self.waitingJob.cancel()
+            self.waitingJob = None
+        self.waitingStarted = None
+
+    def onUpdateIntervalExpired(self, job):
+        """!
+        Scheduler callback. Send complete data or start waiting for remaining
+        data after update interval expires.
+
+        @param job Expired job.
+        """
+        self.updateLock.acquire()
+        try:
+            if job is self.waitingJob:
+                self.waitingJob = None
+                if self.isUpdateRunning:
+                    pass
+                elif self.updateBuffer.isComplete():
+                    self.dataComplete()
+                else:
+                    self.armWaiting()
+        finally:
+            self.updateLock.release()
+
+    def onWaitingTimeout(self, job):
+        """!
+        Scheduler callback. Send incomplete data when waiting interval expires.
+
+        @param job Expired job.
+        """
+        self.updateLock.acquire()
+        try:
+            if job is self.waitingJob:
+                self.waitingJob = None
+                if not self.isUpdateRunning and self.updateBuffer.hasAnyData():
+                    logging.getLogger().warning("Waiting timeouted, data items %s hasn't any data.",
+                        ", ".join(str(x) for x in self.updateBuffer.getMissingDataIdentifiers()))
+                    self.runUpdate()
+        finally:
+            self.updateLock.release()
 
     def dataComplete(self):
         """!
@@ -236,9 +847,27 @@ class BaseUpdater:
         @param measurement
         """
         self.isUpdateRunning = True
-        self.waitingStarted = None
-        measurement = self.updateBuffer.getMeasurement()
-        self.updateBuffer.reset()
+        self.cancelWaiting()
+        if self.channel.hasBulkUpdate():
+            measurements = self.updateBuffer.popMeasurements(self.channel.bulkSize)
+            if len(measurements) > 1:
+                measurement = MeasurementBatch(measurements)
+            else:
+                measurement = measurements[0]
+        else:
+            measurement = self.updateBuffer.getMeasurement()
+            self.updateBuffer.reset()
+            measurements = [measurement]
+        if self.pendingStageTimes is not None:
+            # Measurements of merged data are created just now.
+            for item in measurements:
+                if len(item.stageTimes) == 0:
+                    item.stageTimes.update(self.pendingStageTimes)
+            if not self.updateBuffer.hasAnyData():
+                self.pendingStageTimes = None
+        # Records of data merged into this update are replaced when update is spooled.
+        measurements[0].supersededIds.extend(self.updateBuffer.takeSupersededIds())
+        self.sentMeasurements = measurements
         self.dispatcher.updateAvailable(self.channel, measurement, self)
 
     def runUpdateLocked(self):
@@ -263,9 +892,150 @@ class BaseUpdater:
         self.updateLock.acquire()
         try:
             self.isUpdateRunning = False
+            self.adaptUpdateInterval(result)
             if result.wasSuccessful():
+                self.retryCount = 0
                 self.restartUpdateIntervalCounter()
+            elif self.scheduleRetry(result):
+                return
+            else:
+                self.updateBuffer.supersedeMeasurements(self.sentMeasurements)
+                self.recordDrop(len(self.sentMeasurements))
+            self.sentMeasurements = None
             self.resolveUpdateResult(result)
+            if not self.isUpdateRunning:
+                self.armWaiting()
+        finally:
+            self.updateLock.release()
+
+    def adaptUpdateInterval(self, result):
+        """!
+        Adjust update interval of channel with adaptive update rate. Call with
+        updateLock held.
+
+        @param result UpdateResult object.
+        """
+        if self.rateController is None:
+            return
+        if result.wasSuccessful():
+            self.rateController.onSuccess()
+        elif result.isRetryable():
+            # Rate limiting, server errors and timeouts mean server is overloaded.
+            self.rateController.onCongestion()
+        else:
+            return
+        if self.rateController.getInterval() != self.updateInterval:
+            self.updateInterval = self.rateController.getInterval()
+            logging.getLogger().info("Channel <%s>: update interval changed to %.1f seconds.",
+                self.channel, self.updateInterval.total_seconds())
+
+    def scheduleRetry(self, result):
+        """!
+        Return data of failed update back to update buffer, where they are
+        merged with newer data, and schedule repeated update. Delay grows
+        exponentially with each attempt and it is randomized, so channels which
+        failed together don't retry together. Call with updateLock held.
+
+        @param result UpdateResult object of failed update.
+        @return True if retry was scheduled, False if data were dropped.
+        """
+        if not result.isRetryable() or self.retryCount >= self.channel.retryLimit:
+            if self.channel.hasRetry() and result.isRetryable():
+                logging.getLogger().warning("Channel <%s>: update failed after %s attempts, dropping data.",
+                    self.channel, self.retryCount + 1)
+            self.retryCount = 0
+            return False
+        if not self.updateBuffer.restoreMeasurements(self.sentMeasurements):
+            self.retryCount = 0
+            return False
+        self.recordDrop(self.updateBuffer.takeDiscardedCount())
+        self.restorePendingStageTimes(self.sentMeasurements)
+        self.sentMeasurements = None
+        ceiling = min(
+            self.channel.retryDelay * (2 ** self.retryCount),
+            self.channel.retryMaxDelay)
+        delay = self.channel.retryDelay + (ceiling - self.channel.retryDelay) * random.random()
+        self.retryCount += 1
+        if self.metrics is not None:
+            self.metrics.recordRetry()
+        logging.getLogger().warning("Channel <%s>: update failed, retry %s/%s in %.1f seconds.",
+            self.channel, self.retryCount, self.channel.retryLimit, delay.total_seconds())
+        # Updater stays busy until retry, so new data only accumulate in buffer.
+        self.isUpdateRunning = True
+        self.cancelWaiting()
+        self.retryJob = self.scheduler.schedule(delay, self.onRetry)
+        return True
+
+    def restorePendingStageTimes(self, measurements):
+        """!
+        Keep stage times of data returned into update buffer which merges them
+        with newer data. Call with updateLock held.
+
+        @param measurements List of restored Measurement objects.
+        """
+        if self.updateBuffer.queuesMeasurements:
+            # Queued measurements keep their own stage times.
+            return
+        for measurement in measurements:
+            for stage, timestamp in measurement.stageTimes.items():
+                if stage not in (Stage.received, Stage.buffered):
+                    continue
+                if self.pendingStageTimes is None:
+                    self.pendingStageTimes = {}
+                if stage not in self.pendingStageTimes or timestamp < self.pendingStageTimes[stage]:
+                    self.pendingStageTimes[stage] = timestamp
+
+    def onRetry(self, job):
+        """!
+        Scheduler callback. Repeat failed update with restored and newly received data.
+
+        @param job Expired job.
+        """
+        self.updateLock.acquire()
+        try:
+            if job is self.retryJob:
+                self.retryJob = None
+                self.isUpdateRunning = False
+                if self.updateBuffer.hasAnyData():
+                    self.runUpdate()
+        finally:
+            self.updateLock.release()
+
+    def restoreSpooledMeasurements(self, measurements):
+        """!
+        Restore measurements loaded from spool after restart. Spool is loaded
+        in pages from newest records, so each call passes measurements older
+        than previous call. Call finishRestore() when all measurements are restored.
+
+        @param measurements List of Measurement objects, oldest first.
+        """
+        self.updateLock.acquire()
+        try:
+            if not self.updateBuffer.restoreMeasurements(measurements):
+                self.updateBuffer.supersedeMeasurements(measurements)
+            if self.updateBuffer.queuesMeasurements and self.spool is not None:
+                # Measurements discarded from full queue are lost, remove them
+                # now instead of keeping their identifiers until next update.
+                supersededIds = self.updateBuffer.takeSupersededIds()
+                if len(supersededIds) > 0:
+                    self.spool.remove(supersededIds)
+        except Exception as ex:
+            logging.getLogger().error("Channel <%s>: can't restore spooled data: %s", self.channel, ex)
+        finally:
+            self.updateLock.release()
+
+    def finishRestore(self):
+        """!
+        Start sending of restored measurements as soon as updater is allowed
+        to update channel.
+        """
+        self.updateLock.acquire()
+        try:
+            if not self.isUpdateRunning and self.updateBuffer.hasAnyData():
+                if self.updateBuffer.isComplete():
+                    self.dataComplete()
+                else:
+                    self.armWaiting()
         finally:
             self.updateLock.release()
 
@@ -277,6 +1047,57 @@ class BaseUpdater:
         """
         raise NotImplementedError("Override this mehod in sub-class")
 
+class AdaptiveRateController:
+    """!
+    Adapt update interval to server responses (additive increase, multiplicative
+    decrease of update rate). Each successful update increases update rate by
+    constant step until configured minimum interval is reached. Each congestion
+    signal doubles update interval up to configured maximum.
+    """
+
+    ## @var minInterval
+    # Minimum update interval in seconds.
+
+    ## @var maxInterval
+    # Maximum update interval in seconds.
+
+    ## @var rate
+    # Current update rate in updates per second.
+
+    def __init__(self, minInterval, maxInterval):
+        """!
+        Initiate AdaptiveRateController object. Controller starts with minimum interval.
+
+        @param minInterval Timedelta object of minimum update interval.
+        @param maxInterval Timedelta object of maximum update interval.
+        """
+        self.minInterval = max(minInterval.total_seconds(), 1)
+        self.maxInterval = max(maxInterval.total_seconds(), self.minInterval)
+        self.rate = 1 / self.minInterval
+
+    def onSuccess(self):
+        """!
+        Notify successful update. Increase update rate.
+        """
+        # Step is the slowest rate, so recovery from maximum interval takes
+        # maxInterval / minInterval updates.
+        self.rate = min(self.rate + 1 / self.maxInterval, 1 / self.minInterval)
+
+    def onCongestion(self):
+        """!
+        Notify congested server. Halve update rate.
+        """
+        self.rate = max(self.rate / 2, 1 / self.maxInterval)
+
+    def getInterval(self):
+        """!
+        Get current update interval.
+
+        @return Timedelta object.
+        """
+        interval = min(max(1 / self.rate, self.minInterval), self.maxInterval)
+        return datetime.timedelta(seconds = interval)
+
 class BlackoutUpdater(BaseUpdater):
     """!
     Ignore any incomming data during blackout period. Send first data which arriver
@@ -291,8 +1112,25 @@ class BlackoutUpdater(BaseUpdater):
             LastValueUpdateBuffer(updateMapping.keys()))
 
     def dataComplete(self):
-        if self.isUpdateIntervalExpired() and not self.isUpdateRunning:
+        if self.isUpdateRunning:
+            return
+        if self.isUpdateIntervalExpired():
             self.runUpdate()
+        else:
+            self.armWaiting()
+
+    def armWaiting(self):
+        """!
+        @copydoc BaseUpdater::armWaiting()
+
+        Channel with waiting enabled sends data completed during blackout as
+        soon as blackout expires.
+        """
+        if self.channel.hasWaiting() and self.updateBuffer.isComplete():
+            if self.waitingJob is None:
+                self.armIntervalExpiry()
+            return
+        BaseUpdater.armWaiting(self)
 
     def resolveUpdateResult(self, result):
         """!
@@ -311,8 +1149,14 @@ class SynchronousUpdater(BaseUpdater):
     ## @var scheduleLock
     # Mutual exclusion for isUpdateScheduled flag.
 
-    ## @var executors
-    # Set of running executors.
+    ## @var scheduledJobs
+    # Set of pending scheduled jobs.
+
+    ## @var nextSlot
+    # Wall clock time in seconds of scheduled update slot of staggered channel or None.
+
+    ## @var lastSlot
+    # Wall clock time in seconds of slot of last update of staggered channel or None.
 
     def __init__(self, channel, updateInterval, updateBuffer):
         """!
@@ -324,8 +1168,9 @@ class SynchronousUpdater(BaseUpdater):
         BaseUpdater.__init__(self, channel, updateInterval, updateBuffer)
         self.isUpdateScheduled = False
         self.scheduleLock = threading.Semaphore(1)
-        # TODO: Check race conditions with this set.
-        self.executors = set()
+        self.scheduledJobs = set()
+        self.nextSlot = None
+        self.lastSlot = None
 
     def dataComplete(self):
         self.scheduleLock.acquire()
@@ -334,8 +1179,13 @@ class SynchronousUpdater(BaseUpdater):
                 # There is no update sheduled. It is first run or data was unavailable
                 # for the long time. Also, an another update is running.
                 if not self.isUpdateRunning:
-                    # No other update is running. Update immidiatelly.
-                    self.runUpdate()
+                    if self.channel.hasStagger():
+                        # Wait for channel slot instead of updating together with
+                        # all other channels which received data at the same time.
+                        self.scheduleUpdateJob()
+                    else:
+                        # No other update is running. Update immidiatelly.
+                        self.runUpdate()
         finally:
             self.scheduleLock.release()
 
@@ -354,33 +1204,85 @@ class SynchronousUpdater(BaseUpdater):
         """
         Schedule new update job.
         """
+        # Slots of zero update interval would be undefined.
+        if self.channel.hasStagger() and self.updateInterval.total_seconds() > 0:
+            now = time.time()
+            earliest = now
+            if self.lastSlot is not None:
+                earliest = max(now, self.lastSlot + self.updateInterval.total_seconds())
+            self.nextSlot = self.getNextSlot(earliest)
+            delay = datetime.timedelta(seconds = self.nextSlot - now)
+        else:
+            delay = datetime.timedelta(seconds=int(self.updateInterval.total_seconds()))
+        job = self.scheduler.schedule(delay, self.onSchedule)
+        self.scheduledJobs.add(job)
         self.isUpdateScheduled = True
-        executor = SchedulerExecutor(
-            datetime.timedelta(seconds=int(self.updateInterval.total_seconds())),
-            self.onSchedule)
-        threading.Thread(target=executor).start()
-        self.executors.add(executor)
 
-    def onSchedule(self, executor):
+    def getNextSlot(self, earliest):
+        """!
+        Get first update slot of staggered channel which is not before given time.
+        Slots repeat each update interval and they are shifted from wall clock
+        by channel phase offset, so channels with the same update rate don't
+        send at the same moment.
+
+        @param earliest Wall clock time in seconds.
+        @return Wall clock time of slot in seconds.
+        """
+        interval = self.updateInterval.total_seconds()
+        phase = self.channel.getPhaseFraction() * interval
+        # Tolerate rounding errors, slot time itself is a valid slot.
+        slot = math.ceil((earliest - phase) / interval - 1e-9)
+        return phase + slot * interval
+
+    def onSchedule(self, job):
         """
         Callback method called when scheduler expires.
         """
         self.scheduleLock.acquire()
         try:
-            self.executors.discard(executor)
+            self.scheduledJobs.discard(job)
             self.isUpdateScheduled = False
-            if self.updateBuffer.isComplete():
-                self.runUpdateLocked()
+            slot = self.nextSlot
         finally:
             self.scheduleLock.release()
 
+        # Don't hold scheduleLock while acquiring updateLock. Received data are
+        # handled with updateLock held and they acquire scheduleLock.
+        self.updateLock.acquire()
+        try:
+            if not self.isUpdateRunning and self.updateBuffer.isComplete():
+                self.lastSlot = slot
+                self.runUpdate()
+        finally:
+            self.updateLock.release()
+
+    def createAggregationMapping(self, updateMapping, fieldAggregations):
+        """!
+        Translate field aggregations into aggregations of data identifiers.
+
+        @param updateMapping Mapping {DataIdentifier: field}.
+        @param fieldAggregations Mapping {field: aggregationName} or None.
+        @return Mapping {DataIdentifier: aggregationName}.
+        """
+        aggregationMapping = {}
+        if fieldAggregations is not None:
+            for dataIdentifier, field in updateMapping.items():
+                if field in fieldAggregations:
+                    aggregationMapping[dataIdentifier] = fieldAggregations[field]
+        return aggregationMapping
+
     def stop(self):
         """!
-        Stop all executors.
+        Cancel all scheduled jobs.
         """
-        for executor in self.executors:
-            executor.stop()
-        self.executors = set()
+        BaseUpdater.stop(self)
+        self.scheduleLock.acquire()
+        try:
+            for job in self.scheduledJobs:
+                job.cancel()
+            self.scheduledJobs = set()
+        finally:
+            self.scheduleLock.release()
 
 class BufferedUpdater(SynchronousUpdater):
     """!
@@ -398,64 +1300,155 @@ class BufferedUpdater(SynchronousUpdater):
 class AverageUpdater(SynchronousUpdater):
     """!
     Like BufferedUpdater but keep track all data which wasn't send and calculate
-    average value while sending them.
+    average value while sending them. Other aggregations can be selected for
+    each field.
     """
 
-    def __init__(self, channel, updateMapping, updateInterval):
+    def __init__(self, channel, updateMapping, updateInterval, fieldAggregations = None):
+        """!
+        Initiate AverageUpdater object.
+
+        @param channel Updated channel.
+        @param updateMapping Mapping {DataIdentifier: field}.
+        @param updateInterval Update interval.
+        @param fieldAggregations Mapping {field: aggregationName} or None.
+        """
         SynchronousUpdater.__init__(
             self,
             channel,
             updateInterval,
-            AverageUpdateBuffer(updateMapping.keys()))
+            AverageUpdateBuffer(
+                updateMapping.keys(),
+                self.createAggregationMapping(updateMapping, fieldAggregations)))
 
-class OnChangeUpdater(SynchronousUpdater):
+class QuantileUpdater(SynchronousUpdater):
     """!
-    Send every value change.
+    Like AverageUpdater but estimate quantile of values (median by default) while
+    sending them. Quantiles are calculated from fixed size sketch, not from stored
+    values.
     """
 
-    def __init__(self, channel, updateMapping, updateInterval):
+    def __init__(self, channel, updateMapping, updateInterval, fieldAggregations = None):
+        """!
+        Initiate QuantileUpdater object.
+
+        @param channel Updated channel.
+        @param updateMapping Mapping {DataIdentifier: field}.
+        @param updateInterval Update interval.
+        @param fieldAggregations Mapping {field: aggregationName} or None.
+        """
         SynchronousUpdater.__init__(
             self,
             channel,
             updateInterval,
-            ChangeValueBuffer(updateMapping.keys()))
+            QuantileUpdateBuffer(
+                updateMapping.keys(),
+                self.createAggregationMapping(updateMapping, fieldAggregations)))
 
-class SchedulerExecutor:
+class WindowUpdater(SynchronousUpdater):
     """!
-    Execute scheduler object in separate thread.
+    Aggregate values in tumbling or sliding windows aligned to wall clock. Each
+    closed window is sent as separate update, so failed or delayed sends don't
+    change width of aggregated windows.
     """
 
-    ## @var event
-    # Event object.
+    ## @var windowJob
+    # Scheduled job closing next window or None.
 
-    ## @var scheduleTime
-    # Schedule time.
+    def __init__(self, channel, updateMapping, updateInterval, fieldAggregations,
+            windowSize, windowStep, windowCapacity):
+        """!
+        Initiate WindowUpdater object.
+
+        @param channel Updated channel.
+        @param updateMapping Mapping {DataIdentifier: field}.
+        @param updateInterval Update interval.
+        @param fieldAggregations Mapping {field: aggregationName} or None.
+        @param windowSize Window length timedelta object.
+        @param windowStep Window step timedelta object.
+        @param windowCapacity Maximum number of stored values of single field.
+        """
+        SynchronousUpdater.__init__(
+            self,
+            channel,
+            updateInterval,
+            WindowUpdateBuffer(
+                updateMapping.keys(),
+                windowSize,
+                windowStep,
+                windowCapacity,
+                self.createAggregationMapping(updateMapping, fieldAggregations)))
+        self.windowJob = None
+
+    def updateReceivedData(self, dataIdentifier, value, receivedTime = None):
+        SynchronousUpdater.updateReceivedData(self, dataIdentifier, value, receivedTime)
+        self.updateLock.acquire()
+        try:
+            self.armWindowJob()
+        finally:
+            self.updateLock.release()
 
-    ## @var action
-    # Scheduled action.
+    def armWindowJob(self):
+        """!
+        Schedule closing of next window when some values are waiting for it.
+        Call with updateLock held.
+        """
+        if self.windowJob is None and self.updateBuffer.hasPendingSamples():
+            remaining = self.updateBuffer.getNextWindowEnd() - time.time()
+            self.windowJob = self.scheduler.schedule(
+                datetime.timedelta(seconds = max(remaining, 0)),
+                self.onWindowEnd)
 
-    def __init__(self, scheduleTime, action):
+    def onWindowEnd(self, job):
         """!
-        Initiate scheduler executor.
+        Scheduler callback. Close expired windows and send them.
 
-        @param scheduleTime Timedelta object.
-        @param action Callable object executed after schedule time expires. Action takes one argument,
-            which is reference to this executor.
+        @param job Expired job.
         """
-        self.event = threading.Event()
-        self.scheduleTime = scheduleTime
-        self.action = action
+        self.updateLock.acquire()
+        try:
+            if job is not self.windowJob:
+                return
+            self.windowJob = None
+            self.updateBuffer.closeWindows(time.time())
+            # Window measurement is received when its window is closed.
+            now = time.monotonic()
+            self.collectNewMeasurements({Stage.received: now, Stage.buffered: now})
+            if not self.isUpdateRunning and self.updateBuffer.isComplete():
+                self.dataComplete()
+            self.armWindowJob()
+        finally:
+            self.updateLock.release()
 
-    def __call__(self):
+    def stop(self):
         """!
-        Run schedule execution.
+        Cancel all scheduled jobs.
         """
-        scheduleExpires = not self.event.wait(self.scheduleTime.total_seconds())
-        if scheduleExpires:
-            self.action(self)
+        self.updateLock.acquire()
+        try:
+            if self.windowJob is not None:
+                self.windowJob.cancel()
+                self.windowJob = None
+        finally:
+            self.updateLock.release()
+        SynchronousUpdater.stop(self)
 
-    def stop(self):
+class OnChangeUpdater(SynchronousUpdater):
+    """!
+    Send every value change.
+    """
+
+    def __init__(self, channel, updateMapping, updateInterval, queueCapacity = 1024):
         """!
-        Stop scheduler execution.
+        Initiate OnChangeUpdater object.
+
+        @param channel Updated channel.
+        @param updateMapping Mapping {DataIdentifier: field}.
+        @param updateInterval Update interval.
+        @param queueCapacity Maximum number of queued changes. Oldest changes are discarded.
         """
-        self.event.set()
+        SynchronousUpdater.__init__(
+            self,
+            channel,
+            updateInterval,
+            ChangeValueBuffer(updateMapping.keys(), queueCapacity))
@@ -28,7 +28,12 @@ setup(
     url = mqspeak.__project_url__,
     version = mqspeak.__version__,
     packages = find_packages(exclude = ['doc']),
+    # Spool uses datetime.fromisoformat(), metrics exporter ThreadingHTTPServer.
+    python_requires = '>=3.7',
     install_requires = ['mqreceive>=0.1.1'],
+    extras_require = {
+        'msgpack': ['msgpack'],
+    },
     author = mqspeak.__author__,
     author_email = mqspeak.__email__,
     description = "MQTT bridge",
@@ -45,12 +50,11 @@ setup(
         'License :: OSI Approved :: GNU Lesser General Public License v3 (LGPLv3)',
         'Natural Language :: English',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.0',
-        'Programming Language :: Python :: 3.1',
-        'Programming Language :: Python :: 3.2',
-        'Programming Language :: Python :: 3.3',
-        'Programming Language :: Python :: 3.4',
-        'Programming Language :: Python :: 3.5',
+        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
         'Programming Language :: Python :: 3 :: Only',
         'Topic :: Communications',
         'Topic :: Home Automation',
@@ -59,7 +63,9 @@ setup(
     keywords = 'iot internetofthings mqopen mqtt sensors thingspeak phant',
     entry_points = {
         "console_scripts": [
-            "mqspeak = mqspeak.__main__:main"
+            "mqspeak = mqspeak.__main__:main",
+            "mqspeak-bench = mqspeak.benchmark.endtoend:main",
+            "mqspeak-microbench = mqspeak.benchmark.micro:main"
         ]
     }
 )
@@ -0,0 +1,71 @@
+# Copyright (C) Ivo Slanina <ivo.slanina@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+import unittest
+from mqreceive.broker import Broker
+from mqreceive.data import DataIdentifier
+from mqspeak.collecting import RingBuffer, TopicStore, WindowUpdateBuffer
+
+class RingBufferTest(unittest.TestCase):
+
+    def test_overwrittenValuesCounted(self):
+        ringBuffer = RingBuffer(2)
+        for timestamp in range(5):
+            ringBuffer.append(timestamp, timestamp)
+        self.assertEqual(ringBuffer.getOverwrittenCount(), 3)
+        self.assertEqual(list(ringBuffer.getValues(0, 5)), [3, 4])
+
+    def test_valuesOutOfRetentionNotCounted(self):
+        ringBuffer = RingBuffer(2, 15)
+        for timestamp in [0, 10, 20, 21]:
+            ringBuffer.append(timestamp, timestamp)
+        # Only value 10 was overwritten within retention of newer value.
+        self.assertEqual(ringBuffer.getOverwrittenCount(), 1)
+
+class WindowUpdateBufferTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dataIdentifier = DataIdentifier(Broker("broker"), "topic")
+        self.window = datetime.timedelta(hours = 1)
+        # Forget warnings logged by previous tests.
+        WindowUpdateBuffer.overwriteLog.flush(True)
+
+    def createBuffer(self, capacity):
+        return WindowUpdateBuffer([self.dataIdentifier], self.window, self.window, capacity)
+
+    def test_overwritesReported(self):
+        updateBuffer = self.createBuffer(4)
+        with self.assertLogs(level = "WARNING"):
+            for i in range(10):
+                updateBuffer.updateReceivedData(self.dataIdentifier, str(i))
+        self.assertEqual(updateBuffer.takeOverwrittenCount(), 6)
+        self.assertEqual(updateBuffer.takeOverwrittenCount(), 0)
+
+    def test_sharedRingOverwritesReportedByEachBuffer(self):
+        topicStore = TopicStore()
+        updateBuffers = [self.createBuffer(4), self.createBuffer(8)]
+        for updateBuffer in updateBuffers:
+            updateBuffer.setTopicStore(topicStore)
+        with self.assertLogs(level = "WARNING"):
+            for i in range(10):
+                topicStore.update(self.dataIdentifier, str(i))
+                for updateBuffer in updateBuffers:
+                    updateBuffer.updateReceivedData(self.dataIdentifier, str(i))
+        # Shared ring has the largest capacity.
+        self.assertEqual([b.takeOverwrittenCount() for b in updateBuffers], [2, 2])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+# Copyright (C) Ivo Slanina <ivo.slanina@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+import unittest
+from mqspeak.channel import ChannelType, PhantChannel, ThingSpeakChannel
+from mqspeak.data import Measurement, MeasurementBatch
+from mqspeak.sending import ChannelUpdateDispatcher, DeadlineUpdateQueue
+
+class FakeUpdater:
+    """!
+    Updater with fixed update interval.
+    """
+
+    def __init__(self, seconds):
+        self.updateInterval = datetime.timedelta(seconds = seconds)
+
+    def getUpdateInterval(self):
+        return self.updateInterval
+
+class FakeJob:
+    """!
+    Scheduled job fired manually by test.
+    """
+
+    def __init__(self, delay, action):
+        self.delay = delay
+        self.action = action
+
+    def cancel(self):
+        pass
+
+class FakeScheduler:
+    """!
+    Scheduler which only records scheduled jobs.
+    """
+
+    def __init__(self):
+        self.jobs = []
+
+    def schedule(self, delay, action):
+        job = FakeJob(delay, action)
+        self.jobs.append(job)
+        return job
+
+    def fire(self, job):
+        self.jobs.remove(job)
+        job.action(job)
+
+class DeadlineUpdateQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = DeadlineUpdateQueue()
+        self.start = datetime.datetime(2020, 1, 1)
+
+    def createMeasurement(self, seconds):
+        return Measurement({}, self.start + datetime.timedelta(seconds = seconds))
+
+    def test_earliestDeadlineFirst(self):
+        slow = ThingSpeakChannel("slow", "1", "A", False)
+        fast = ThingSpeakChannel("fast", "2", "B", False)
+        urgent = ThingSpeakChannel("urgent", "3", "C", False)
+        urgent.setPriority(4)
+        # Deadlines: slow 60 s, fast 15 s, urgent 5 + 60 / 4 = 20 s.
+        self.queue.put(slow, self.createMeasurement(0), FakeUpdater(60))
+        self.queue.put(fast, self.createMeasurement(5), FakeUpdater(10))
+        self.queue.put(urgent, self.createMeasurement(5), FakeUpdater(60))
+        self.assertEqual(len(self.queue), 3)
+        order = []
+        while True:
+            update = self.queue.get(ChannelType)
+            if update is None:
+                break
+            order.append(update[0])
+        self.assertEqual(order, [fast, urgent, slow])
+        self.assertEqual(len(self.queue), 0)
+
+    def test_equalDeadlinesKeepOrder(self):
+        channels = [ThingSpeakChannel(str(i), str(i), str(i), False) for i in range(5)]
+        for channel in channels:
+            self.queue.put(channel, self.createMeasurement(0), FakeUpdater(10))
+        order = [self.queue.get(ChannelType)[0] for _ in channels]
+        self.assertEqual(order, channels)
+
+    def test_onlyReadyChannelTypes(self):
+        thingspeak = ThingSpeakChannel("thingspeak", "1", "A", False)
+        phant = PhantChannel("phant", "2", "B", False)
+        self.queue.put(thingspeak, self.createMeasurement(0), FakeUpdater(10))
+        self.queue.put(phant, self.createMeasurement(60), FakeUpdater(10))
+        self.assertIs(self.queue.get([ChannelType.phant])[0], phant)
+        self.assertIsNone(self.queue.get([ChannelType.phant]))
+        self.assertIs(self.queue.get([ChannelType.thingspeak])[0], thingspeak)
+
+    def test_secondUpdateReplacesQueuedOne(self):
+        channel = ThingSpeakChannel("channel", "1", "A", False)
+        other = ThingSpeakChannel("other", "2", "B", False)
+        updater = FakeUpdater(10)
+        first = self.createMeasurement(0)
+        second = self.createMeasurement(1)
+        self.assertEqual(self.queue.put(channel, first, updater), [])
+        self.queue.put(other, self.createMeasurement(5), updater)
+        with self.assertLogs(level = "ERROR"):
+            discarded = self.queue.put(channel, second, updater)
+        self.assertEqual(discarded, [first])
+        self.assertEqual(len(self.queue), 2)
+        # Replaced update keeps deadline of queued one.
+        self.assertEqual(self.queue.get(ChannelType), (channel, second, updater))
+        self.assertIs(self.queue.get(ChannelType)[0], other)
+        self.assertIsNone(self.queue.get(ChannelType))
+        # Channel can be queued again after its update was taken.
+        self.assertEqual(self.queue.put(channel, self.createMeasurement(2), updater), [])
+        self.assertEqual(len(self.queue), 1)
+
+    def test_secondBulkUpdateIsJoined(self):
+        channel = ThingSpeakChannel("channel", "1", "A", False)
+        channel.setBulkSize(3)
+        updater = FakeUpdater(10)
+        measurements = [self.createMeasurement(i) for i in range(4)]
+        self.queue.put(channel, MeasurementBatch(measurements[:2]), updater)
+        with self.assertLogs(level = "ERROR"):
+            discarded = self.queue.put(channel, MeasurementBatch(measurements[2:]), updater)
+        # Oldest measurement doesn't fit into bulk update.
+        self.assertEqual(discarded, measurements[:1])
+        self.assertEqual(len(self.queue), 1)
+        _, batch, _ = self.queue.get(ChannelType)
+        self.assertEqual(batch.measurements, measurements[1:])
+
+class RateLimitedDispatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dispatcher = ChannelUpdateDispatcher({})
+        self.scheduler = FakeScheduler()
+        self.dispatcher.setScheduler(self.scheduler)
+        self.submitted = []
+        self.dispatcher.submit = lambda channel, measurement, updater: self.submitted.append(measurement)
+
+    def tearDown(self):
+        self.dispatcher.stop()
+
+    def test_delayedUpdateReturnsIntoQueue(self):
+        channel = ThingSpeakChannel("channel", "1", "A", False)
+        other = ThingSpeakChannel("other", "2", "A", False)
+        first = Measurement({}, datetime.datetime(2020, 1, 1))
+        second = Measurement({}, datetime.datetime(2020, 1, 1))
+        self.dispatcher.updateAvailable(channel, first, FakeUpdater(60))
+        self.dispatcher.dispatchReady()
+        self.dispatcher.updateAvailable(other, second, FakeUpdater(60))
+        self.dispatcher.dispatchReady()
+        # Channels share API key, so second update is rate limited.
+        self.assertEqual(self.submitted, [first])
+        self.assertEqual(len(self.scheduler.jobs), 1)
+        self.scheduler.fire(self.scheduler.jobs[0])
+        self.assertEqual(self.submitted, [first])
+        self.assertEqual(self.dispatcher.getQueueDepth(), 1)
+        # Update is not delayed again when it leaves queue.
+        self.dispatcher.dispatchReady()
+        self.assertEqual(self.submitted, [first, second])
+        self.assertEqual(self.scheduler.jobs, [])
+
+if __name__ == '__main__':
+    unittest.main()
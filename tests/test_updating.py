@@ -0,0 +1,121 @@
+# Copyright (C) Ivo Slanina <ivo.slanina@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+import unittest
+from mqreceive.broker import Broker
+from mqreceive.data import DataIdentifier
+from mqspeak.channel import ThingSpeakChannel
+from mqspeak.sending import UpdateResult
+from mqspeak.updating import BlackoutUpdater
+
+class FakeJob:
+    """!
+    Scheduled job fired manually by test.
+    """
+
+    def __init__(self, delay, action):
+        self.delay = delay
+        self.action = action
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+class FakeScheduler:
+    """!
+    Scheduler which only records scheduled jobs.
+    """
+
+    def __init__(self):
+        self.jobs = []
+
+    def schedule(self, delay, action):
+        job = FakeJob(delay, action)
+        self.jobs.append(job)
+        return job
+
+    def getPendingJobs(self):
+        return [job for job in self.jobs if not job.cancelled]
+
+    def fire(self, job):
+        self.jobs.remove(job)
+        job.action(job)
+
+class FakeDispatcher:
+    """!
+    Dispatcher which records updates without sending them.
+    """
+
+    def __init__(self):
+        self.updates = []
+
+    def updateAvailable(self, channel, measurement, updater):
+        self.updates.append(measurement)
+
+class BlackoutUpdaterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dataIdentifier = DataIdentifier(Broker("broker"), "topic")
+        self.interval = datetime.timedelta(seconds = 60)
+        self.scheduler = FakeScheduler()
+        self.dispatcher = FakeDispatcher()
+
+    def createUpdater(self, waiting):
+        channel = ThingSpeakChannel("channel", "1", "key", waiting)
+        updater = BlackoutUpdater(channel, {self.dataIdentifier: "field1"}, self.interval)
+        updater.setScheduler(self.scheduler)
+        updater.setDispatcher(self.dispatcher)
+        return updater
+
+    def sendFirstUpdate(self, updater):
+        updater.updateReceivedData(self.dataIdentifier, "1")
+        self.assertEqual(len(self.dispatcher.updates), 1)
+        updater.notifyUpdateResult(UpdateResult(True))
+
+    def test_dataCompletedDuringBlackoutSentAfterIt(self):
+        updater = self.createUpdater(datetime.timedelta(seconds = 10))
+        self.sendFirstUpdate(updater)
+        updater.updateReceivedData(self.dataIdentifier, "2")
+        self.assertEqual(len(self.dispatcher.updates), 1)
+        jobs = self.scheduler.getPendingJobs()
+        self.assertEqual(len(jobs), 1)
+        self.assertGreater(jobs[0].delay, datetime.timedelta(0))
+        self.assertLessEqual(jobs[0].delay, self.interval)
+        # Blackout expires.
+        updater.lastUpdated -= self.interval
+        self.scheduler.fire(jobs[0])
+        self.assertEqual(len(self.dispatcher.updates), 2)
+
+    def test_dataCompletedDuringRunningUpdateSentAfterBlackout(self):
+        updater = self.createUpdater(datetime.timedelta(seconds = 10))
+        updater.updateReceivedData(self.dataIdentifier, "1")
+        updater.updateReceivedData(self.dataIdentifier, "2")
+        updater.notifyUpdateResult(UpdateResult(True))
+        jobs = self.scheduler.getPendingJobs()
+        self.assertEqual(len(jobs), 1)
+        updater.lastUpdated -= self.interval
+        self.scheduler.fire(jobs[0])
+        self.assertEqual(len(self.dispatcher.updates), 2)
+
+    def test_withoutWaitingNothingScheduled(self):
+        updater = self.createUpdater(None)
+        self.sendFirstUpdate(updater)
+        updater.updateReceivedData(self.dataIdentifier, "2")
+        self.assertEqual(self.scheduler.getPendingJobs(), [])
+        self.assertEqual(len(self.dispatcher.updates), 1)
+
+if __name__ == '__main__':
+    unittest.main()